@@ -26,6 +26,16 @@ def create_app(config_name=None):
     if hasattr(config_cls, "init_app"):
         config_cls.init_app(flask_app)
 
+    # Time pool checkouts when using a real connection pool (not SQLite)
+    from app.services import metrics_service
+
+    engine_options = flask_app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {})
+    if "pool_size" in engine_options:
+        flask_app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+            **engine_options,
+            "poolclass": metrics_service.TimedQueuePool,
+        }
+
     # Initialize extensions
     from app.extensions import db, migrate, init_redis
 
@@ -33,8 +43,18 @@ def create_app(config_name=None):
     migrate.init_app(flask_app, db)
     init_redis(flask_app)
 
+    from app.services import ai_styles, search_index, slow_query_service
+
+    ai_styles.init_app(flask_app)
+    slow_query_service.init_app(flask_app)
+    metrics_service.init_app(flask_app)
+    search_index.init_app(flask_app)
+
     # Import models so Alembic sees them
-    from app.models import Product, VariantOption, Image, Settings, AuditLog  # noqa: F401
+    from app.models import (  # noqa: F401
+        Product, VariantOption, Image, Settings, AuditLog, ProcessedUpdate, AIResult,
+        AIJobMetric,
+    )
 
     # Register blueprints
     from app.blueprints.public import public_bp
@@ -85,4 +105,18 @@ def create_app(config_name=None):
         status_code = 200 if checks["status"] == "ok" else 503
         return checks, status_code
 
+    # Prometheus text exposition, aggregated across processes via Redis
+    @flask_app.route("/metrics")
+    def metrics():
+        import hmac
+        from flask import request
+
+        token = flask_app.config["METRICS_TOKEN"]
+        supplied = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        if token and not hmac.compare_digest(supplied, token):
+            return "", 403
+        return metrics_service.render(), 200, {
+            "Content-Type": "text/plain; version=0.0.4; charset=utf-8"
+        }
+
     return flask_app
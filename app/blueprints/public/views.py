@@ -1,10 +1,26 @@
 """Public-facing catalog and product pages."""
+import hashlib
+from datetime import timezone
 from urllib.parse import quote
-from flask import render_template, request, abort, make_response, current_app
+from flask import (
+    render_template,
+    stream_template,
+    request,
+    abort,
+    make_response,
+    current_app,
+)
 from app.blueprints.public import public_bp
-from app.services.product_service import get_published_products, get_product_by_dress_id
+from app.services.product_service import (
+    get_published_products,
+    stream_published_products,
+    get_product_by_dress_id,
+    get_catalog_version,
+    get_settings_version,
+)
 from app.models.settings import Settings
 from app.models.image import Image
+from app.services import metrics_service
 
 
 @public_bp.route("/")
@@ -12,24 +28,57 @@ def catalog():
     """Catalog page — newest first, no filters for now."""
     page = request.args.get("page", 1, type=int)
 
-    pagination = get_published_products(
-        sort="newest",
-        page=page,
-        per_page=24,
-    )
+    last_modified, published_count = get_catalog_version()
+    etag = _make_etag("catalog", page, published_count, last_modified)
+    cache_control = current_app.config["CATALOG_CACHE_CONTROL"]
+    if _is_not_modified(etag, last_modified):
+        return _not_modified(etag, last_modified, cache_control)
 
+    per_page = current_app.config["CATALOG_PER_PAGE"]
     usd_rate = Settings.get_usd_rate()
     instagram_posts = Settings.get_instagram_posts()
     whatsapp_number = Settings.get_whatsapp_number()
 
-    return render_template(
+    if current_app.config["CATALOG_STREAMING"]:
+        # Flush <head>/CSS and the first cards while later rows are fetched
+        pagination = stream_published_products(sort="newest", page=page, per_page=per_page)
+        chunks = stream_template(
+            "catalog.html",
+            products=pagination.items,
+            pagination=pagination,
+            usd_rate=usd_rate,
+            instagram_posts=instagram_posts,
+            whatsapp_number=whatsapp_number,
+        )
+        response = current_app.response_class(_coalesce(chunks), mimetype="text/html")
+        return _add_validators(response, etag, last_modified, cache_control)
+
+    pagination = get_published_products(sort="newest", page=page, per_page=per_page)
+    response = make_response(render_template(
         "catalog.html",
         products=pagination.items,
         pagination=pagination,
         usd_rate=usd_rate,
         instagram_posts=instagram_posts,
         whatsapp_number=whatsapp_number,
-    )
+    ))
+    return _add_validators(response, etag, last_modified, cache_control)
+
+
+_STREAM_CHUNK_CHARS = 4096
+
+
+def _coalesce(chunks, size=_STREAM_CHUNK_CHARS):
+    """Group Jinja's many tiny fragments into socket-sized writes."""
+    buffer, buffered = [], 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        buffered += len(chunk)
+        if buffered >= size:
+            yield "".join(buffer)
+            buffer, buffered = [], 0
+    if buffer:
+        yield "".join(buffer)
 
 
 @public_bp.route("/d/<dress_id>")
@@ -40,6 +89,15 @@ def product_detail(dress_id):
     if not product or product.status not in ("PUBLISHED", "SOLD_OUT"):
         abort(404)
 
+    last_modified = max(
+        (ts for ts in (product.updated_at, get_settings_version()) if ts is not None),
+        default=None,
+    )
+    etag = _make_etag("product", product.dress_id, product.status, last_modified)
+    cache_control = current_app.config["PRODUCT_CACHE_CONTROL"]
+    if _is_not_modified(etag, last_modified):
+        return _not_modified(etag, last_modified, cache_control)
+
     usd_rate = Settings.get_usd_rate()
     whatsapp_number = Settings.get_whatsapp_number()
     app_url = current_app.config.get("APP_URL", "").rstrip("/") or request.host_url.rstrip("/")
@@ -53,14 +111,15 @@ def product_detail(dress_id):
         page_url=page_url,
     )
 
-    return render_template(
+    response = make_response(render_template(
         "product.html",
         product=product,
         usd_rate=usd_rate,
         whatsapp_number=whatsapp_number,
         whatsapp_link=whatsapp_link,
         page_url=page_url,
-    )
+    ))
+    return _add_validators(response, etag, last_modified, cache_control)
 
 
 @public_bp.route("/img/<int:image_id>")
@@ -76,6 +135,7 @@ def serve_image(image_id):
     ):
         abort(404)
 
+    metrics_service.inc("image_bytes_served_total", len(image.image_data))
     response = make_response(image.image_data)
     response.headers["Content-Type"] = "image/jpeg"
     response.headers["Cache-Control"] = "public, max-age=86400"  # 1 day
@@ -92,3 +152,45 @@ def build_whatsapp_link(phone, dress_id, variant_text, page_url):
         f"Link: {page_url}"
     )
     return f"https://wa.me/{phone}?text={quote(message)}"
+
+
+# ---------------------------------------------------------------------------
+# Conditional requests
+# ---------------------------------------------------------------------------
+
+def _make_etag(*parts):
+    """Weak validator over page inputs plus the deployed release."""
+    raw = "|".join(str(p) for p in (current_app.config["RELEASE_VERSION"], *parts))
+    return hashlib.sha1(raw.encode()).hexdigest()[:20]
+
+
+def _as_utc(ts):
+    if ts is None:
+        return None
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.astimezone(timezone.utc).replace(microsecond=0)
+
+
+def _is_not_modified(etag, last_modified):
+    """Evaluate If-None-Match (preferred) or If-Modified-Since before rendering."""
+    if request.if_none_match:
+        hit = request.if_none_match.contains_weak(etag)
+    elif request.if_modified_since and last_modified is not None:
+        hit = _as_utc(last_modified) <= request.if_modified_since
+    else:
+        hit = False
+    metrics_service.record_cache("http_conditional", hit)
+    return hit
+
+
+def _not_modified(etag, last_modified, cache_control):
+    return _add_validators(make_response("", 304), etag, last_modified, cache_control)
+
+
+def _add_validators(response, etag, last_modified, cache_control):
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = _as_utc(last_modified)
+    response.headers["Cache-Control"] = cache_control
+    return response
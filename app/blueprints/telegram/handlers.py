@@ -1,24 +1,95 @@
 """Telegram message and callback query handlers."""
 import logging
 import re
+from concurrent.futures import ThreadPoolExecutor
 from flask import current_app
 from rq import Retry
 
-from app.extensions import db, task_queue
+from app.extensions import db
 from app.models.product import Product
 from app.models.image import Image
 from app.models.settings import Settings
 from app.models.audit_log import AuditLog
 from app.services import (
+    ai_queue,
+    metrics_service,
     product_service,
+    search_index,
     telegram_service,
+    telegram_outbox,
     storage_service,
     image_service,
 )
 from app.blueprints.telegram.keyboards import approval_keyboard, fallback_keyboard
+from app.workers import albums
 
 logger = logging.getLogger(__name__)
 
+GENERATE_AI_IMAGE = "app.workers.ai_generation.generate_ai_image"
+GENERATE_AI_VARIATIONS = "app.workers.ai_generation.generate_ai_variations"
+
+
+# ---------------------------------------------------------------------------
+# Update routing
+# ---------------------------------------------------------------------------
+
+def handle_update(update):
+    """Dispatch a Telegram update to the message or callback handler."""
+    if "message" in update:
+        handle_message(update["message"])
+    elif "callback_query" in update:
+        handle_callback_query(update["callback_query"])
+
+
+# ---------------------------------------------------------------------------
+# Inline queries
+# ---------------------------------------------------------------------------
+
+INLINE_RESULT_LIMIT = 20
+
+
+def answer_inline_query(inline_query):
+    """Build an answerInlineQuery call for `@bot <words>` lookups.
+
+    Returned as a dict so the webhook can send it as its response body,
+    avoiding a separate Bot API request. Products with a cached Telegram
+    photo come back as photo results, the rest as text articles.
+    """
+    entries = search_index.search(inline_query.get("query", ""), limit=INLINE_RESULT_LIMIT)
+    return {
+        "method": "answerInlineQuery",
+        "inline_query_id": inline_query["id"],
+        "results": [_inline_result(entry) for entry in entries],
+        "cache_time": 5,
+        "is_personal": True,
+    }
+
+
+def _inline_result(entry):
+    summary = f"INR {entry['price_inr'] / 100:,.0f} · {entry['status']}"
+    title = f"{entry['dress_id']} — {entry['title']}"
+    if entry["file_id"]:
+        return {
+            "type": "photo",
+            "id": str(entry["product_id"]),
+            "photo_file_id": entry["file_id"],
+            "title": title,
+            "description": summary,
+            "caption": f"{title}\n{summary}",
+        }
+    result = {
+        "type": "article",
+        "id": str(entry["product_id"]),
+        "title": title,
+        "description": summary,
+        "input_message_content": {"message_text": entry["dress_id"]},
+    }
+    if entry["image_id"]:
+        result["thumbnail_url"] = (
+            f"{current_app.config['APP_URL'].rstrip('/')}/img/{entry['image_id']}"
+        )
+    return result
+
 
 # ---------------------------------------------------------------------------
 # Message handler
@@ -29,8 +100,11 @@ def handle_message(message):
     chat_id = message["chat"]["id"]
     user_id = message["from"]["id"]
 
-    # Photo with caption → create draft
-    if "photo" in message:
+    # Photo (or uncompressed image file) with caption → publish product.
+    # Album items are buffered and published together as one product.
+    if "photo" in message or "document" in message:
+        if message.get("media_group_id") and albums.buffer_album_message(message):
+            return
         _handle_photo(message, chat_id, user_id)
         return
 
@@ -62,16 +136,99 @@ def handle_message(message):
     elif text.startswith("/help") or text.startswith("/start"):
         _handle_help(chat_id)
     else:
-        telegram_service.send_message(
+        telegram_outbox.send_message(
             chat_id, "Unknown command. Send /help for available commands."
         )
 
 
 def _handle_photo(message, chat_id, user_id):
-    """Process photo + caption → create draft product."""
-    caption = message.get("caption", "")
+    """Process photo + caption → publish a product."""
+    metadata = _parse_listing_caption(message.get("caption", ""), chat_id)
+    if metadata is None:
+        return
+
+    upload = _select_upload(message)
+    if upload is None:
+        telegram_outbox.send_message(
+            chat_id, "Please send a photo or an image file (JPEG, PNG or WebP)."
+        )
+        return
+
+    # Download (size-guarded) then validate and sanitize image
+    try:
+        image_bytes = _fetch_image(upload)
+    except ValueError as e:
+        telegram_outbox.send_message(chat_id, f"Image error: {e}")
+        return
+
+    product = product_service.create_published_product(
+        metadata, [image_bytes], chat_id=chat_id, admin_id=user_id
+    )
+    _announce_published(chat_id, product, metadata)
+
+
+def handle_album(messages):
+    """Publish one product from a buffered album (media group).
+
+    The caption may sit on any item (Telegram puts it on the first one the
+    sender captioned). All photos are downloaded and sanitized concurrently
+    and stored as ORIGINAL images in album order. Returns the product, or
+    None if nothing was published.
+    """
+    messages = sorted(messages, key=lambda m: m["message_id"])
+    chat_id = messages[0]["chat"]["id"]
+    user_id = messages[0]["from"]["id"]
+    caption = next((m["caption"] for m in messages if m.get("caption")), "")
+    metadata = _parse_listing_caption(caption, chat_id)
+    if metadata is None:
+        return None
+
+    images, errors = _album_images(messages, chat_id)
+    if not images:
+        return None
+
+    product = product_service.create_published_product(
+        metadata, images, chat_id=chat_id, admin_id=user_id
+    )
+    _announce_published(chat_id, product, metadata, photos=len(images), skipped=errors)
+    return product
+
+
+def handle_album_late_items(product_id, messages):
+    """Add album photos that arrived after the album was published to its product."""
+    messages = sorted(messages, key=lambda m: m["message_id"])
+    chat_id = messages[0]["chat"]["id"]
+    images, errors = _album_images(messages, chat_id)
+    if not images:
+        return
+    product = product_service.add_original_images(
+        product_id, images, admin_id=messages[0]["from"]["id"]
+    )
+    text = f"Added {len(images)} late photo(s) to {product.dress_id}."
+    if errors:
+        text += f"\nSkipped {len(errors)} photo(s): {errors[0]}"
+    telegram_outbox.send_message(chat_id, text)
+
+
+def _album_images(messages, chat_id):
+    """Download and sanitize album photos, replying if none are usable."""
+    uploads = [u for u in (_select_upload(m) for m in messages) if u is not None]
+    if not uploads:
+        telegram_outbox.send_message(
+            chat_id, "Please send photos or image files (JPEG, PNG or WebP)."
+        )
+        return [], []
+
+    images, errors = _fetch_images(uploads)
+    if not images:
+        telegram_outbox.send_message(chat_id, f"Image error: {errors[0]}")
+    return images, errors
+
+
+def _parse_listing_caption(caption, chat_id):
+    """Parse listing metadata from a caption, replying with help if invalid."""
     if not caption:
-        telegram_service.send_message(
+        telegram_outbox.send_message(
             chat_id,
             "Please include a caption with metadata.\n\n"
             "Format:\n"
@@ -81,71 +238,40 @@ def _handle_photo(message, chat_id, user_id):
             "Tags: silk, red, wedding\n"
             "Variants: Size: Free Size; Color: Red",
         )
-        return
+        return None
 
     metadata = product_service.parse_caption(caption)
     if not metadata["title"] or not metadata["price"]:
-        telegram_service.send_message(
+        telegram_outbox.send_message(
             chat_id, "Caption must include at least Title and Price."
         )
-        return
-
-    # Get highest-resolution photo
-    photo = message["photo"][-1]
-    file_info = telegram_service.get_file(photo["file_id"])
-    image_bytes = telegram_service.download_file(file_info["file_path"])
-
-    # Validate and sanitize image
-    try:
-        image_bytes = image_service.validate_image(image_bytes)
-    except ValueError as e:
-        telegram_service.send_message(chat_id, f"Image error: {e}")
-        return
-
-    # Create the product draft
-    product, ai_image = product_service.create_draft(
-        metadata=metadata,
-        original_storage_key="",  # placeholder
-        original_url="",
-        chat_id=chat_id,
-        admin_id=user_id,
-    )
-
-    # Store image bytes in original image record (DB storage)
-    storage_key = f"originals/{product.dress_id}/v1.jpg"
-    original = product.images.filter_by(type="ORIGINAL").first()
-    original.storage_key = storage_key
-    original.image_data = image_bytes
-    original.status = "READY"
+        return None
+    return metadata
 
-    original.url = f"/img/{original.id}"
 
-    # Delete the AI image placeholder — publish with original directly
-    if ai_image:
-        db.session.delete(ai_image)
-
-    product.status = "PUBLISHED"
-    db.session.commit()
-
-    telegram_service.send_message(
-        chat_id,
-        f"✅ Published: {product.dress_id}\n"
-        f"Title: {product.title}\n"
-        f"Price: INR {metadata['price']:,}\n\n"
-        f"Live on the website now!",
-    )
+def _announce_published(chat_id, product, metadata, photos=1, skipped=()):
+    lines = [
+        f"✅ Published: {product.dress_id}",
+        f"Title: {product.title}",
+        f"Price: INR {metadata['price']:,}",
+    ]
+    if photos > 1:
+        lines.append(f"Photos: {photos}")
+    if skipped:
+        lines.append(f"Skipped {len(skipped)} photo(s): {skipped[0]}")
+    telegram_outbox.send_message(chat_id, "\n".join(lines) + "\n\nLive on the website now!")
 
 
 def _handle_set_rate(text, chat_id, user_id):
     """Set USD FX rate. Usage: /setrate 83.50"""
     match = re.search(r"[\d.]+", text.split(maxsplit=1)[-1] if " " in text else "")
     if not match:
-        telegram_service.send_message(chat_id, "Usage: /setrate 83.50")
+        telegram_outbox.send_message(chat_id, "Usage: /setrate 83.50")
         return
 
     rate = float(match.group())
     if rate <= 0 or rate > 500:
-        telegram_service.send_message(chat_id, "Rate must be between 0 and 500.")
+        telegram_outbox.send_message(chat_id, "Rate must be between 0 and 500.")
         return
 
     Settings.set("usd_fx_rate", str(rate))
@@ -153,19 +279,19 @@ def _handle_set_rate(text, chat_id, user_id):
         AuditLog(admin_id=user_id, action="SET_USD_RATE", payload={"rate": rate})
     )
     db.session.commit()
-    telegram_service.send_message(chat_id, f"USD rate set to {rate}")
+    telegram_outbox.send_message(chat_id, f"USD rate set to {rate}")
 
 
 def _handle_set_whatsapp(text, chat_id, user_id):
     """Set WhatsApp number. Usage: /setwhatsapp 919876543210"""
     parts = text.split(maxsplit=1)
     if len(parts) < 2:
-        telegram_service.send_message(chat_id, "Usage: /setwhatsapp 919876543210")
+        telegram_outbox.send_message(chat_id, "Usage: /setwhatsapp 919876543210")
         return
 
     number = re.sub(r"[^\d]", "", parts[1])
     if len(number) < 10:
-        telegram_service.send_message(chat_id, "Invalid phone number.")
+        telegram_outbox.send_message(chat_id, "Invalid phone number.")
         return
 
     Settings.set("whatsapp_number", number)
@@ -175,74 +301,99 @@ def _handle_set_whatsapp(text, chat_id, user_id):
         )
     )
     db.session.commit()
-    telegram_service.send_message(chat_id, f"WhatsApp number set to {number}")
+    telegram_outbox.send_message(chat_id, f"WhatsApp number set to {number}")
 
 
 def _handle_sold_out(text, chat_id, user_id):
-    """Mark product sold out. Usage: /soldout D-1042"""
-    dress_id = _extract_dress_id(text)
-    if not dress_id:
-        telegram_service.send_message(chat_id, "Usage: /soldout D-1042")
-        return
-
-    product = product_service.mark_sold_out(dress_id, user_id)
-    if product:
-        telegram_service.send_message(chat_id, f"{dress_id} marked as SOLD OUT")
-    else:
-        telegram_service.send_message(chat_id, f"{dress_id} not found or not in valid state.")
+    """Mark products sold out. Usage: /soldout D-1042 D-1050..D-1060"""
+    _handle_bulk_status(
+        text, chat_id, user_id, product_service.mark_sold_out_bulk,
+        usage="/soldout D-1042 [D-1050..D-1060 ...]",
+        done="marked as SOLD OUT",
+        skipped="not found or not PUBLISHED/HIDDEN",
+    )
 
 
 def _handle_hide(text, chat_id, user_id):
-    dress_id = _extract_dress_id(text)
-    if not dress_id:
-        telegram_service.send_message(chat_id, "Usage: /hide D-1042")
-        return
-    product = product_service.hide_product(dress_id, user_id)
-    if product:
-        telegram_service.send_message(chat_id, f"{dress_id} hidden from catalog")
-    else:
-        telegram_service.send_message(chat_id, f"{dress_id} not found or not PUBLISHED.")
+    _handle_bulk_status(
+        text, chat_id, user_id, product_service.hide_products,
+        usage="/hide D-1042 [D-1050..D-1060 ...]",
+        done="hidden from catalog",
+        skipped="not found or not PUBLISHED",
+    )
 
 
 def _handle_unhide(text, chat_id, user_id):
-    dress_id = _extract_dress_id(text)
-    if not dress_id:
-        telegram_service.send_message(chat_id, "Usage: /unhide D-1042")
+    _handle_bulk_status(
+        text, chat_id, user_id, product_service.unhide_products,
+        usage="/unhide D-1042 [D-1050..D-1060 ...]",
+        done="visible again",
+        skipped="not found or not HIDDEN",
+    )
+
+
+def _handle_bulk_status(text, chat_id, user_id, update, usage, done, skipped):
+    try:
+        dress_ids = _extract_dress_ids(text)
+    except ValueError as e:
+        telegram_outbox.send_message(chat_id, str(e))
         return
-    product = product_service.unhide_product(dress_id, user_id)
-    if product:
-        telegram_service.send_message(chat_id, f"{dress_id} is now visible again")
-    else:
-        telegram_service.send_message(chat_id, f"{dress_id} not found or not HIDDEN.")
+    if not dress_ids:
+        telegram_outbox.send_message(chat_id, f"Usage: {usage}")
+        return
+    changed = update(dress_ids, user_id)
+    telegram_outbox.send_message(
+        chat_id, _bulk_summary(dress_ids, changed, done, skipped)
+    )
 
 
 def _handle_edit_price(text, chat_id, user_id):
-    """Edit price. Usage: /editprice D-1042 15000"""
+    """Edit price. Usage: /editprice D-1042 [D-1043 ...] 15000"""
     parts = text.split()
     if len(parts) < 3:
-        telegram_service.send_message(chat_id, "Usage: /editprice D-1042 15000")
+        telegram_outbox.send_message(chat_id, "Usage: /editprice D-1042 15000")
+        return
+    if _DRESS_ID_OR_RANGE.search(parts[-1]):
+        # "/editprice D-1042 D-1043" must not set D-1042 to INR 1,043
+        telegram_outbox.send_message(chat_id, "Price missing. Usage: /editprice D-1042 15000")
         return
-    dress_id = parts[1].upper()
     try:
-        price = int(re.sub(r"[^\d]", "", parts[2]))
+        price = int(re.sub(r"[^\d]", "", parts[-1]))
     except (ValueError, IndexError):
-        telegram_service.send_message(chat_id, "Invalid price.")
+        telegram_outbox.send_message(chat_id, "Invalid price.")
+        return
+    try:
+        dress_ids = _extract_dress_ids(" ".join(parts[1:-1]))
+    except ValueError as e:
+        telegram_outbox.send_message(chat_id, str(e))
+        return
+    if not dress_ids:
+        telegram_outbox.send_message(chat_id, "Usage: /editprice D-1042 15000")
         return
 
-    product = product_service.update_price(dress_id, price, user_id)
-    if product:
-        telegram_service.send_message(
-            chat_id, f"{dress_id} price updated to INR {price:,}"
-        )
-    else:
-        telegram_service.send_message(chat_id, f"{dress_id} not found.")
+    changed = product_service.update_prices(dress_ids, price, user_id)
+    telegram_outbox.send_message(
+        chat_id,
+        _bulk_summary(dress_ids, changed, f"price updated to INR {price:,}", "not found"),
+    )
+
+
+def _bulk_summary(requested, changed, done, skipped):
+    """One reply for a bulk command, e.g. "3 marked as SOLD OUT: ..."."""
+    missed = [d for d in requested if d not in set(changed)]
+    lines = []
+    if changed:
+        lines.append(f"{len(changed)} {done}: {', '.join(changed)}")
+    if missed:
+        lines.append(f"{len(missed)} {skipped}: {', '.join(missed)}")
+    return "\n".join(lines)
 
 
 def _handle_add_insta(text, chat_id, user_id):
     """Add Instagram post to catalog. Usage: /addinsta https://www.instagram.com/p/xxx/"""
     parts = text.split(maxsplit=1)
     if len(parts) < 2:
-        telegram_service.send_message(
+        telegram_outbox.send_message(
             chat_id,
             "Usage: /addinsta https://www.instagram.com/p/ABC123/\n"
             "Also works with /reel/ URLs.",
@@ -253,14 +404,14 @@ def _handle_add_insta(text, chat_id, user_id):
     try:
         posts = Settings.add_instagram_post(url)
     except ValueError as e:
-        telegram_service.send_message(chat_id, f"Invalid Instagram URL: {e}")
+        telegram_outbox.send_message(chat_id, f"Invalid Instagram URL: {e}")
         return
 
     db.session.add(
         AuditLog(admin_id=user_id, action="ADD_INSTAGRAM", payload={"url": url})
     )
     db.session.commit()
-    telegram_service.send_message(
+    telegram_outbox.send_message(
         chat_id, f"Instagram post added ({len(posts)} total on catalog)."
     )
 
@@ -269,7 +420,7 @@ def _handle_remove_insta(text, chat_id, user_id):
     """Remove Instagram post. Usage: /removeinsta 1  or  /removeinsta <url>"""
     parts = text.split(maxsplit=1)
     if len(parts) < 2:
-        telegram_service.send_message(
+        telegram_outbox.send_message(
             chat_id, "Usage: /removeinsta 1  (number from /listinsta)"
         )
         return
@@ -282,21 +433,21 @@ def _handle_remove_insta(text, chat_id, user_id):
             )
         )
         db.session.commit()
-        telegram_service.send_message(chat_id, f"Removed: {removed}")
+        telegram_outbox.send_message(chat_id, f"Removed: {removed}")
     else:
-        telegram_service.send_message(chat_id, "Post not found. Use /listinsta to see current posts.")
+        telegram_outbox.send_message(chat_id, "Post not found. Use /listinsta to see current posts.")
 
 
 def _handle_list_insta(chat_id):
     """List all Instagram embeds on catalog."""
     posts = Settings.get_instagram_posts()
     if not posts:
-        telegram_service.send_message(
+        telegram_outbox.send_message(
             chat_id, "No Instagram posts on catalog.\nAdd with: /addinsta <url>"
         )
         return
     lines = [f"  {i+1}. {url}" for i, url in enumerate(posts)]
-    telegram_service.send_message(
+    telegram_outbox.send_message(
         chat_id,
         f"Instagram posts ({len(posts)}):\n" + "\n".join(lines)
         + "\n\nRemove with: /removeinsta <number>",
@@ -307,14 +458,14 @@ def _handle_stats(chat_id):
     stats = product_service.get_stats()
     lines = [f"  {status}: {count}" for status, count in sorted(stats.items())]
     total = sum(stats.values())
-    telegram_service.send_message(
+    telegram_outbox.send_message(
         chat_id,
         f"Product Stats (total: {total}):\n" + "\n".join(lines) if lines else "No products yet.",
     )
 
 
 def _handle_help(chat_id):
-    telegram_service.send_message(
+    telegram_outbox.send_message(
         chat_id,
         "Rangoli Boutique Admin Bot\n\n"
         "Add item: Send a photo with caption:\n"
@@ -324,17 +475,20 @@ def _handle_help(chat_id):
         "  Tags: silk, red\n"
         "  Variants: Size: Free Size; Color: Red\n\n"
         "Commands:\n"
-        "  /soldout D-1042 — Mark sold out\n"
+        "  /soldout D-1042 D-1050..D-1060 — Mark sold out\n"
         "  /hide D-1042 — Hide from catalog\n"
         "  /unhide D-1042 — Show in catalog\n"
         "  /editprice D-1042 15000 — Change price\n"
+        "  (these accept several IDs and D-x..D-y ranges)\n"
         "  /setrate 83.50 — Set USD exchange rate\n"
         "  /setwhatsapp 919876543210 — Set WhatsApp\n"
         "  /addinsta <url> — Add Instagram post to catalog\n"
         "  /removeinsta <#> — Remove Instagram post\n"
         "  /listinsta — List Instagram posts\n"
         "  /stats — Product counts by status\n"
-        "  /help — This message",
+        "  /help — This message\n\n"
+        "Find a product: type @<bot username> red silk (inline mode must be\n"
+        "enabled for the bot in @BotFather)",
     )
 
 
@@ -352,7 +506,7 @@ def handle_callback_query(callback_query):
         telegram_service.answer_callback_query(cb_id, "Invalid action")
         return
 
-    action, product_id_str = data.split(":", 1)
+    action, product_id_str, *args = data.split(":", 2)
 
     try:
         product_id = int(product_id_str)
@@ -369,6 +523,10 @@ def handle_callback_query(callback_query):
         _cb_approve(product, user_id, cb_id)
     elif action == "regen":
         _cb_regenerate(product, user_id, cb_id)
+    elif action == "styles":
+        _cb_variations(product, user_id, cb_id)
+    elif action == "pick" and args and args[0].isdigit():
+        _cb_pick_variation(product, user_id, cb_id, int(args[0]))
     elif action == "pub_orig":
         _cb_publish_original(product, user_id, cb_id)
     elif action == "discard":
@@ -402,10 +560,10 @@ def _cb_approve(product, admin_id, cb_id):
     # Update Telegram message
     if product.telegram_message_id:
         try:
-            telegram_service.edit_message_caption(
+            telegram_outbox.edit_message_text(
                 chat_id=product.telegram_chat_id,
                 message_id=product.telegram_message_id,
-                caption=f"PUBLISHED: {product.dress_id} — {product.title}",
+                text=f"PUBLISHED: {product.dress_id} — {product.title}",
             )
         except Exception:
             pass  # message may have been deleted
@@ -414,11 +572,43 @@ def _cb_approve(product, admin_id, cb_id):
 
 
 def _cb_regenerate(product, admin_id, cb_id):
-    """Regenerate AI image (new version)."""
+    """Regenerate AI image (new version).
+
+    Repeated presses while a regeneration is still pending attach to it
+    instead of reserving another version.
+    """
     if product.status != "DRAFT":
         telegram_service.answer_callback_query(cb_id, "Not in DRAFT state")
         return
 
+    with ai_queue.product_lock(product.id) as locked:
+        if not locked:
+            telegram_service.answer_callback_query(cb_id, "Busy, please try again")
+            return
+        pending = _coalesce(product, GENERATE_AI_IMAGE)
+        if pending is not None:
+            telegram_service.answer_callback_query(
+                cb_id, f"Already generating v{pending.kwargs.get('version')}..."
+            )
+            return
+        next_version = _enqueue_regeneration(product, admin_id)
+
+    if product.telegram_message_id:
+        try:
+            telegram_outbox.edit_message_text(
+                chat_id=product.telegram_chat_id,
+                message_id=product.telegram_message_id,
+                text=f"Regenerating AI v{next_version} for {product.dress_id}...",
+                reply_markup=None,
+            )
+        except Exception:
+            pass
+
+    telegram_service.answer_callback_query(cb_id, f"Regenerating v{next_version}...")
+
+
+def _enqueue_regeneration(product, admin_id):
+    """Reserve the next AI version and queue its generation; return the version."""
     # Determine next version
     latest_ai = (
         product.images.filter_by(type="AI_GENERATED")
@@ -448,28 +638,97 @@ def _cb_regenerate(product, admin_id, cb_id):
 
     original = product.original_image
 
-    task_queue.enqueue(
-        "app.workers.ai_generation.generate_ai_image",
+    ai_queue.enqueue(
+        GENERATE_AI_IMAGE,
+        admin_id=admin_id,
         product_id=product.id,
         image_id=ai_image.id,
         original_storage_key=original.storage_key,
         version=next_version,
+        fresh=True,  # the admin wants a new variant, not a cached one
         job_id=f"ai_gen_{ai_image.id}",
+        job_timeout=current_app.config["AI_JOB_TIMEOUT"],  # room for the cascade
         retry=Retry(max=3, interval=[30, 120, 300]),
     )
+    return next_version
+
+
+def _cb_variations(product, admin_id, cb_id):
+    """Generate every configured style at once (SPEC §11)."""
+    if product.status != "DRAFT":
+        telegram_service.answer_callback_query(cb_id, "Not in DRAFT state")
+        return
+
+    styles = current_app.config["AI_VARIATION_STYLES"][:9]  # album holds original + 9
+    if not styles:
+        telegram_service.answer_callback_query(cb_id, "No variation styles are configured")
+        return
+    with ai_queue.product_lock(product.id) as locked:
+        if not locked:
+            telegram_service.answer_callback_query(cb_id, "Busy, please try again")
+            return
+        if _coalesce(product, GENERATE_AI_VARIATIONS) is not None:
+            telegram_service.answer_callback_query(cb_id, "Styles are already being generated...")
+            return
+        images = product_service.add_ai_variations(product.id, styles, admin_id)
+
+        ai_queue.enqueue(
+            GENERATE_AI_VARIATIONS,
+            admin_id=admin_id,
+            bulk=True,  # K model calls; keep single regenerations ahead of it
+            product_id=product.id,
+            image_ids=[img.id for img in images],
+            styles=styles,
+            job_id=f"ai_variations_{images[0].id}",
+            job_timeout=600,  # K model calls share the Gemini rate limit
+            retry=Retry(max=2, interval=[60, 300]),
+        )
 
+    versions = f"v{images[0].version}–v{images[-1].version}"
     if product.telegram_message_id:
         try:
-            telegram_service.edit_message_caption(
+            telegram_outbox.edit_message_text(
                 chat_id=product.telegram_chat_id,
                 message_id=product.telegram_message_id,
-                caption=f"Regenerating AI v{next_version} for {product.dress_id}...",
+                text=f"Generating {len(styles)} styles ({versions}) for {product.dress_id}...",
                 reply_markup=None,
             )
         except Exception:
             pass
 
-    telegram_service.answer_callback_query(cb_id, f"Regenerating v{next_version}...")
+    telegram_service.answer_callback_query(cb_id, f"Generating {', '.join(styles)}...")
+
+
+def _coalesce(product, func_name):
+    """Return the product's pending job of the same kind, to attach to.
+
+    A pending job of another kind that no worker has started yet is
+    superseded by the new request: it is cancelled and the image
+    versions it reserved are dropped.
+    """
+    job = ai_queue.active_job(product.id)
+    if job is None:
+        return None
+    if job.func_name == func_name:
+        metrics_service.inc("ai_jobs_coalesced_total", labels={"result": "attached"})
+        return job
+    if ai_queue.cancel_if_waiting(job):
+        image_ids = job.kwargs.get("image_ids") or [job.kwargs.get("image_id")]
+        product_service.drop_pending_ai_images(product.id, image_ids)
+        metrics_service.inc("ai_jobs_coalesced_total", labels={"result": "superseded"})
+    return None
+
+
+def _cb_pick_variation(product, admin_id, cb_id, version):
+    """Publish the chosen variation; the other ones are archived."""
+    if product.status != "DRAFT":
+        telegram_service.answer_callback_query(cb_id, "Not in DRAFT state")
+        return
+
+    if not product_service.pick_ai_version(product.id, version, admin_id):
+        telegram_service.answer_callback_query(cb_id, f"v{version} is not available")
+        return
+    _cb_approve(product, admin_id, cb_id)
 
 
 def _cb_publish_original(product, admin_id, cb_id):
@@ -486,10 +745,10 @@ def _cb_publish_original(product, admin_id, cb_id):
 
     if product.telegram_message_id:
         try:
-            telegram_service.edit_message_caption(
+            telegram_outbox.edit_message_text(
                 chat_id=product.telegram_chat_id,
                 message_id=product.telegram_message_id,
-                caption=f"PUBLISHED (original): {product.dress_id}",
+                text=f"PUBLISHED (original): {product.dress_id}",
             )
         except Exception:
             pass
@@ -520,10 +779,10 @@ def _cb_discard(product, admin_id, cb_id):
 
     if message_id:
         try:
-            telegram_service.edit_message_caption(
+            telegram_outbox.edit_message_text(
                 chat_id=chat_id,
                 message_id=message_id,
-                caption=f"DISCARDED: {dress_id}",
+                text=f"DISCARDED: {dress_id}",
             )
         except Exception:
             pass
@@ -534,7 +793,7 @@ def _cb_discard(product, admin_id, cb_id):
 def _cb_edit_metadata(product, admin_id, cb_id):
     """Prompt admin to send metadata edits."""
     telegram_service.answer_callback_query(cb_id, "Send edit commands")
-    telegram_service.send_message(
+    telegram_outbox.send_message(
         product.telegram_chat_id,
         f"To edit {product.dress_id}, send:\n"
         f"  /editprice {product.dress_id} <new_price>\n\n"
@@ -546,7 +805,72 @@ def _cb_edit_metadata(product, admin_id, cb_id):
 # Helpers
 # ---------------------------------------------------------------------------
 
-def _extract_dress_id(text):
-    """Extract dress ID (e.g., D-1042) from command text."""
-    match = re.search(r"D-\d+", text, re.IGNORECASE)
-    return match.group().upper() if match else None
+def _select_upload(message):
+    """Return the file to ingest ({file_id, file_size}) or None.
+
+    For compressed photos, takes the smallest size that still meets
+    TELEGRAM_INGEST_MIN_SIDE instead of always the largest. Documents are
+    accepted when they are images (uncompressed originals).
+    """
+    if "photo" in message:
+        return telegram_service.select_photo_size(
+            message["photo"], current_app.config["TELEGRAM_INGEST_MIN_SIDE"]
+        )
+    document = message.get("document") or {}
+    if document.get("mime_type") in image_service.ALLOWED_CONTENT_TYPES:
+        return document
+    return None
+
+
+def _fetch_image(upload):
+    """Download an upload (refusing anything over MAX_FILE_SIZE) and sanitize it."""
+    max_bytes = image_service.MAX_FILE_SIZE
+    if (upload.get("file_size") or 0) > max_bytes:
+        raise ValueError(f"Image too large: {upload['file_size']} bytes (max {max_bytes})")
+    file_info = telegram_service.get_file(upload["file_id"])
+    image_bytes = telegram_service.download_file(file_info["file_path"], max_bytes=max_bytes)
+    return image_service.validate_image(image_bytes)
+
+
+def _fetch_images(uploads):
+    """Fetch several uploads concurrently, preserving order.
+
+    Returns (images, errors): sanitized JPEG bytes for the uploads that
+    succeeded and the ValueError messages for those that did not.
+    """
+    app = current_app._get_current_object()
+
+    def fetch(upload):
+        with app.app_context():
+            try:
+                return _fetch_image(upload), None
+            except ValueError as e:
+                return None, str(e)
+
+    workers = min(len(uploads), current_app.config["TELEGRAM_ALBUM_MAX_DOWNLOADS"])
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        results = list(pool.map(fetch, uploads))
+    images = [image for image, _ in results if image is not None]
+    errors = [error for _, error in results if error is not None]
+    return images, errors
+
+
+MAX_BULK_IDS = 500
+_DRESS_ID_OR_RANGE = re.compile(r"D-(\d+)(?:\s*\.\.\s*(?:D-)?(\d+))?", re.IGNORECASE)
+
+
+def _extract_dress_ids(text):
+    """Extract dress IDs and ranges, e.g. "D-1042 D-1050..D-1060".
+
+    Returns sorted unique IDs; raises ValueError for oversized ranges.
+    """
+    ids = set()
+    for match in _DRESS_ID_OR_RANGE.finditer(text):
+        first = int(match.group(1))
+        last = int(match.group(2) or first)
+        if last < first:
+            first, last = last, first
+        if last - first + 1 + len(ids) > MAX_BULK_IDS:
+            raise ValueError(f"Too many products — at most {MAX_BULK_IDS} per command.")
+        ids.update(range(first, last + 1))
+    return [f"D-{n}" for n in sorted(ids)]
@@ -10,16 +10,36 @@ def approval_keyboard(product_id):
                 {"text": "Regenerate", "callback_data": f"regen:{product_id}"},
             ],
             [
+                {"text": "Style Variations", "callback_data": f"styles:{product_id}"},
                 {"text": "Edit Metadata", "callback_data": f"edit_meta:{product_id}"},
-                {"text": "Publish Original Only", "callback_data": f"pub_orig:{product_id}"},
             ],
             [
+                {"text": "Publish Original Only", "callback_data": f"pub_orig:{product_id}"},
                 {"text": "Discard Draft", "callback_data": f"discard:{product_id}"},
             ],
         ]
     }
 
 
+def variation_picker_keyboard(product_id, options):
+    """Keyboard for choosing one of several AI variations.
+
+    `options` is a list of (version, style) pairs; picking one publishes
+    it and archives the others.
+    """
+    buttons = [
+        {"text": f"Use v{version} · {style}", "callback_data": f"pick:{product_id}:{version}"}
+        for version, style in options
+    ]
+    rows = [buttons[i:i + 2] for i in range(0, len(buttons), 2)]
+    rows.append([
+        {"text": "More Variations", "callback_data": f"styles:{product_id}"},
+        {"text": "Publish Original Only", "callback_data": f"pub_orig:{product_id}"},
+    ])
+    rows.append([{"text": "Discard Draft", "callback_data": f"discard:{product_id}"}])
+    return {"inline_keyboard": rows}
+
+
 def fallback_keyboard(product_id):
     """Keyboard shown when AI generation fails."""
     return {
@@ -1,11 +1,22 @@
 import logging
 import hmac
-from flask import request, current_app
+from datetime import datetime, timedelta, timezone
+import redis as _redis
+from flask import request, current_app, jsonify
+from sqlalchemy.exc import IntegrityError
+from app import extensions
+from app.extensions import db
+from app.models.processed_update import ProcessedUpdate
+from app.services import metrics_service
 from app.blueprints.telegram import telegram_bp
-from app.blueprints.telegram.handlers import handle_message, handle_callback_query
+from app.blueprints.telegram.handlers import answer_inline_query, handle_update
+from app.workers.telegram_updates import enqueue_update
 
 logger = logging.getLogger(__name__)
 
+DEDUP_KEY = "tg_update_seen:{update_id}"
+DEDUP_TTL = 24 * 3600  # Telegram stops redelivering well before this
+
 
 @telegram_bp.route("/webhook/<token>", methods=["POST"])
 def webhook(token):
@@ -15,6 +26,11 @@ def webhook(token):
     - Token in URL must match TELEGRAM_BOT_TOKEN
     - X-Telegram-Bot-Api-Secret-Token header must match TELEGRAM_WEBHOOK_SECRET
     - Sender must be in TELEGRAM_ADMIN_IDS allowlist
+
+    Updates are queued for the worker and acknowledged immediately; when
+    Redis is unavailable they are processed inline as before. Inline
+    queries are answered right here, in the webhook response body, from
+    the in-memory search index.
     """
     # Verify token in URL
     expected_token = current_app.config["TELEGRAM_BOT_TOKEN"]
@@ -39,10 +55,15 @@ def webhook(token):
             logger.info("Rejected non-admin user: %s", user_id)
             return "", 200  # silent reject — return 200 so Telegram doesn't retry
 
-        if "message" in update:
-            handle_message(update["message"])
-        elif "callback_query" in update:
-            handle_callback_query(update["callback_query"])
+        if "inline_query" in update:
+            return jsonify(answer_inline_query(update["inline_query"]))
+
+        if _is_duplicate(update.get("update_id")):
+            logger.info("Dropping redelivered update %s", update.get("update_id"))
+            return "", 200
+
+        if not enqueue_update(update):
+            handle_update(update)
 
     except Exception:
         logger.exception("Error processing Telegram update")
@@ -58,4 +79,43 @@ def _extract_user_id(update):
         return update["message"].get("from", {}).get("id")
     if "callback_query" in update:
         return update["callback_query"].get("from", {}).get("id")
+    if "inline_query" in update:
+        return update["inline_query"].get("from", {}).get("id")
     return None
+
+
+def _is_duplicate(update_id):
+    """Record an update_id; return True if it was already accepted.
+
+    Uses a Redis key with a TTL, falling back to the processed_updates
+    table when Redis is unavailable.
+    """
+    if update_id is None:
+        return False
+
+    redis_client = extensions.redis_client
+    if redis_client:
+        try:
+            first_seen = redis_client.set(
+                DEDUP_KEY.format(update_id=update_id), 1, nx=True, ex=DEDUP_TTL
+            )
+            if not first_seen:
+                metrics_service.inc("telegram_duplicate_updates_total", labels={"store": "redis"})
+            return not first_seen
+        except _redis.RedisError:
+            logger.warning("Redis dedup failed — falling back to DB", exc_info=True)
+
+    try:
+        db.session.add(ProcessedUpdate(update_id=update_id))
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        metrics_service.inc("telegram_duplicate_updates_total", labels={"store": "db"})
+        return True
+
+    if update_id % 100 == 0:
+        # Occasional pruning keeps the fallback table small
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=DEDUP_TTL)
+        ProcessedUpdate.query.filter(ProcessedUpdate.created_at < cutoff).delete()
+        db.session.commit()
+    return False
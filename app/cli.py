@@ -145,3 +145,101 @@ def register_cli(app):
         click.echo(f"Total products: {total}")
         for status, count in sorted(s.items()):
             click.echo(f"  {status}: {count}")
+
+    @app.cli.command("slow-queries")
+    @click.option("--limit", default=20, show_default=True, help="Entries to show")
+    @click.option("--clear", "clear_log", is_flag=True, help="Empty the log after dumping")
+    def slow_queries(limit, clear_log):
+        """Dump the slow-query log (newest first)."""
+        from app.services import slow_query_service
+
+        entries = slow_query_service.get_slow_queries(limit)
+        if not entries:
+            click.echo("No slow queries recorded.")
+        for entry in entries:
+            click.echo(
+                f"[{entry['at']}] {entry['duration_ms']}ms — {entry['source']}"
+            )
+            click.echo(f"  {entry['statement']}")
+            if entry.get("parameters"):
+                click.echo(f"  params: {entry['parameters']}")
+            if entry.get("plan"):
+                for line in entry["plan"].splitlines():
+                    click.echo(f"  | {line}")
+        if clear_log:
+            slow_query_service.clear()
+            click.echo("Slow-query log cleared.")
+
+    @app.cli.command("ai-stats")
+    @click.option("--hours", default=24.0, show_default=True, help="Window to report on")
+    def ai_stats(hours):
+        """Show AI generation latency percentiles and throughput."""
+        from datetime import timedelta
+        from app.services import job_metrics_service
+
+        s = job_metrics_service.get_stats(timedelta(hours=hours))
+        click.echo(
+            f"Last {hours:g}h: {s['runs']} runs, {s['ok']} ok, {s['failed']} failed, "
+            f"{s['retries']} retries, {s['cache_hits']} cache hits"
+        )
+        click.echo(
+            f"Throughput: {s['runs_per_hour']:.1f} runs/hour, {s['images_per_hour']:.1f} "
+            f"images/hour ({s['generated_per_hour']:.1f} from the model)"
+        )
+        if not s["total"]:
+            return
+        click.echo(f"{'stage':<10}{'count':>7}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}  (ms)")
+        for name, p in [("total", s["total"])] + list(s["stages"].items()):
+            click.echo(
+                f"{name:<10}{p['count']:>7}"
+                + "".join(f"{p[k]:>10.0f}" for k in ("p50", "p95", "p99", "max"))
+            )
+        if s["output_bytes"]:
+            click.echo(f"Output size: p50 {s['output_bytes']['p50'] / 1024:.0f} KB, "
+                       f"max {s['output_bytes']['max'] / 1024:.0f} KB")
+        for model, count in sorted(s["models"].items()):
+            click.echo(f"  {model}: {count} images")
+
+    @app.cli.command("export-static")
+    @click.option("--out", "out_dir", default="static_export", show_default=True,
+                  type=click.Path(file_okay=False), help="Output directory")
+    @click.option("--full", is_flag=True, help="Re-render everything, ignoring the manifest")
+    def export_static(out_dir, full):
+        """Pre-render the public storefront into a static directory."""
+        from app.services.export_service import export_site
+
+        result = export_site(out_dir, full=full)
+        click.echo(
+            f"Exported to {out_dir}: {result['pages']} pages rendered, "
+            f"{result['removed']} removed, {result['images']} images written."
+        )
+
+    @app.cli.command("worker")
+    @click.argument("queues", nargs=-1)
+    @click.option("--no-fork", is_flag=True,
+                  help="Run jobs in the worker process instead of a forked child")
+    @click.option("--concurrency", type=int, default=None,
+                  help="Jobs to run at once on threads (default: AI_WORKER_CONCURRENCY)")
+    @click.option("--with-scheduler", is_flag=True, help="Also run the RQ scheduler")
+    @click.option("--burst", is_flag=True, help="Exit once the queues are empty")
+    def worker(queues, no_fork, concurrency, with_scheduler, burst):
+        """Run an RQ worker with the app and AI model preloaded."""
+        from rq import Queue
+        from app import extensions
+        from app.workers import runner
+
+        if not extensions.redis_client:
+            raise click.ClickException("Redis is not available — check REDIS_URL")
+
+        runner.preload(current_app._get_current_object())
+        names = queues or [q.name for q in extensions.all_queues()]
+        queues = [Queue(name, connection=extensions.redis_client) for name in names]
+        concurrency = concurrency or current_app.config["AI_WORKER_CONCURRENCY"]
+        if concurrency > 1:
+            rq_worker = runner.ThreadPoolWorker(
+                queues, connection=extensions.redis_client, concurrency=concurrency
+            )
+        else:
+            worker_class = runner.PreloadedSimpleWorker if no_fork else runner.PreloadedWorker
+            rq_worker = worker_class(queues, connection=extensions.redis_client)
+        rq_worker.work(with_scheduler=with_scheduler, burst=burst)
@@ -22,6 +22,13 @@ class Config:
 
     REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
 
+    # Slow-query log (opt-in; 0 disables). Entries kept in a Redis ring buffer.
+    SLOW_QUERY_THRESHOLD_MS = float(os.environ.get("SLOW_QUERY_THRESHOLD_MS", "0"))
+    SLOW_QUERY_LOG_SIZE = int(os.environ.get("SLOW_QUERY_LOG_SIZE", "200"))
+
+    # /metrics bearer token (empty = unauthenticated)
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
     # Telegram
     TELEGRAM_BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN", "")
     TELEGRAM_WEBHOOK_SECRET = os.environ.get("TELEGRAM_WEBHOOK_SECRET", "")
@@ -30,6 +37,25 @@ class Config:
         for x in os.environ.get("TELEGRAM_ADMIN_IDS", "").split(",")
         if x.strip()
     ]
+    # Point at scripts/fake_telegram_api.py for local load tests
+    TELEGRAM_API_BASE_URL = os.environ.get("TELEGRAM_API_BASE_URL", "https://api.telegram.org")
+    # Smallest photo edge (px) worth ingesting; picks the cheapest PhotoSize
+    TELEGRAM_INGEST_MIN_SIDE = int(os.environ.get("TELEGRAM_INGEST_MIN_SIDE", "1280"))
+    # Album items arriving within this many seconds become one product
+    TELEGRAM_ALBUM_WINDOW = float(os.environ.get("TELEGRAM_ALBUM_WINDOW", "2"))
+    TELEGRAM_ALBUM_MAX_DOWNLOADS = int(os.environ.get("TELEGRAM_ALBUM_MAX_DOWNLOADS", "8"))
+    # Bot API HTTP client (one keep-alive pool per process)
+    TELEGRAM_HTTP2 = os.environ.get("TELEGRAM_HTTP2", "").lower() in ("1", "true", "yes")
+    TELEGRAM_CONNECT_TIMEOUT = float(os.environ.get("TELEGRAM_CONNECT_TIMEOUT", "5"))
+    TELEGRAM_READ_TIMEOUT = float(os.environ.get("TELEGRAM_READ_TIMEOUT", "30"))
+    TELEGRAM_MAX_CONNECTIONS = int(os.environ.get("TELEGRAM_MAX_CONNECTIONS", "10"))
+    TELEGRAM_MAX_RETRIES = int(os.environ.get("TELEGRAM_MAX_RETRIES", "3"))
+    # Longer flood-control waits fail fast instead of blocking the worker
+    TELEGRAM_MAX_RETRY_AFTER = int(os.environ.get("TELEGRAM_MAX_RETRY_AFTER", "60"))
+    # Outbound rate limits (messages/sec), shared across processes via Redis
+    TELEGRAM_GLOBAL_RATE = float(os.environ.get("TELEGRAM_GLOBAL_RATE", "25"))
+    TELEGRAM_CHAT_RATE = float(os.environ.get("TELEGRAM_CHAT_RATE", "1"))
+    TELEGRAM_CHAT_BURST = int(os.environ.get("TELEGRAM_CHAT_BURST", "3"))
 
     # S3
     S3_ENDPOINT_URL = os.environ.get("S3_ENDPOINT_URL", "")
@@ -41,9 +67,66 @@ class Config:
 
     # Gemini AI
     GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "")
+    # "gemini", or "local" for an offline deterministic stand-in (benchmarks)
+    AI_BACKEND = os.environ.get("AI_BACKEND", "gemini")
+    AI_LOCAL_LATENCY_MS = float(os.environ.get("AI_LOCAL_LATENCY_MS", "1500"))
+    AI_LOCAL_LATENCY_JITTER_MS = float(os.environ.get("AI_LOCAL_LATENCY_JITTER_MS", "0"))
+    AI_LOCAL_FAILURE_RATE = float(os.environ.get("AI_LOCAL_FAILURE_RATE", "0"))
+    # Generation jobs run at once per worker process (threads; 1 = classic RQ)
+    AI_WORKER_CONCURRENCY = int(os.environ.get("AI_WORKER_CONCURRENCY", "1"))
+    # Gemini requests allowed per minute across all workers, and burst size
+    AI_RATE_PER_MINUTE = float(os.environ.get("AI_RATE_PER_MINUTE", "10"))
+    AI_RATE_BURST = int(os.environ.get("AI_RATE_BURST", "2"))
+    # Reference photos are cropped to the garment, scaled to this longer
+    # side and re-encoded before upload; prepared copies are cached in Redis
+    AI_INPUT_MAX_SIDE = int(os.environ.get("AI_INPUT_MAX_SIDE", "1024"))
+    AI_INPUT_JPEG_QUALITY = int(os.environ.get("AI_INPUT_JPEG_QUALITY", "85"))
+    AI_INPUT_CACHE_TTL = int(os.environ.get("AI_INPUT_CACHE_TTL", "86400"))
+    # Cascade: backends ("name" or "name:model") tried in order after AI_BACKEND
+    AI_FALLBACK_BACKENDS = [
+        s.strip() for s in os.environ.get("AI_FALLBACK_BACKENDS", "").split(",") if s.strip()
+    ]
+    # Per-attempt timeout; a duplicate request is sent once a call is slower
+    # than this percentile of recent calls (0 = never hedge)
+    AI_ATTEMPT_TIMEOUT = float(os.environ.get("AI_ATTEMPT_TIMEOUT", "60"))
+    # RQ job_timeout of a single generation; the whole cascade (rate limit
+    # waits included) is cut off in time to finish inside it
+    AI_JOB_TIMEOUT = int(os.environ.get("AI_JOB_TIMEOUT", "300"))
+    AI_HEDGE_PERCENTILE = float(os.environ.get("AI_HEDGE_PERCENTILE", "95"))
+    AI_HEDGE_MIN_SAMPLES = int(os.environ.get("AI_HEDGE_MIN_SAMPLES", "20"))
+    # Circuit breaker per model: opens for AI_BREAKER_COOLDOWN seconds when at
+    # least MIN_REQUESTS calls within ~WINDOW seconds fail at ERROR_RATE or more
+    AI_BREAKER_WINDOW = int(os.environ.get("AI_BREAKER_WINDOW", "60"))
+    AI_BREAKER_MIN_REQUESTS = int(os.environ.get("AI_BREAKER_MIN_REQUESTS", "5"))
+    AI_BREAKER_ERROR_RATE = float(os.environ.get("AI_BREAKER_ERROR_RATE", "0.5"))
+    AI_BREAKER_COOLDOWN = int(os.environ.get("AI_BREAKER_COOLDOWN", "60"))
+    # AI jobs one admin may have queued or running at once per queue; more wait
+    AI_ADMIN_MAX_ACTIVE = int(os.environ.get("AI_ADMIN_MAX_ACTIVE", "2"))
+    # Styles generated together by the "Style Variations" button (max 9 per album)
+    AI_VARIATION_STYLES = [
+        s.strip() for s in os.environ.get("AI_VARIATION_STYLES", "casual,formal,festive").split(",")
+        if s.strip()
+    ]
 
     # App
     APP_URL = os.environ.get("APP_URL", "http://localhost:5000")
+    # Mixed into HTML ETags so a deploy invalidates cached pages
+    RELEASE_VERSION = os.environ.get(
+        "RELEASE_VERSION", os.environ.get("RAILWAY_GIT_COMMIT_SHA", "dev")
+    )
+
+    # Catalog rendering
+    CATALOG_PER_PAGE = int(os.environ.get("CATALOG_PER_PAGE", "24"))
+    # Stream catalog HTML as it renders (lower TTFB / memory for big pages)
+    CATALOG_STREAMING = os.environ.get("CATALOG_STREAMING", "").lower() in ("1", "true", "yes")
+
+    # HTML caching (browsers + CDN); pages revalidate via ETag/Last-Modified
+    CATALOG_CACHE_CONTROL = os.environ.get(
+        "CATALOG_CACHE_CONTROL", "public, max-age=60, stale-while-revalidate=600"
+    )
+    PRODUCT_CACHE_CONTROL = os.environ.get(
+        "PRODUCT_CACHE_CONTROL", "public, max-age=300, stale-while-revalidate=86400"
+    )
 
     # Security / request hardening
     SESSION_COOKIE_HTTPONLY = True
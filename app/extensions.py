@@ -11,7 +11,9 @@ migrate = Migrate()
 
 # Initialized lazily in create_app
 redis_client: _redis.Redis = None  # type: ignore
-task_queue: Queue = None  # type: ignore
+ai_interactive_queue: Queue = None  # type: ignore
+ai_bulk_queue: Queue = None  # type: ignore
+update_queue: Queue = None  # type: ignore
 
 
 class DummyQueue:
@@ -23,17 +25,27 @@ class DummyQueue:
 
 
 def init_redis(app):
-    global redis_client, task_queue
+    global redis_client, ai_interactive_queue, ai_bulk_queue, update_queue
     redis_url = app.config.get("REDIS_URL", "")
     if not redis_url:
         logger.warning("REDIS_URL not set — queue disabled (dev mode)")
-        task_queue = DummyQueue()
+        ai_interactive_queue = ai_bulk_queue = DummyQueue()
+        update_queue = DummyQueue()
         return
 
     try:
         redis_client = _redis.from_url(redis_url, decode_responses=False)
         redis_client.ping()
-        task_queue = Queue("ai-generation", connection=redis_client)
+        ai_interactive_queue = Queue("ai-interactive", connection=redis_client)
+        ai_bulk_queue = Queue("ai-bulk", connection=redis_client)
+        update_queue = Queue("telegram-updates", connection=redis_client)
     except Exception as e:
         logger.warning("Redis connection failed (%s) — queue disabled", e)
-        task_queue = DummyQueue()
+        redis_client = None
+        ai_interactive_queue = ai_bulk_queue = DummyQueue()
+        update_queue = DummyQueue()
+
+
+def all_queues():
+    """Return the live RQ queues in priority order (none without Redis)."""
+    return [q for q in (update_queue, ai_interactive_queue, ai_bulk_queue) if isinstance(q, Queue)]
@@ -3,3 +3,6 @@ from app.models.variant import VariantOption  # noqa: F401
 from app.models.image import Image  # noqa: F401
 from app.models.settings import Settings  # noqa: F401
 from app.models.audit_log import AuditLog  # noqa: F401
+from app.models.processed_update import ProcessedUpdate  # noqa: F401
+from app.models.ai_result import AIResult  # noqa: F401
+from app.models.ai_job_metric import AIJobMetric  # noqa: F401
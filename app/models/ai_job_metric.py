@@ -0,0 +1,33 @@
+from datetime import datetime, timezone
+from app.extensions import db
+
+
+class AIJobMetric(db.Model):
+    """Timings and outcome of one AI generation job run (one row per attempt)."""
+
+    __tablename__ = "ai_job_metrics"
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(64))
+    kind = db.Column(db.String(20), nullable=False)  # single, variations
+    product_id = db.Column(db.Integer, index=True)
+    status = db.Column(db.String(10), nullable=False)  # ok, failed
+    model_name = db.Column(db.String(100))
+    attempt = db.Column(db.Integer, nullable=False, default=1)  # 2+ = RQ retry
+    cache_hit = db.Column(db.Boolean, nullable=False, default=False)
+    reference_bytes = db.Column(db.Integer)
+    output_bytes = db.Column(db.Integer)
+    images = db.Column(db.Integer, nullable=False, default=0)  # made READY by this run
+    generated = db.Column(db.Integer, nullable=False, default=0)  # of which from the model
+    total_ms = db.Column(db.Integer, nullable=False)
+    stages = db.Column(db.JSON)  # stage name -> milliseconds
+    created_at = db.Column(
+        db.DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        index=True,
+    )
+
+    STAGES = ("lock", "load", "cache", "prepare", "model", "verify", "encode", "commit", "preview")
+
+    def __repr__(self):
+        return f"<AIJobMetric {self.kind} {self.status} {self.total_ms}ms>"
@@ -0,0 +1,20 @@
+from datetime import datetime, timezone
+from app.extensions import db
+
+
+class AIResult(db.Model):
+    """Cached AI generation output, keyed by a hash of everything that shapes it."""
+
+    __tablename__ = "ai_results"
+
+    cache_key = db.Column(db.String(64), primary_key=True)  # sha256 hex
+    model_name = db.Column(db.String(100), nullable=False)
+    image_data = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(
+        db.DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        index=True,
+    )
+
+    def __repr__(self):
+        return f"<AIResult {self.cache_key[:12]} ({self.model_name})>"
@@ -25,7 +25,10 @@ class AuditLog(db.Model):
         "CREATE_DRAFT",
         "PUBLISH",
         "PUBLISH_ORIGINAL_ONLY",
+        "ADD_PHOTOS",
         "REGENERATE_AI",
+        "GENERATE_VARIATIONS",
+        "PICK_AI_VERSION",
         "DISCARD",
         "MARK_SOLD_OUT",
         "HIDE",
@@ -18,6 +18,7 @@ class Image(db.Model):
     url = db.Column(db.String(1024))
     status = db.Column(db.String(20), nullable=False, default="PENDING")
     image_data = db.Column(db.LargeBinary)  # JPEG bytes stored in Postgres
+    telegram_file_id = db.Column(db.String(255))  # reused for re-sends
     created_at = db.Column(
         db.DateTime(timezone=True),
         default=lambda: datetime.now(timezone.utc),
@@ -28,7 +29,7 @@ class Image(db.Model):
     )
 
     TYPES = {"ORIGINAL", "AI_GENERATED"}
-    STATUSES = {"PENDING", "READY", "FAILED"}
+    STATUSES = {"PENDING", "READY", "FAILED", "ARCHIVED"}  # ARCHIVED: variation not picked
 
     def __repr__(self):
         return f"<Image {self.type} v{self.version} [{self.status}]>"
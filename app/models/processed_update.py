@@ -0,0 +1,18 @@
+from datetime import datetime, timezone
+from app.extensions import db
+
+
+class ProcessedUpdate(db.Model):
+    """Telegram update_ids already accepted (DB fallback for dedup)."""
+
+    __tablename__ = "processed_updates"
+
+    update_id = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    created_at = db.Column(
+        db.DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        index=True,
+    )
+
+    def __repr__(self):
+        return f"<ProcessedUpdate {self.update_id}>"
@@ -58,7 +58,19 @@ class Product(db.Model):
 
     @property
     def original_image(self):
-        return self.images.filter_by(type="ORIGINAL", status="READY").first()
+        return (
+            self.images.filter_by(type="ORIGINAL", status="READY")
+            .order_by("version")
+            .first()
+        )
+
+    @property
+    def original_images(self):
+        return (
+            self.images.filter_by(type="ORIGINAL", status="READY")
+            .order_by("version")
+            .all()
+        )
 
     @property
     def ai_image(self):
@@ -0,0 +1,128 @@
+"""Routing of AI generation jobs to prioritised, per-admin fair queues.
+
+Interactive work (an admin pressed a button and is watching the chat)
+goes to `ai-interactive`; batch work goes to `ai-bulk`. Workers list the
+interactive queue first, and RQ always drains queues in the order given,
+so bulk jobs only run when no interactive job is waiting.
+
+Within a queue each admin gets at most AI_ADMIN_MAX_ACTIVE jobs queued or
+running at once. Further jobs are deferred behind that admin's oldest
+active job (an RQ dependency), so one admin's burst is fed into the
+queue a few jobs at a time and interleaves with everyone else's work.
+
+The latest job per product is remembered too, so handlers can coalesce
+repeated requests for one product into the job already pending.
+"""
+import logging
+from contextlib import contextmanager
+from rq.exceptions import NoSuchJobError
+from rq.job import Dependency, Job, JobStatus
+from flask import current_app
+from app import extensions
+
+logger = logging.getLogger(__name__)
+
+ADMIN_JOBS_KEY = "ai_admin_jobs:{queue}:{admin_id}"
+ADMIN_JOBS_TTL = 86400
+PRODUCT_JOB_KEY = "ai_product_job:{product_id}"
+PRODUCT_LOCK_KEY = "ai_enqueue:{product_id}"
+
+_WAITING = {JobStatus.QUEUED, JobStatus.DEFERRED, JobStatus.SCHEDULED}
+_ACTIVE = _WAITING | {JobStatus.STARTED}
+
+
+def enqueue(func, *args, admin_id, bulk=False, **kwargs):
+    """Enqueue an AI job for `admin_id` on the interactive or bulk queue.
+
+    Takes the same arguments as Queue.enqueue. Returns the job, or None
+    without Redis.
+    """
+    queue = extensions.ai_bulk_queue if bulk else extensions.ai_interactive_queue
+    if isinstance(queue, extensions.DummyQueue):
+        return queue.enqueue(func, *args, **kwargs)
+
+    key = ADMIN_JOBS_KEY.format(queue=queue.name, admin_id=admin_id)
+    limit = current_app.config["AI_ADMIN_MAX_ACTIVE"]
+    depends_on = _fair_dependency(queue.connection, key, limit)
+    job = queue.enqueue(func, *args, depends_on=depends_on, **kwargs)
+
+    pipe = queue.connection.pipeline()
+    pipe.rpush(key, job.id)
+    pipe.ltrim(key, -limit, -1)
+    pipe.expire(key, ADMIN_JOBS_TTL)
+    if "product_id" in kwargs:
+        pipe.set(PRODUCT_JOB_KEY.format(product_id=kwargs["product_id"]), job.id,
+                 ex=ADMIN_JOBS_TTL)
+    pipe.execute()
+    if depends_on is not None:
+        logger.info("Deferred %s behind admin %s's earlier job", job.id, admin_id)
+    return job
+
+
+def active_job(product_id):
+    """The product's most recent AI job if it is still queued or running."""
+    redis_client = extensions.redis_client
+    if not redis_client:
+        return None
+    job_id = redis_client.get(PRODUCT_JOB_KEY.format(product_id=product_id))
+    if not job_id:
+        return None
+    try:
+        job = Job.fetch(job_id.decode() if isinstance(job_id, bytes) else job_id,
+                        connection=redis_client)
+    except NoSuchJobError:
+        return None
+    return job if job.get_status() in _ACTIVE else None
+
+
+def cancel_if_waiting(job):
+    """Cancel a job that no worker has started yet. Returns whether it was.
+
+    Jobs deferred behind it for per-admin fairness (possibly for other
+    products) are released, as they would be had it failed.
+    """
+    if job.get_status() not in _WAITING:
+        return False
+    job.cancel(enqueue_dependents=True)
+    logger.info("Cancelled superseded AI job %s", job.id)
+    return True
+
+
+@contextmanager
+def product_lock(product_id):
+    """Serialise the check-then-enqueue for one product across processes.
+
+    Yields whether the lock is held; callers must not enqueue when it is
+    not (another request for the product is still being handled).
+    """
+    redis_client = extensions.redis_client
+    if not redis_client:
+        yield True
+        return
+    lock = redis_client.lock(PRODUCT_LOCK_KEY.format(product_id=product_id),
+                             timeout=10, blocking_timeout=5)
+    acquired = lock.acquire()
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            try:
+                lock.release()
+            except Exception:
+                pass  # lock may have expired
+
+
+def _fair_dependency(connection, key, limit):
+    """The job a new one must wait for, or None if the admin has a free slot.
+
+    The list holds the admin's `limit` most recent job ids, oldest first;
+    when all of them are still active the new job chains onto the oldest.
+    """
+    job_ids = [i.decode() if isinstance(i, bytes) else i for i in connection.lrange(key, 0, -1)]
+    active = [
+        job for job in Job.fetch_many(job_ids, connection=connection)
+        if job is not None and job.get_status(refresh=False) in _ACTIVE
+    ]
+    if len(active) < limit:
+        return None
+    return Dependency(jobs=[active[0].id], allow_failure=True)
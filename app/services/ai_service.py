@@ -1,8 +1,34 @@
+import hashlib
 import io
+import logging
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import google.generativeai as genai
-from PIL import Image as PILImage
+from PIL import Image as PILImage, ImageEnhance, ImageOps
 from flask import current_app
+from rq import get_current_job
+from app import extensions
+from app.services import (
+    circuit_breaker, image_service, job_metrics_service, metrics_service, rate_limiter,
+    storage_service,
+)
+from app.services.ai_styles import AI_STYLES
 
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "gemini-2.0-flash-exp"
+REFERENCE_KEY = "ai_ref:{digest}:{max_side}:{quality}"
+LATENCY_KEY = "ai_latency:{model}"
+LATENCY_SAMPLES = 200
+DEADLINE_MARGIN = 20  # seconds a job needs after generation (store, preview)
+
+_models = {}
+_model_lock = threading.Lock()
+_local_latencies = {}  # model -> deque of seconds, used when Redis is unavailable
 
 AI_PROMPT = """Generate a photorealistic studio photograph of an Indian woman wearing \
 the exact garment shown in the reference image.
@@ -30,16 +56,219 @@ NEGATIVE CONSTRAINTS — strictly avoid:
 - No color shifts or artistic filters"""
 
 
+def style_prompt(style=None):
+    """The full generation prompt for a style (None = the default studio look)."""
+    if style is not None and style not in AI_STYLES:
+        raise ValueError(f"Unknown AI style {style!r} (expected one of {sorted(AI_STYLES)})")
+    extra = AI_STYLES.get(style or "studio")
+    return f"{AI_PROMPT}\n\n{extra}" if extra else AI_PROMPT
+
+
 def configure():
     """Configure Gemini with API key."""
     genai.configure(api_key=current_app.config["GEMINI_API_KEY"])
 
 
-def generate_image(original_image_bytes):
+def get_model(model_name=MODEL_NAME):
+    """Return the process-wide Gemini model, configuring the client once.
+
+    The preloaded worker calls this before forking so work-horses inherit
+    a ready model instead of rebuilding it per job.
+    """
+    with _model_lock:
+        if model_name not in _models:
+            if not _models:
+                configure()
+            _models[model_name] = genai.GenerativeModel(model_name)
+    return _models[model_name]
+
+
+def wait_for_rate_limit(max_wait=120):
+    """Take a token from the Gemini bucket shared by every worker thread and process.
+
+    Callers in a job pass the time left before its deadline as `max_wait`.
+    """
+    per_minute = current_app.config["AI_RATE_PER_MINUTE"]
+    waited = rate_limiter.acquire(
+        [("gemini", per_minute / 60, current_app.config["AI_RATE_BURST"])],
+        max_wait=max(0.0, max_wait),
+    )
+    metrics_service.observe("ai_rate_limit_wait_seconds", waited)
+
+
+class GeminiBackend:
+    """Google Gemini image generation (the production backend)."""
+
+    name = "gemini"
+    params = {"response_mime_type": "image/jpeg"}
+    rate_limited = True
+
+    def __init__(self, model_name=MODEL_NAME):
+        self.model_name = model_name
+
+    def preload(self):
+        if not current_app.config.get("GEMINI_API_KEY"):
+            logger.warning("GEMINI_API_KEY not set — AI model not preloaded")
+            return
+        get_model(self.model_name)
+
+    def generate(self, reference, prompt):
+        # Send the prepared JPEG as-is rather than letting the SDK re-encode
+        response = get_model(self.model_name).generate_content(
+            [prompt, {"mime_type": "image/jpeg", "data": reference}],
+            generation_config=genai.GenerationConfig(**self.params),
+        )
+
+        # Extract image bytes from response
+        if not response.candidates:
+            raise RuntimeError("Gemini returned no candidates")
+
+        candidate = response.candidates[0]
+
+        # Handle inline image data
+        for part in candidate.content.parts:
+            if hasattr(part, "inline_data") and part.inline_data:
+                return part.inline_data.data
+
+        raise RuntimeError("Gemini response did not contain an image")
+
+
+class LocalBackend:
+    """Offline stand-in for benchmarks and soak tests.
+
+    Produces a deterministic "studio" image (the garment enhanced and
+    centred on a cream backdrop) after an artificial delay, and fails at
+    a configurable rate. No network access.
+    """
+
+    name = "local"
+    params = {}
+    rate_limited = False
+
+    def __init__(self, model_name="local-pillow-v1"):
+        self.model_name = model_name
+
+    def preload(self):
+        pass
+
+    def generate(self, reference, prompt):
+        config = current_app.config
+        delay_ms = config["AI_LOCAL_LATENCY_MS"] + random.uniform(
+            -config["AI_LOCAL_LATENCY_JITTER_MS"], config["AI_LOCAL_LATENCY_JITTER_MS"]
+        )
+        time.sleep(max(delay_ms, 0) / 1000)
+        if random.random() < config["AI_LOCAL_FAILURE_RATE"]:
+            raise RuntimeError("Simulated AI backend failure")
+
+        canvas = PILImage.new("RGB", (768, 1024), (244, 238, 228))
+        garment = ImageOps.contain(PILImage.open(io.BytesIO(reference)), (640, 896))
+        # Vary the look per prompt so styles differ but stay deterministic
+        tint = int(hashlib.sha256(prompt.encode()).hexdigest()[:2], 16) / 255
+        garment = ImageEnhance.Color(garment).enhance(1.05 + 0.2 * tint)
+        garment = ImageOps.autocontrast(garment, cutoff=1)
+        canvas.paste(garment, ((768 - garment.width) // 2, (1024 - garment.height) // 2))
+        buffer = io.BytesIO()
+        canvas.save(buffer, format="JPEG", quality=90)
+        return buffer.getvalue()
+
+
+BACKENDS = {"gemini": GeminiBackend, "local": LocalBackend}
+_backends = {}
+
+
+def get_backend(spec=None):
+    """Return a backend by spec, "name" or "name:model" (one instance per process).
+
+    Defaults to AI_BACKEND, the primary backend.
+    """
+    spec = spec or current_app.config["AI_BACKEND"]
+    name, _, model_name = spec.partition(":")
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown AI backend {spec!r} (expected one of {sorted(BACKENDS)})")
+    if spec not in _backends:
+        _backends[spec] = BACKENDS[name](model_name) if model_name else BACKENDS[name]()
+    return _backends[spec]
+
+
+def get_cascade():
+    """The primary backend followed by AI_FALLBACK_BACKENDS, in order."""
+    return [get_backend()] + [get_backend(s) for s in current_app.config["AI_FALLBACK_BACKENDS"]]
+
+
+def _reference_settings():
+    config = current_app.config
+    return {"max_side": config["AI_INPUT_MAX_SIDE"], "quality": config["AI_INPUT_JPEG_QUALITY"]}
+
+
+def result_cache_key(original_image_bytes, variation, style=None):
+    """Cache key for generating `variation` from this original with the current backend."""
+    backend = get_backend()
+    params = {**backend.params, "input": _reference_settings()}
+    return storage_service.ai_result_key(
+        original_image_bytes, style_prompt(style), backend.model_name, params, variation
+    )
+
+
+def prepare_reference(original_image_bytes):
+    """Return the cropped, downscaled JPEG sent to the model for this original.
+
+    Cached in Redis per original and preparation settings, so
+    regenerations and batch variations prepare each photo once.
+    """
+    settings = _reference_settings()
+    key = REFERENCE_KEY.format(
+        digest=hashlib.sha256(original_image_bytes).hexdigest(), **settings
+    )
+    redis_client = extensions.redis_client
+    if redis_client:
+        try:
+            cached = redis_client.get(key)
+            metrics_service.record_cache("ai_reference", cached is not None)
+            if cached is not None:
+                return cached
+        except Exception:
+            logger.debug("Could not read prepared reference", exc_info=True)
+
+    reference = image_service.prepare_reference(original_image_bytes, **settings)
+    if redis_client:
+        try:
+            redis_client.set(key, reference, ex=current_app.config["AI_INPUT_CACHE_TTL"])
+        except Exception:
+            logger.debug("Could not cache prepared reference", exc_info=True)
+    return reference
+
+
+def generate_variations(original_image_bytes, styles):
+    """Generate one image per style concurrently from a single prepared reference.
+
+    Returns a list aligned with `styles` holding (JPEG bytes, backend)
+    pairs, or the exception raised for that style, so one failed style
+    does not lose the others.
+    """
+    reference = prepare_reference(original_image_bytes)
+    app = current_app._get_current_object()
+    deadline = job_deadline()  # the style threads cannot see the RQ job
+
+    def run(style):
+        with app.app_context():
+            try:
+                return generate(original_image_bytes, style=style, reference=reference,
+                                deadline=deadline)
+            except Exception as e:
+                logger.warning("AI style %s failed: %s", style, e)
+                return e
+
+    with ThreadPoolExecutor(max_workers=len(styles) or 1, thread_name_prefix="ai-style") as pool:
+        return list(pool.map(run, styles))
+
+
+def generate_image(original_image_bytes, style=None, reference=None):
     """Generate AI hero image from original garment photo.
 
     Args:
         original_image_bytes: bytes of the original garment image
+        style: key of AI_STYLES, or None for the default studio look
+        reference: already prepared reference (see prepare_reference)
 
     Returns:
         bytes of the generated image (JPEG)
@@ -47,41 +276,230 @@ def generate_image(original_image_bytes):
     Raises:
         Exception on API errors or invalid output
     """
-    configure()
+    return generate(original_image_bytes, style, reference)[0]
+
+
+def generate(original_image_bytes, style=None, reference=None, timer=None, deadline=None):
+    """Like generate_image, but also return the backend that produced the image.
+
+    Backends are tried in cascade order. One whose circuit breaker is
+    open is skipped without a call; one that errors or exceeds
+    AI_ATTEMPT_TIMEOUT hands over to the next. The whole cascade, rate
+    limit waits included, stops at `deadline` (time.monotonic(); default
+    job_deadline()) so RQ's death penalty never cuts a fallback short.
+    `timer` (a JobTimer) receives the prepare/model/encode stage timings.
+    """
+    prompt = style_prompt(style)
+    if deadline is None:
+        deadline = job_deadline()
+    if reference is None:
+        with job_metrics_service.stage(timer, "prepare"):
+            reference = prepare_reference(original_image_bytes)
+    if timer is not None:
+        timer.note(reference_bytes=len(reference))
 
-    # Load and prepare reference image
-    original = PILImage.open(io.BytesIO(original_image_bytes))
-    if original.mode != "RGB":
-        original = original.convert("RGB")
+    errors = []
+    for backend in get_cascade():
+        labels = {"backend": backend.name, "model": backend.model_name}
+        if time.monotonic() >= deadline:
+            errors.append(f"{backend.model_name}: out of time")
+            break
+        if not circuit_breaker.allow(backend.model_name, _breaker_settings()):
+            metrics_service.inc("ai_model_requests_total", labels={**labels, "result": "circuit_open"})
+            errors.append(f"{backend.model_name}: circuit open")
+            continue
+        metrics_service.observe("ai_reference_bytes", len(reference), labels)
+        started = time.perf_counter()
+        try:
+            image_bytes, verify_seconds = _attempt(backend, reference, prompt, deadline)
+        except Exception as e:
+            job_metrics_service.record(timer, "model", time.perf_counter() - started)
+            logger.warning("AI model %s failed: %s", backend.model_name, e)
+            errors.append(f"{backend.model_name}: {e}")
+            continue
+        job_metrics_service.record(
+            timer, "model", time.perf_counter() - started - verify_seconds
+        )
+        job_metrics_service.record(timer, "verify", verify_seconds)
+        logger.info(
+            "AI model %s produced the image from a %d byte reference (original %d bytes)",
+            backend.model_name, len(reference), len(original_image_bytes),
+        )
+        with job_metrics_service.stage(timer, "encode"):
+            image_bytes = _reencode(image_bytes)
+        if timer is not None:
+            timer.note(model_name=backend.model_name, output_bytes=len(image_bytes))
+        return image_bytes, backend
+    raise RuntimeError("All AI backends failed — " + "; ".join(errors))
 
-    model = genai.GenerativeModel("gemini-2.0-flash-exp")
 
-    response = model.generate_content(
-        [AI_PROMPT, original],
-        generation_config=genai.GenerationConfig(
-            response_mime_type="image/jpeg",
-        ),
+def job_deadline():
+    """time.monotonic() by which generation must finish inside the current job.
+
+    The RQ job's own timeout, counted from when it started, less
+    DEADLINE_MARGIN for storing the result and sending the preview.
+    Outside a job, AI_JOB_TIMEOUT from now.
+    """
+    timeout, elapsed = current_app.config["AI_JOB_TIMEOUT"], 0.0
+    job = get_current_job()
+    if job is not None and job.timeout and job.timeout > 0:
+        timeout = job.timeout
+        if job.started_at is not None:
+            started = job.started_at
+            if started.tzinfo is None:
+                started = started.replace(tzinfo=timezone.utc)
+            elapsed = max(0.0, (datetime.now(timezone.utc) - started).total_seconds())
+    return time.monotonic() + timeout - elapsed - DEADLINE_MARGIN
+
+
+def _attempt(backend, reference, prompt, deadline):
+    """One call to `backend`, hedged and bounded by AI_ATTEMPT_TIMEOUT.
+
+    Returns the image and the seconds spent verifying it.
+
+    If the call is still running once it is slower than the backend's
+    AI_HEDGE_PERCENTILE latency, a second identical request is sent and
+    whichever finishes first wins. Calls that time out or lose the race
+    keep running in the background; their result is discarded and, so
+    that a timeout counts once and stale outcomes cannot move a
+    half-open breaker, not recorded. Those background calls and hedges
+    are not bounded by AI_WORKER_CONCURRENCY.
+    """
+    config = current_app.config
+    app = current_app._get_current_object()
+    labels = {"backend": backend.name, "model": backend.model_name}
+    if backend.rate_limited:
+        wait_for_rate_limit(deadline - time.monotonic())
+
+    abandoned = threading.Event()
+
+    def call(rate_limit):
+        with app.app_context():
+            if rate_limit:
+                wait_for_rate_limit(deadline - time.monotonic())
+            start = time.perf_counter()
+            try:
+                image_bytes = backend.generate(reference, prompt)
+                verify_started = time.perf_counter()
+                _validate(image_bytes)
+                verify_seconds = time.perf_counter() - verify_started
+            except Exception:
+                if abandoned.is_set():
+                    raise
+                circuit_breaker.record(backend.model_name, False, _breaker_settings())
+                metrics_service.inc("ai_model_requests_total", labels={**labels, "result": "error"})
+                raise
+            elapsed = time.perf_counter() - start
+            if abandoned.is_set():
+                return image_bytes, verify_seconds
+            circuit_breaker.record(backend.model_name, True, _breaker_settings())
+            metrics_service.inc("ai_model_requests_total", labels={**labels, "result": "ok"})
+            metrics_service.observe("ai_model_duration_seconds", elapsed, labels)
+            _record_latency(backend.model_name, elapsed)
+            return image_bytes, verify_seconds
+
+    hedge_after = _hedge_delay(backend.model_name)
+    started = time.monotonic()
+    timeout = min(config["AI_ATTEMPT_TIMEOUT"], max(0.0, deadline - started))
+    deadline = started + timeout
+    pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ai-attempt")
+    pending = {pool.submit(call, False): "primary"}
+    hedged, error = False, None
+    try:
+        while pending:
+            until = deadline
+            if hedge_after is not None and not hedged:
+                until = min(until, started + hedge_after)
+            done, _ = wait(pending, timeout=max(0.0, until - time.monotonic()),
+                           return_when=FIRST_COMPLETED)
+            for future in done:
+                role = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                if hedged:
+                    metrics_service.inc("ai_hedged_requests_total", labels={**labels, "winner": role})
+                return result
+
+            if pending and time.monotonic() >= deadline:
+                circuit_breaker.record(backend.model_name, False, _breaker_settings())
+                metrics_service.inc("ai_model_requests_total", labels={**labels, "result": "timeout"})
+                raise TimeoutError(f"no response within {timeout:.0f}s")
+            if pending and not hedged and hedge_after is not None:
+                hedged = True
+                pending[pool.submit(call, backend.rate_limited)] = "hedge"
+        if hedged:
+            metrics_service.inc("ai_hedged_requests_total", labels={**labels, "winner": "none"})
+        raise error
+    finally:
+        abandoned.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _hedge_delay(model_name):
+    """Seconds after which to hedge a call, or None if hedging is off or unprimed."""
+    config = current_app.config
+    percentile = config["AI_HEDGE_PERCENTILE"]
+    if not percentile:
+        return None
+    samples = sorted(_latencies(model_name))
+    if len(samples) < config["AI_HEDGE_MIN_SAMPLES"]:
+        return None
+    index = min(len(samples) - 1, int(len(samples) * percentile / 100))
+    return samples[index]
+
+
+def _record_latency(model_name, seconds):
+    redis_client = extensions.redis_client
+    if redis_client:
+        try:
+            key = LATENCY_KEY.format(model=model_name)
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.lpush(key, f"{seconds:.3f}")
+            pipe.ltrim(key, 0, LATENCY_SAMPLES - 1)
+            pipe.execute()
+            return
+        except Exception:
+            logger.debug("Could not record AI latency", exc_info=True)
+    with _model_lock:
+        _local_latencies.setdefault(model_name, deque(maxlen=LATENCY_SAMPLES)).append(seconds)
+
+
+def _latencies(model_name):
+    redis_client = extensions.redis_client
+    if redis_client:
+        try:
+            raw = redis_client.lrange(LATENCY_KEY.format(model=model_name), 0, -1)
+            return [float(v) for v in raw]
+        except Exception:
+            logger.debug("Could not read AI latencies", exc_info=True)
+    with _model_lock:
+        return list(_local_latencies.get(model_name, ()))
+
+
+def _breaker_settings():
+    config = current_app.config
+    return circuit_breaker.BreakerSettings(
+        window=config["AI_BREAKER_WINDOW"],
+        min_requests=config["AI_BREAKER_MIN_REQUESTS"],
+        error_rate=config["AI_BREAKER_ERROR_RATE"],
+        cooldown=config["AI_BREAKER_COOLDOWN"],
+        probe_timeout=config["AI_ATTEMPT_TIMEOUT"],
     )
 
-    # Extract image bytes from response
-    if not response.candidates:
-        raise RuntimeError("Gemini returned no candidates")
-
-    candidate = response.candidates[0]
-
-    # Handle inline image data
-    for part in candidate.content.parts:
-        if hasattr(part, "inline_data") and part.inline_data:
-            image_bytes = part.inline_data.data
-            # Validate it's actually an image
-            img = PILImage.open(io.BytesIO(image_bytes))
-            img.verify()
-            # Re-encode as high-quality JPEG
-            img = PILImage.open(io.BytesIO(image_bytes))
-            if img.mode != "RGB":
-                img = img.convert("RGB")
-            buffer = io.BytesIO()
-            img.save(buffer, format="JPEG", quality=90)
-            return buffer.getvalue()
-
-    raise RuntimeError("Gemini response did not contain an image")
+
+def _validate(image_bytes):
+    """Raise if the model output is not a readable image."""
+    PILImage.open(io.BytesIO(image_bytes)).verify()
+
+
+def _reencode(image_bytes):
+    """Re-encode model output as high-quality RGB JPEG."""
+    img = PILImage.open(io.BytesIO(image_bytes))
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
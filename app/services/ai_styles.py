@@ -0,0 +1,25 @@
+"""Style variations (SPEC §11) for AI generation.
+
+Kept apart from ai_service so the web app can check AI_VARIATION_STYLES
+at start-up without importing the Gemini client.
+"""
+
+# Appended to the generation prompt; "studio" is the default look
+AI_STYLES = {
+    "studio": "",
+    "casual": "Style: relaxed everyday look, natural smile, walking pose, "
+              "soft daylight; keep the plain studio backdrop.",
+    "formal": "Style: elegant formal occasion look, poised upright stance, "
+              "refined makeup and hair bun, warm evening lighting.",
+    "festive": "Style: festive celebration look, joyful expression, subtle "
+               "gold jewellery that does not cover the garment, warm lighting.",
+}
+
+
+def init_app(app):
+    """Refuse to start with an AI_VARIATION_STYLES entry the model has no prompt for."""
+    unknown = [s for s in app.config.get("AI_VARIATION_STYLES", []) if s not in AI_STYLES]
+    if unknown:
+        raise ValueError(
+            f"Unknown AI_VARIATION_STYLES {unknown} (expected some of {sorted(AI_STYLES)})"
+        )
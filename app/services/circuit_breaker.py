@@ -0,0 +1,210 @@
+"""Circuit breakers for flaky upstreams, shared across processes via Redis.
+
+A breaker counts outcomes in fixed windows. Once at least `min_requests`
+calls in the current and previous window failed at `error_rate` or more,
+it opens: `allow` returns False for `cooldown` seconds, so callers fail
+fast or move on to a fallback instead of waiting out timeouts. After the
+cooldown one probe call is let through (half-open); its success closes
+the breaker, its failure opens it again. Without Redis each process keeps
+its own breakers.
+"""
+import logging
+import threading
+import time
+from app import extensions
+from app.services import metrics_service
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "breaker:"
+NAMES_KEY = "breaker:names"
+TRIPPED_TTL = 86400
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+STATE_VALUES = {CLOSED: 0, OPEN: 1, HALF_OPEN: 2}
+
+_local_lock = threading.Lock()
+_local = {}  # name -> {"open_until", "tripped", "probe_until", "windows": {start: [ok, err]}}
+
+
+class BreakerSettings:
+    def __init__(self, window=60, min_requests=5, error_rate=0.5, cooldown=30, probe_timeout=120):
+        self.window = window
+        self.min_requests = min_requests
+        self.error_rate = error_rate
+        self.cooldown = cooldown
+        self.probe_timeout = probe_timeout
+
+
+def allow(name, settings):
+    """Whether a call to `name` may go ahead now."""
+    redis_client = extensions.redis_client
+    if redis_client:
+        try:
+            return _allow_redis(redis_client, name, settings)
+        except Exception:
+            logger.debug("Redis circuit breaker unavailable — using local state", exc_info=True)
+    return _allow_local(name, settings)
+
+
+def record(name, ok, settings):
+    """Record the outcome of a call that `allow` let through."""
+    redis_client = extensions.redis_client
+    if redis_client:
+        try:
+            return _record_redis(redis_client, name, ok, settings)
+        except Exception:
+            logger.debug("Redis circuit breaker unavailable — using local state", exc_info=True)
+    return _record_local(name, ok, settings)
+
+
+def state(name):
+    redis_client = extensions.redis_client
+    if redis_client:
+        try:
+            open_, tripped = redis_client.mget(_key(name, "open"), _key(name, "tripped"))
+            return OPEN if open_ else HALF_OPEN if tripped else CLOSED
+        except Exception:
+            logger.debug("Could not read breaker %s", name, exc_info=True)
+    with _local_lock:
+        entry = _local.get(name)
+        if not entry or not entry["tripped"]:
+            return CLOSED
+        return OPEN if time.monotonic() < entry["open_until"] else HALF_OPEN
+
+
+def known_breakers():
+    """Names of every breaker that has recorded a call."""
+    names = set()
+    redis_client = extensions.redis_client
+    if redis_client:
+        try:
+            names.update(n.decode() if isinstance(n, bytes) else n
+                         for n in redis_client.smembers(NAMES_KEY))
+        except Exception:
+            logger.debug("Could not list breakers", exc_info=True)
+    with _local_lock:
+        names.update(_local)
+    return sorted(names)
+
+
+def reset(name=None):
+    """Forget local breaker state (tests)."""
+    with _local_lock:
+        if name is None:
+            _local.clear()
+        else:
+            _local.pop(name, None)
+
+
+def _key(name, suffix):
+    return f"{KEY_PREFIX}{name}:{suffix}"
+
+
+def _transition(name, new_state):
+    logger.warning("Circuit breaker %s is now %s", name, new_state)
+    metrics_service.inc("ai_circuit_transitions_total", labels={"breaker": name, "state": new_state})
+
+
+# ---------------------------------------------------------------------------
+# Redis state
+# ---------------------------------------------------------------------------
+
+def _allow_redis(redis_client, name, settings):
+    open_, tripped = redis_client.mget(_key(name, "open"), _key(name, "tripped"))
+    if open_:
+        return False
+    if not tripped:
+        return True
+    # Half-open: exactly one probe at a time
+    return bool(redis_client.set(_key(name, "probe"), 1, nx=True, ex=settings.probe_timeout))
+
+
+def _record_redis(redis_client, name, ok, settings):
+    open_, tripped = redis_client.mget(_key(name, "open"), _key(name, "tripped"))
+    if open_:
+        return  # a call that started before the breaker opened
+    if tripped:
+        pipe = redis_client.pipeline()
+        if ok:
+            pipe.delete(_key(name, "tripped"), _key(name, "probe"))
+        else:
+            pipe.set(_key(name, "open"), 1, ex=settings.cooldown)
+            pipe.delete(_key(name, "probe"))
+        pipe.execute()
+        _transition(name, CLOSED if ok else OPEN)
+        return
+
+    window = int(time.time() // settings.window)
+    current, previous = _key(name, f"w{window}"), _key(name, f"w{window - 1}")
+    pipe = redis_client.pipeline()
+    pipe.sadd(NAMES_KEY, name)
+    pipe.hincrby(current, "ok" if ok else "err", 1)
+    pipe.expire(current, settings.window * 2 + 1)
+    pipe.hgetall(current)
+    pipe.hgetall(previous)
+    *_, counts, previous_counts = pipe.execute()
+    if ok:
+        return
+
+    okays = errors = 0
+    for c in (counts, previous_counts):
+        okays += int(c.get(b"ok", c.get("ok", 0)))
+        errors += int(c.get(b"err", c.get("err", 0)))
+    if _should_trip(okays, errors, settings):
+        pipe = redis_client.pipeline()
+        pipe.set(_key(name, "open"), 1, ex=settings.cooldown)
+        pipe.set(_key(name, "tripped"), 1, ex=TRIPPED_TTL)
+        pipe.delete(current, previous)
+        pipe.execute()
+        _transition(name, OPEN)
+
+
+# ---------------------------------------------------------------------------
+# Local state
+# ---------------------------------------------------------------------------
+
+def _allow_local(name, settings):
+    now = time.monotonic()
+    with _local_lock:
+        entry = _local.get(name)
+        if not entry or not entry["tripped"]:
+            return True
+        if now < entry["open_until"] or now < entry["probe_until"]:
+            return False
+        entry["probe_until"] = now + settings.probe_timeout
+        return True
+
+
+def _record_local(name, ok, settings):
+    now = time.monotonic()
+    with _local_lock:
+        entry = _local.setdefault(
+            name, {"open_until": 0, "tripped": False, "probe_until": 0, "windows": {}}
+        )
+        if entry["tripped"]:
+            if now < entry["open_until"]:
+                return  # a call that started before the breaker opened
+            entry["probe_until"] = 0
+            if ok:
+                entry["tripped"] = False
+            else:
+                entry["open_until"] = now + settings.cooldown
+            new_state = CLOSED if ok else OPEN
+        else:
+            window = int(time.time() // settings.window)
+            windows = {w: c for w, c in entry["windows"].items() if w >= window - 1}
+            windows.setdefault(window, [0, 0])[0 if ok else 1] += 1
+            entry["windows"] = windows
+            okays = sum(c[0] for c in windows.values())
+            errors = sum(c[1] for c in windows.values())
+            if ok or not _should_trip(okays, errors, settings):
+                return
+            entry.update(tripped=True, open_until=now + settings.cooldown, windows={})
+            new_state = OPEN
+    _transition(name, new_state)
+
+
+def _should_trip(okays, errors, settings):
+    total = okays + errors
+    return total >= settings.min_requests and errors / total >= settings.error_rate
@@ -0,0 +1,193 @@
+"""Static export of the public storefront.
+
+Renders `/` and every visible `/d/<dress_id>` page through the real Flask
+views into a directory a static host (or WhiteNoise) can serve with no
+Python in the path. Images are written under content-hashed filenames and
+text files are precompressed (.gz always, .br when `brotli` is installed).
+
+Exports are incremental: a manifest records when the last export ran and
+which pages/images it wrote, so later runs only re-render products whose
+`updated_at` (or audit log) moved since then. A settings change (FX rate,
+WhatsApp number) touches every page and forces a full export.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+from datetime import datetime, timezone
+from flask import current_app
+from app.extensions import db
+from app.models.audit_log import AuditLog
+from app.models.image import Image
+from app.models.product import Product
+from app.services.product_service import get_settings_version
+
+try:
+    import brotli
+except ImportError:  # optional — .br files are skipped without it
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+PUBLIC_STATUSES = ("PUBLISHED", "SOLD_OUT")
+COMPRESSIBLE_EXTENSIONS = {".html", ".css", ".js", ".svg", ".json", ".txt"}
+_IMG_REF = re.compile(r"/img/(\d+)\b")
+
+
+def export_site(out_dir, full=False):
+    """Export the storefront into out_dir.
+
+    Returns a dict of counts: pages rendered, pages removed, images written.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = {} if full else _load_manifest(out_dir)
+    last_export = _parse_ts(manifest.get("exported_at"))
+    started_at = datetime.now(timezone.utc)
+
+    settings_changed = get_settings_version()
+    if last_export and settings_changed and _utc(settings_changed) > last_export:
+        logger.info("Settings changed since last export — re-rendering everything")
+        manifest, last_export = {}, None
+
+    pages = manifest.get("products", {})
+    images = manifest.get("images", {})
+    visible = {
+        dress_id: (product_id, _utc(updated_at))
+        for product_id, dress_id, updated_at in db.session.execute(
+            db.select(Product.id, Product.dress_id, Product.updated_at)
+            .where(Product.status.in_(PUBLIC_STATUSES))
+        )
+    }
+    touched_ids = _products_touched_since(last_export) if last_export else set()
+
+    stale = [
+        dress_id for dress_id, (product_id, updated_at) in visible.items()
+        if dress_id not in pages
+        or last_export is None
+        or (updated_at and updated_at > last_export)
+        or product_id in touched_ids
+    ]
+    removed = [dress_id for dress_id in pages if dress_id not in visible]
+
+    stats = {"pages": 0, "removed": 0, "images": 0}
+    client = current_app.test_client()
+    for dress_id in stale:
+        html = _fetch(client, f"/d/{dress_id}")
+        if html is None:
+            continue
+        html, written = _rewrite_images(html, out_dir, images)
+        _write_text(out_dir, f"d/{dress_id}/index.html", html)
+        pages[dress_id] = visible[dress_id][1].isoformat() if visible[dress_id][1] else None
+        stats["pages"] += 1
+        stats["images"] += written
+
+    for dress_id in removed:
+        shutil.rmtree(os.path.join(out_dir, "d", dress_id), ignore_errors=True)
+        pages.pop(dress_id, None)
+        stats["removed"] += 1
+
+    if stale or removed or not os.path.exists(os.path.join(out_dir, "index.html")):
+        html = _fetch(client, "/")
+        if html is not None:
+            html, written = _rewrite_images(html, out_dir, images)
+            _write_text(out_dir, "index.html", html)
+            stats["pages"] += 1
+            stats["images"] += written
+
+    _copy_static(out_dir)
+    _write_text(out_dir, MANIFEST_NAME, json.dumps({
+        "exported_at": started_at.isoformat(),
+        "products": pages,
+        "images": images,
+    }, indent=2, sort_keys=True))
+    return stats
+
+
+def _products_touched_since(since):
+    """Product ids with audit activity since the last export."""
+    rows = db.session.execute(
+        db.select(AuditLog.product_id)
+        .where(AuditLog.created_at > since, AuditLog.product_id.isnot(None))
+        .distinct()
+    )
+    return {row[0] for row in rows}
+
+
+def _fetch(client, path):
+    resp = client.get(path)
+    if resp.status_code != 200:
+        logger.warning("Skipping %s — got HTTP %d", path, resp.status_code)
+        return None
+    return resp.get_data(as_text=True)
+
+
+def _rewrite_images(html, out_dir, images):
+    """Point /img/<id> references at hashed files, exporting new images."""
+    written = 0
+    for image_id in sorted(set(_IMG_REF.findall(html)), key=int):
+        filename = images.get(image_id)
+        if not filename or not os.path.exists(os.path.join(out_dir, filename)):
+            image = db.session.get(Image, int(image_id))
+            if not image or not image.image_data:
+                continue
+            digest = hashlib.sha256(image.image_data).hexdigest()[:12]
+            filename = f"img/{image_id}.{digest}.jpg"
+            _write_bytes(out_dir, filename, image.image_data)
+            images[image_id] = filename
+            written += 1
+    return _IMG_REF.sub(
+        lambda m: f"/{images[m.group(1)]}" if m.group(1) in images else m.group(0),
+        html,
+    ), written
+
+
+def _copy_static(out_dir):
+    static_root = current_app.static_folder
+    for dirpath, _, filenames in os.walk(static_root):
+        for name in filenames:
+            src = os.path.join(dirpath, name)
+            rel = os.path.join("static", os.path.relpath(src, static_root))
+            with open(src, "rb") as f:
+                _write_bytes(out_dir, rel, f.read())
+
+
+def _write_text(out_dir, rel_path, text):
+    _write_bytes(out_dir, rel_path, text.encode("utf-8"))
+
+
+def _write_bytes(out_dir, rel_path, data):
+    """Write atomically, plus precompressed siblings for text assets."""
+    path = os.path.join(out_dir, rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    variants = [("", data)]
+    if os.path.splitext(rel_path)[1] in COMPRESSIBLE_EXTENSIONS:
+        variants.append((".gz", gzip.compress(data, compresslevel=9, mtime=0)))
+        if brotli is not None:
+            variants.append((".br", brotli.compress(data)))
+    for suffix, payload in variants:
+        tmp_path = f"{path}{suffix}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path + suffix)
+
+
+def _load_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _parse_ts(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+def _utc(ts):
+    if ts is None:
+        return None
+    return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts
@@ -1,10 +1,11 @@
 import io
-from PIL import Image as PILImage
+from PIL import Image as PILImage, ImageChops, ImageOps
 
 
 ALLOWED_CONTENT_TYPES = {"image/jpeg", "image/png", "image/webp"}
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10 MB
 MAX_IMAGE_PIXELS = 40_000_000  # prevent decompression-bomb style inputs
+BACKGROUND_THRESHOLD = 40  # per-channel difference that counts as garment
 
 
 def validate_image(image_bytes):
@@ -52,3 +53,56 @@ def create_thumbnail(image_bytes, max_size=(400, 400)):
     buffer = io.BytesIO()
     img.save(buffer, format="JPEG", quality=80)
     return buffer.getvalue()
+
+
+def prepare_reference(image_bytes, max_side=1024, quality=85):
+    """Shrink a garment photo to what the AI model actually looks at.
+
+    Crops to the garment (see garment_bbox), scales the longer side down
+    to `max_side` and re-encodes as an optimized JPEG. Phone photos drop
+    from several MB to well under 200 KB.
+
+    Returns:
+        JPEG bytes
+    """
+    img = PILImage.open(io.BytesIO(image_bytes))
+    img = ImageOps.exif_transpose(img)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    bbox = garment_bbox(img)
+    if bbox:
+        img = img.crop(bbox)
+    img.thumbnail((max_side, max_side), PILImage.LANCZOS)
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def garment_bbox(img, margin=0.04):
+    """Bounding box of whatever differs from the photo's backdrop.
+
+    The backdrop colour is taken from the image corners. Returns None when
+    cropping would not help: no clear subject, or one that already fills
+    the frame.
+    """
+    small = img.copy()
+    small.thumbnail((256, 256))
+    corners = [small.getpixel((x, y)) for x in (0, small.width - 1) for y in (0, small.height - 1)]
+    background = tuple(sorted(channel)[len(channel) // 2] for channel in zip(*corners))
+    diff = ImageChops.difference(small, PILImage.new("RGB", small.size, background))
+    mask = diff.convert("L").point(lambda v: 255 if v > BACKGROUND_THRESHOLD else 0)
+    box = mask.getbbox()
+    if not box:
+        return None
+    box_area = (box[2] - box[0]) * (box[3] - box[1])
+    if box_area < 0.05 * small.width * small.height or box_area > 0.9 * small.width * small.height:
+        return None
+
+    scale_x, scale_y = img.width / small.width, img.height / small.height
+    pad_x, pad_y = margin * img.width, margin * img.height
+    return (
+        max(0, int(box[0] * scale_x - pad_x)),
+        max(0, int(box[1] * scale_y - pad_y)),
+        min(img.width, int(box[2] * scale_x + pad_x)),
+        min(img.height, int(box[3] * scale_y + pad_y)),
+    )
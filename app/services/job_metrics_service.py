@@ -0,0 +1,150 @@
+"""Per-stage timings for AI generation jobs.
+
+A JobTimer is created at the start of a job run; code wraps each stage
+in `timer.stage(name)` and notes facts with `timer.note(...)`. `save()`
+writes one AIJobMetric row per run — including failed runs and RQ
+retries — which `flask ai-stats` summarises.
+"""
+import logging
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timedelta, timezone
+from rq import get_current_job
+from app.extensions import db
+from app.models.ai_job_metric import AIJobMetric
+
+logger = logging.getLogger(__name__)
+
+
+class JobTimer:
+    def __init__(self, kind, product_id=None):
+        self.kind = kind
+        self.product_id = product_id
+        self.stages = {}
+        self.fields = {}
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        """Add `seconds` to a stage measured by the caller."""
+        self.stages[name] = round(self.stages.get(name, 0) + seconds * 1000, 1)
+
+    def note(self, **fields):
+        self.fields.update(fields)
+
+    def save(self, status):
+        """Persist this run. Never raises — metrics must not fail a job."""
+        job = get_current_job()
+        metric = AIJobMetric(
+            job_id=job.id if job else None,
+            kind=self.kind,
+            product_id=self.product_id,
+            status=status,
+            attempt=_attempt(job),
+            model_name=self.fields.get("model_name"),
+            cache_hit=bool(self.fields.get("cache_hit")),
+            reference_bytes=self.fields.get("reference_bytes"),
+            output_bytes=self.fields.get("output_bytes"),
+            images=self.fields.get("images", 0),
+            generated=self.fields.get("generated", 0),
+            total_ms=int((time.perf_counter() - self.started) * 1000),
+            stages=self.stages,
+        )
+        try:
+            db.session.add(metric)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            logger.warning("Could not save AI job metrics", exc_info=True)
+        logger.info(
+            "AI job %s %s in %dms: %s", self.kind, status, metric.total_ms,
+            ", ".join(f"{k}={v:.0f}ms" for k, v in self.stages.items()),
+        )
+        return metric
+
+
+def stage(timer, name):
+    """`timer.stage(name)`, or a no-op when there is no timer."""
+    return timer.stage(name) if timer is not None else nullcontext()
+
+
+def record(timer, name, seconds):
+    """`timer.record(name, seconds)`, or nothing when there is no timer."""
+    if timer is not None:
+        timer.record(name, seconds)
+
+
+def _attempt(job):
+    """Which run of this job this is (1 = first); counted in job.meta."""
+    if job is None:
+        return 1
+    attempt = job.meta.get("attempt", 0) + 1
+    job.meta["attempt"] = attempt
+    try:
+        job.save_meta()
+    except Exception:
+        logger.debug("Could not save job attempt", exc_info=True)
+    return attempt
+
+
+def get_stats(window=timedelta(hours=24)):
+    """Latency percentiles and throughput over the last `window`.
+
+    Throughput is given in runs and in images: a variations run makes
+    several images, and a cache hit makes them without the model.
+    """
+    since = datetime.now(timezone.utc) - window
+    rows = AIJobMetric.query.filter(AIJobMetric.created_at >= since).all()
+    ok = [r for r in rows if r.status == "ok"]
+    hours = window.total_seconds() / 3600
+
+    stage_values = {}
+    for row in ok:
+        for name, ms in (row.stages or {}).items():
+            stage_values.setdefault(name, []).append(ms)
+    stages = {
+        name: _percentiles(stage_values[name])
+        for name in sorted(stage_values, key=_stage_order)
+    }
+    models = {}
+    for row in ok:
+        if row.model_name:
+            models[row.model_name] = models.get(row.model_name, 0) + 1
+
+    return {
+        "window_seconds": window.total_seconds(),
+        "runs": len(rows),
+        "ok": len(ok),
+        "failed": len(rows) - len(ok),
+        "retries": sum(1 for r in rows if r.attempt > 1),
+        "cache_hits": sum(1 for r in ok if r.cache_hit),
+        "runs_per_hour": len(ok) / hours,
+        "images_per_hour": sum(r.images or 0 for r in ok) / hours,
+        "generated_per_hour": sum(r.generated or 0 for r in ok) / hours,
+        "total": _percentiles([r.total_ms for r in ok]),
+        "stages": stages,
+        "output_bytes": _percentiles([r.output_bytes for r in ok if r.output_bytes]),
+        "models": models,
+    }
+
+
+def _stage_order(name):
+    return AIJobMetric.STAGES.index(name) if name in AIJobMetric.STAGES else len(AIJobMetric.STAGES)
+
+
+def _percentiles(values):
+    values = sorted(values)
+    if not values:
+        return None
+
+    def pct(p):
+        return values[min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))]
+
+    return {"count": len(values), "p50": pct(50), "p95": pct(95), "p99": pct(99), "max": values[-1]}
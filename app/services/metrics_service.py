@@ -0,0 +1,265 @@
+"""Metrics — counters and histograms exposed in Prometheus text format.
+
+Samples are summed into a single Redis hash so every gunicorn worker (and
+the RQ worker) feeds the same series, and /metrics on any worker renders
+the aggregate. Inside a request, updates are buffered and written in one
+pipeline at teardown; elsewhere they are written through. Without Redis
+the samples live in a per-process dict.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+from flask import g, has_request_context, request
+from sqlalchemy.pool import QueuePool
+from app import extensions
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY = "metrics"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+MODEL_BUCKETS = (0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+QUEUE_WAIT_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# name -> (type, help, buckets)
+METRICS = {
+    "http_request_duration_seconds": (
+        "histogram", "Request latency by endpoint.", LATENCY_BUCKETS),
+    "http_response_size_bytes": (
+        "histogram", "Response body size by endpoint.", SIZE_BUCKETS),
+    "image_bytes_served_total": (
+        "counter", "Image bytes sent by serve_image.", None),
+    "cache_requests_total": (
+        "counter", "Cache lookups by cache and result (hit/miss).", None),
+    "db_pool_checkout_wait_seconds": (
+        "histogram", "Time spent waiting for a pooled DB connection.", LATENCY_BUCKETS),
+    "telegram_api_duration_seconds": (
+        "histogram", "Telegram Bot API call latency by method.", LATENCY_BUCKETS),
+    "telegram_rate_limit_wait_seconds": (
+        "histogram", "Time sends waited on the shared Telegram rate limiter.", LATENCY_BUCKETS),
+    "telegram_outbox_coalesced_total": (
+        "counter", "Queued message edits replaced by a newer edit before sending.", None),
+    "telegram_duplicate_updates_total": (
+        "counter", "Telegram updates dropped as redeliveries, by dedup store.", None),
+    "ai_rate_limit_wait_seconds": (
+        "histogram", "Time generation jobs waited on the shared Gemini rate limit.", LATENCY_BUCKETS),
+    "ai_reference_bytes": (
+        "histogram", "Size of the prepared reference image sent to the AI model.", SIZE_BUCKETS),
+    "ai_model_duration_seconds": (
+        "histogram", "AI model call latency by backend and model.", MODEL_BUCKETS),
+    "ai_model_requests_total": (
+        "counter", "AI model calls by result (ok/error/timeout/circuit_open).", None),
+    "ai_hedged_requests_total": (
+        "counter", "Hedged AI calls by which request won (primary/hedge/none).", None),
+    "ai_circuit_transitions_total": (
+        "counter", "Circuit breaker state changes.", None),
+    "ai_circuit_state": (
+        "gauge", "Circuit breaker state (0 closed, 1 open, 2 half-open).", None),
+    "ai_jobs_coalesced_total": (
+        "counter", "AI requests attached to a pending job, or that cancelled a queued one.", None),
+    "rq_job_wait_seconds": (
+        "histogram", "Time jobs spent queued before a worker started them, by queue.",
+        QUEUE_WAIT_BUCKETS),
+    "rq_queue_depth": (
+        "gauge", "Jobs waiting in each RQ queue.", None),
+    "rq_queue_deferred": (
+        "gauge", "Jobs held back behind an earlier job (per-admin fairness).", None),
+}
+
+_lock = threading.Lock()
+_local_samples = defaultdict(float)  # used when Redis is unavailable
+
+
+def init_app(app):
+    """Register request timing hooks."""
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        start = g.pop("metrics_start", None)
+        if start is None:
+            return response
+        labels = {
+            "endpoint": request.url_rule.rule if request.url_rule else "unmatched",
+            "method": request.method,
+            "status": str(response.status_code),
+        }
+        observe("http_request_duration_seconds", time.perf_counter() - start, labels)
+        if not response.is_streamed:
+            observe("http_response_size_bytes", response.calculate_content_length() or 0, labels)
+        return response
+
+    @app.teardown_request
+    def _flush(exc):
+        flush()
+
+
+# ---------------------------------------------------------------------------
+# Recording
+# ---------------------------------------------------------------------------
+
+def inc(name, amount=1, labels=None):
+    _add([(_field(name, labels), amount)])
+
+
+def observe(name, value, labels=None):
+    buckets = METRICS[name][2]
+    le = next((b for b in buckets if value <= b), "+Inf")
+    _add([
+        (_field(name, labels, f"bucket:{le}"), 1),
+        (_field(name, labels, "sum"), value),
+        (_field(name, labels, "count"), 1),
+    ])
+
+
+def record_cache(cache, hit):
+    inc("cache_requests_total", labels={"cache": cache, "result": "hit" if hit else "miss"})
+
+
+def _field(name, labels=None, suffix=""):
+    label_str = ",".join(f'{k}="{v}"' for k, v in sorted((labels or {}).items()))
+    return f"{name}|{label_str}|{suffix}"
+
+
+def _add(updates):
+    if has_request_context():
+        pending = g.setdefault("metrics_pending", [])
+        pending.extend(updates)
+        return
+    _write(updates)
+
+
+def flush():
+    """Write updates buffered during the current request."""
+    if has_request_context():
+        pending = g.pop("metrics_pending", None)
+        if pending:
+            _write(pending)
+
+
+def _write(updates):
+    redis_client = extensions.redis_client
+    if redis_client:
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for field, amount in updates:
+                pipe.hincrbyfloat(REDIS_KEY, field, amount)
+            pipe.execute()
+            return
+        except Exception:
+            logger.debug("Metrics write to Redis failed", exc_info=True)
+    with _lock:
+        for field, amount in updates:
+            _local_samples[field] += amount
+
+
+# ---------------------------------------------------------------------------
+# DB pool instrumentation
+# ---------------------------------------------------------------------------
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that reports how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            observe("db_pool_checkout_wait_seconds", time.perf_counter() - start)
+
+
+# ---------------------------------------------------------------------------
+# Exposition
+# ---------------------------------------------------------------------------
+
+def _collect_samples():
+    samples = {}
+    redis_client = extensions.redis_client
+    if redis_client:
+        try:
+            raw = redis_client.hgetall(REDIS_KEY)
+            samples = {_decode(k): float(v) for k, v in raw.items()}
+        except Exception:
+            logger.debug("Metrics read from Redis failed", exc_info=True)
+    with _lock:
+        for field, value in _local_samples.items():
+            samples[field] = samples.get(field, 0) + value
+    return samples
+
+
+def _collect_gauges():
+    """Point-in-time values read at scrape time."""
+    gauges = []
+    for queue in extensions.all_queues():
+        try:
+            gauges.append(("rq_queue_depth", f'queue="{queue.name}"', queue.count))
+            gauges.append(("rq_queue_deferred", f'queue="{queue.name}"',
+                           queue.deferred_job_registry.count))
+        except Exception:
+            logger.debug("Could not read depth of queue %s", queue.name, exc_info=True)
+
+    from app.services import circuit_breaker
+
+    for name in circuit_breaker.known_breakers():
+        value = circuit_breaker.STATE_VALUES[circuit_breaker.state(name)]
+        gauges.append(("ai_circuit_state", f'breaker="{name}"', value))
+    return gauges
+
+
+def render():
+    """Render all series in Prometheus text exposition format."""
+    series = defaultdict(lambda: defaultdict(dict))  # name -> labels -> suffix -> value
+    for field, value in _collect_samples().items():
+        name, label_str, suffix = field.split("|", 2)
+        series[name][label_str][suffix] = value
+
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        if kind == "gauge":
+            continue
+        if name not in series:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for label_str, values in sorted(series[name].items()):
+            if kind == "counter":
+                lines.append(f"{name}{_braces(label_str)} {_num(values[''])}")
+                continue
+            cumulative = 0
+            for le in list(buckets) + ["+Inf"]:
+                cumulative += values.get(f"bucket:{le}", 0)
+                le_label = _join(label_str, f'le="{le}"')
+                lines.append(f"{name}_bucket{{{le_label}}} {_num(cumulative)}")
+            lines.append(f"{name}_sum{_braces(label_str)} {_num(values.get('sum', 0))}")
+            lines.append(f"{name}_count{_braces(label_str)} {_num(values.get('count', 0))}")
+
+    gauges = _collect_gauges()
+    for name in sorted({g_name for g_name, _, _ in gauges}):
+        lines.append(f"# HELP {name} {METRICS[name][1]}")
+        lines.append(f"# TYPE {name} gauge")
+        for g_name, label_str, value in gauges:
+            if g_name == name:
+                lines.append(f"{name}{_braces(label_str)} {_num(value)}")
+
+    return "\n".join(lines) + "\n"
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _join(*parts):
+    return ",".join(p for p in parts if p)
+
+
+def _braces(label_str):
+    return f"{{{label_str}}}" if label_str else ""
+
+
+def _num(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
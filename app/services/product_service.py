@@ -6,6 +6,8 @@ from app.models.product import Product
 from app.models.variant import VariantOption
 from app.models.image import Image
 from app.models.audit_log import AuditLog
+from app.models.settings import Settings
+from app.services import search_index
 
 
 def generate_dress_id():
@@ -87,18 +89,102 @@ def parse_caption(caption):
     return data
 
 
-def create_draft(metadata, original_storage_key, original_url, chat_id, admin_id):
-    """Create a DRAFT product with original image and enqueue AI generation."""
-    dress_id = generate_dress_id()
+def create_published_product(metadata, images, chat_id, admin_id):
+    """Create a PUBLISHED product from one or more original photos.
 
+    `images` is a list of sanitized JPEG bytes in display order; they are
+    stored as ORIGINAL versions 1..N. Everything is written in a single
+    transaction.
+    """
+    product = _new_product(metadata, status="PUBLISHED", chat_id=chat_id)
+
+    originals = [
+        Image(
+            product_id=product.id,
+            type="ORIGINAL",
+            version=version,
+            storage_key=f"originals/{product.dress_id}/v{version}.jpg",
+            image_data=image_bytes,
+            status="READY",
+        )
+        for version, image_bytes in enumerate(images, start=1)
+    ]
+    db.session.add_all(originals)
+    db.session.flush()  # assign ids for the public URLs
+    for original in originals:
+        original.url = f"/img/{original.id}"
+
+    db.session.add(
+        AuditLog(
+            admin_id=admin_id,
+            action="PUBLISH_ORIGINAL_ONLY",
+            product_id=product.id,
+            payload={
+                "dress_id": product.dress_id,
+                "title": metadata["title"],
+                "images": len(originals),
+            },
+        )
+    )
+
+    db.session.commit()
+    return product
+
+
+def add_original_images(product_id, images, admin_id):
+    """Append sanitized JPEGs to a product as the next ORIGINAL versions.
+
+    Used for album photos that arrive after the album was published.
+    Returns the product.
+    """
+    product = db.session.execute(
+        db.select(Product).where(Product.id == product_id).with_for_update()
+    ).scalar_one()
+    latest = db.session.execute(
+        db.select(db.func.max(Image.version)).where(
+            Image.product_id == product_id, Image.type == "ORIGINAL"
+        )
+    ).scalar() or 0
+
+    originals = [
+        Image(
+            product_id=product.id,
+            type="ORIGINAL",
+            version=version,
+            storage_key=f"originals/{product.dress_id}/v{version}.jpg",
+            image_data=image_bytes,
+            status="READY",
+        )
+        for version, image_bytes in enumerate(images, start=latest + 1)
+    ]
+    db.session.add_all(originals)
+    db.session.flush()  # assign ids for the public URLs
+    for original in originals:
+        original.url = f"/img/{original.id}"
+    product.updated_at = datetime.now(timezone.utc)
+
+    db.session.add(
+        AuditLog(
+            admin_id=admin_id,
+            action="ADD_PHOTOS",
+            product_id=product.id,
+            payload={"versions": [img.version for img in originals]},
+        )
+    )
+    db.session.commit()
+    return product
+
+
+def _new_product(metadata, status, chat_id):
+    """Add a product and its variant options to the session (flushed)."""
     product = Product(
-        dress_id=dress_id,
+        dress_id=generate_dress_id(),
         title=metadata["title"],
         description=metadata.get("description", ""),
         categories=metadata.get("categories", []),
         tags=metadata.get("tags", []),
         price_inr=metadata["price"] * 100,  # convert rupees to paise
-        status="DRAFT",
+        status=status,
         telegram_chat_id=chat_id,
     )
     db.session.add(product)
@@ -114,42 +200,7 @@ def create_draft(metadata, original_storage_key, original_url, chat_id, admin_id
                 sort_order=i,
             )
         )
-
-    # Create original image record
-    original_image = Image(
-        product_id=product.id,
-        type="ORIGINAL",
-        version=1,
-        storage_key=original_storage_key,
-        url=original_url,
-        status="READY",
-    )
-    db.session.add(original_image)
-
-    # Create pending AI image record
-    ai_storage_key = f"ai/{dress_id}/v1.jpg"
-    ai_image = Image(
-        product_id=product.id,
-        type="AI_GENERATED",
-        version=1,
-        storage_key=ai_storage_key,
-        status="PENDING",
-    )
-    db.session.add(ai_image)
-    db.session.flush()
-
-    # Audit log
-    db.session.add(
-        AuditLog(
-            admin_id=admin_id,
-            action="CREATE_DRAFT",
-            product_id=product.id,
-            payload={"dress_id": dress_id, "title": metadata["title"]},
-        )
-    )
-
-    db.session.commit()
-    return product, ai_image
+    return product
 
 
 def publish_product(product_id, admin_id, ai_version=None):
@@ -193,6 +244,97 @@ def publish_original_only(product_id, admin_id):
     return product
 
 
+def add_ai_variations(product_id, styles, admin_id):
+    """Reserve one PENDING AI image per style, as consecutive versions.
+
+    The product row is locked while the next version is read so two
+    concurrent requests cannot claim the same numbers. Returns the new
+    images in style order.
+    """
+    product = db.session.execute(
+        db.select(Product).where(Product.id == product_id).with_for_update()
+    ).scalar_one()
+    latest = db.session.execute(
+        db.select(db.func.max(Image.version)).where(
+            Image.product_id == product_id, Image.type == "AI_GENERATED"
+        )
+    ).scalar() or 0
+
+    images = []
+    for offset, style in enumerate(styles, start=1):
+        version = latest + offset
+        images.append(Image(
+            product_id=product.id,
+            type="AI_GENERATED",
+            version=version,
+            storage_key=f"ai/{product.dress_id}/v{version}.jpg",
+            status="PENDING",
+        ))
+    db.session.add_all(images)
+    db.session.add(
+        AuditLog(
+            admin_id=admin_id,
+            action="GENERATE_VARIATIONS",
+            product_id=product.id,
+            payload={"styles": list(styles), "versions": [img.version for img in images]},
+        )
+    )
+    db.session.commit()
+    return images
+
+
+def drop_pending_ai_images(product_id, image_ids):
+    """Delete AI image versions reserved for a job that was cancelled."""
+    deleted = db.session.execute(
+        db.delete(Image).where(
+            Image.product_id == product_id,
+            Image.id.in_([i for i in image_ids if i is not None]),
+            Image.type == "AI_GENERATED",
+            Image.status == "PENDING",
+        )
+    ).rowcount
+    if deleted:
+        _touch(product_id)
+    db.session.commit()
+    return deleted
+
+
+def pick_ai_version(product_id, version, admin_id):
+    """Keep one READY AI version and archive the other READY ones.
+
+    Returns the kept image, or None if that version is not ready.
+    """
+    chosen = Image.query.filter_by(
+        product_id=product_id, type="AI_GENERATED", version=version, status="READY"
+    ).first()
+    if not chosen:
+        return None
+
+    archived = db.session.execute(
+        db.update(Image)
+        .where(
+            Image.product_id == product_id,
+            Image.type == "AI_GENERATED",
+            Image.status == "READY",
+            Image.version != version,
+        )
+        .values(status="ARCHIVED")
+        .returning(Image.version)
+    ).scalars().all()
+    db.session.add(
+        AuditLog(
+            admin_id=admin_id,
+            action="PICK_AI_VERSION",
+            product_id=product_id,
+            payload={"version": version, "archived": sorted(archived)},
+        )
+    )
+    _touch(product_id)
+    search_index.mark_changed(db.session, [product_id])
+    db.session.commit()
+    return chosen
+
+
 def discard_draft(product_id, admin_id):
     """Delete a DRAFT product and all associated images."""
     product = db.session.get(Product, product_id)
@@ -216,78 +358,103 @@ def discard_draft(product_id, admin_id):
     return storage_keys
 
 
-def mark_sold_out(dress_id, admin_id):
-    """Mark product as SOLD_OUT."""
-    product = Product.query.filter_by(dress_id=dress_id.upper()).first()
-    if not product:
-        return None
-    if product.status not in ("PUBLISHED", "HIDDEN"):
-        return None
+# ---------------------------------------------------------------------------
+# Bulk admin updates — one UPDATE ... RETURNING plus one audit INSERT each
+# ---------------------------------------------------------------------------
 
-    product.status = "SOLD_OUT"
-    product.updated_at = datetime.now(timezone.utc)
+def mark_sold_out_bulk(dress_ids, admin_id):
+    """Mark every PUBLISHED/HIDDEN product in dress_ids SOLD_OUT.
 
-    db.session.add(
-        AuditLog(
-            admin_id=admin_id,
-            action="MARK_SOLD_OUT",
-            product_id=product.id,
-        )
+    Returns the dress IDs that changed.
+    """
+    return _bulk_set_status(
+        dress_ids, ("PUBLISHED", "HIDDEN"), "SOLD_OUT", "MARK_SOLD_OUT", admin_id
     )
-    db.session.commit()
-    return product
 
 
-def hide_product(dress_id, admin_id):
-    product = Product.query.filter_by(dress_id=dress_id.upper()).first()
-    if not product or product.status != "PUBLISHED":
-        return None
-    product.status = "HIDDEN"
-    product.updated_at = datetime.now(timezone.utc)
-    db.session.add(
-        AuditLog(admin_id=admin_id, action="HIDE", product_id=product.id)
-    )
+def hide_products(dress_ids, admin_id):
+    return _bulk_set_status(dress_ids, ("PUBLISHED",), "HIDDEN", "HIDE", admin_id)
+
+
+def unhide_products(dress_ids, admin_id):
+    return _bulk_set_status(dress_ids, ("HIDDEN",), "PUBLISHED", "UNHIDE", admin_id)
+
+
+def update_prices(dress_ids, new_price_inr, admin_id):
+    """Set the same price on several products. Returns the dress IDs changed."""
+    new_paise = new_price_inr * 100
+    ids = _normalize_ids(dress_ids)
+    if not ids:
+        return []
+    # RETURNING only sees new values, so read the old prices (locked) first.
+    old_prices = dict(db.session.execute(
+        db.select(Product.id, Product.price_inr)
+        .where(Product.dress_id.in_(ids))
+        .with_for_update()
+    ).all())
+    rows = db.session.execute(
+        db.update(Product)
+        .where(Product.id.in_(old_prices))
+        .values(price_inr=new_paise, updated_at=datetime.now(timezone.utc))
+        .returning(Product.id, Product.dress_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    search_index.mark_changed(db.session, [product_id for product_id, _ in rows])
+    _bulk_audit(admin_id, "EDIT_PRICE", [
+        (product_id, {"old_paise": old_prices[product_id], "new_paise": new_paise})
+        for product_id, _ in rows
+    ])
     db.session.commit()
-    return product
-
-
-def unhide_product(dress_id, admin_id):
-    product = Product.query.filter_by(dress_id=dress_id.upper()).first()
-    if not product or product.status != "HIDDEN":
-        return None
-    product.status = "PUBLISHED"
-    product.updated_at = datetime.now(timezone.utc)
-    db.session.add(
-        AuditLog(admin_id=admin_id, action="UNHIDE", product_id=product.id)
-    )
+    return sorted(dress_id for _, dress_id in rows)
+
+
+def _bulk_set_status(dress_ids, from_statuses, to_status, action, admin_id):
+    ids = _normalize_ids(dress_ids)
+    if not ids:
+        return []
+    rows = db.session.execute(
+        db.update(Product)
+        .where(Product.dress_id.in_(ids), Product.status.in_(from_statuses))
+        .values(status=to_status, updated_at=datetime.now(timezone.utc))
+        .returning(Product.id, Product.dress_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    search_index.mark_changed(db.session, [product_id for product_id, _ in rows])
+    _bulk_audit(admin_id, action, [(product_id, None) for product_id, _ in rows])
     db.session.commit()
-    return product
+    return sorted(dress_id for _, dress_id in rows)
+
+
+def _bulk_audit(admin_id, action, entries):
+    """Insert one audit row per (product_id, payload) in a single statement."""
+    if not entries:
+        return
+    db.session.execute(db.insert(AuditLog), [
+        {"admin_id": admin_id, "action": action, "product_id": product_id,
+         "payload": payload}
+        for product_id, payload in entries
+    ])
+
+
+def _touch(product_id):
+    """Bump updated_at after a bulk image change, so page validators change too."""
+    db.session.execute(
+        db.update(Product)
+        .where(Product.id == product_id)
+        .values(updated_at=datetime.now(timezone.utc))
+        .execution_options(synchronize_session=False)
+    )
 
 
-def update_price(dress_id, new_price_inr, admin_id):
-    product = Product.query.filter_by(dress_id=dress_id.upper()).first()
-    if not product:
-        return None
-    old_price = product.price_inr
-    product.price_inr = new_price_inr * 100
-    product.updated_at = datetime.now(timezone.utc)
-    db.session.add(
-        AuditLog(
-            admin_id=admin_id,
-            action="EDIT_PRICE",
-            product_id=product.id,
-            payload={"old_paise": old_price, "new_paise": new_price_inr * 100},
-        )
-    )
-    db.session.commit()
-    return product
+def _normalize_ids(dress_ids):
+    return sorted({dress_id.upper() for dress_id in dress_ids})
 
 
-def get_published_products(
+def _published_query(
     category=None, min_price=None, max_price=None, color=None, size=None,
-    sort="newest", page=1, per_page=24,
+    sort="newest",
 ):
-    """Fetch published products with filters for catalog."""
+    """Build the filtered, ordered query behind the catalog."""
     query = Product.query.filter_by(status="PUBLISHED")
 
     if category:
@@ -316,9 +483,84 @@ def get_published_products(
     elif sort == "price_desc":
         query = query.order_by(Product.price_inr.desc())
 
+    return query
+
+
+def get_published_products(
+    category=None, min_price=None, max_price=None, color=None, size=None,
+    sort="newest", page=1, per_page=24,
+):
+    """Fetch published products with filters for catalog."""
+    query = _published_query(category, min_price, max_price, color, size, sort)
     return query.paginate(page=page, per_page=per_page, error_out=False)
 
 
+class CatalogPage:
+    """Pagination metadata for a streamed catalog page.
+
+    Mirrors the attributes catalog.html reads from a Flask-SQLAlchemy
+    Pagination, but `items` is a lazy iterator over a server-side cursor.
+    """
+
+    def __init__(self, page, per_page, total, items):
+        self.page = page
+        self.per_page = per_page
+        self.total = total
+        self.items = items
+        self.pages = max(0, -(-total // per_page))
+        self.has_prev = page > 1
+        self.has_next = page < self.pages
+        self.prev_num = page - 1 if self.has_prev else None
+        self.next_num = page + 1 if self.has_next else None
+
+
+def stream_published_products(
+    category=None, min_price=None, max_price=None, color=None, size=None,
+    sort="newest", page=1, per_page=24, batch_size=8,
+):
+    """Like get_published_products, but rows are fetched in batches.
+
+    Only the COUNT runs up front; the page query executes when the
+    template first iterates `items`, using a server-side cursor
+    (`yield_per` → stream_results) so at most `batch_size` rows are
+    buffered at a time.
+    """
+    page = max(page, 1)
+    query = _published_query(category, min_price, max_price, color, size, sort)
+    total = query.order_by(None).count()
+    page_query = query.offset((page - 1) * per_page).limit(per_page)
+
+    def rows():
+        yield from page_query.yield_per(batch_size)
+
+    return CatalogPage(page, per_page, total, rows())
+
+
+def get_catalog_version():
+    """Return (last_modified, published_count) for the public catalog.
+
+    One round trip covering product edits and settings changes (FX rate,
+    WhatsApp number, Instagram posts) — used to build HTTP validators.
+    """
+    products_changed = db.select(db.func.max(Product.updated_at)).scalar_subquery()
+    settings_changed = db.select(db.func.max(Settings.updated_at)).scalar_subquery()
+    published = (
+        db.select(db.func.count(Product.id))
+        .where(Product.status == "PUBLISHED")
+        .scalar_subquery()
+    )
+    row = db.session.execute(
+        db.select(products_changed, settings_changed, published)
+    ).one()
+    last_modified = max((ts for ts in row[:2] if ts is not None), default=None)
+    return last_modified, row[2]
+
+
+def get_settings_version():
+    """Latest settings change (affects prices and links on every page)."""
+    return db.session.execute(db.select(db.func.max(Settings.updated_at))).scalar()
+
+
 def get_product_by_dress_id(dress_id):
     """Get a single product by dress ID (for product page)."""
     return Product.query.filter_by(dress_id=dress_id.upper()).first()
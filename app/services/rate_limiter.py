@@ -0,0 +1,106 @@
+"""Token-bucket rate limiting shared across processes via Redis.
+
+A bucket is (key, rate per second, burst capacity). `acquire` takes one
+token from every bucket atomically — or none, if any bucket is empty —
+and sleeps until that is possible. Bucket state lives in Redis (clocked
+by the Redis server's TIME, so hosts need not agree on the time); without
+Redis each process keeps its own buckets.
+"""
+import logging
+import threading
+import time
+from app import extensions
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "ratelimit:"
+
+# KEYS = bucket keys; ARGV = rate1, capacity1, rate2, capacity2, ...
+# Returns "0" after consuming a token from each bucket, otherwise the
+# seconds to wait until all buckets have one (nothing is consumed).
+_ACQUIRE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local wait = 0
+local state = {}
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 2 - 1])
+    local capacity = tonumber(ARGV[i * 2])
+    local data = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(data[1]) or capacity
+    local ts = tonumber(data[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    if tokens < 1 then
+        wait = math.max(wait, (1 - tokens) / rate)
+    end
+    state[i] = {tokens, math.ceil(capacity / rate) + 1}
+end
+for i, key in ipairs(KEYS) do
+    local tokens = state[i][1]
+    if wait == 0 then tokens = tokens - 1 end
+    redis.call('HSET', key, 'tokens', tostring(tokens), 'ts', tostring(now))
+    redis.call('EXPIRE', key, state[i][2])
+end
+return tostring(wait)
+"""
+
+_script = None
+_local_lock = threading.Lock()
+_local_buckets = {}  # key -> [tokens, ts]
+
+
+def acquire(buckets, max_wait=30.0):
+    """Block until one token is taken from every bucket.
+
+    Gives up waiting after `max_wait` seconds and returns anyway — callers
+    rely on the API's own 429 handling as the backstop. Returns the time
+    spent waiting.
+    """
+    buckets = [b for b in buckets if b[1] > 0]
+    if not buckets:
+        return 0.0
+    waited = 0.0
+    while True:
+        wait = _reserve(buckets)
+        if wait <= 0:
+            return waited
+        if waited + wait > max_wait:
+            logger.warning("Rate limit wait exceeded %.1fs for %s", max_wait,
+                           [b[0] for b in buckets])
+            return waited
+        time.sleep(wait)
+        waited += wait
+
+
+def _reserve(buckets):
+    global _script
+    redis_client = extensions.redis_client
+    if redis_client:
+        try:
+            if _script is None:
+                _script = redis_client.register_script(_ACQUIRE_SCRIPT)
+            args = []
+            for _, rate, capacity in buckets:
+                args.extend([rate, capacity])
+            return float(_script(
+                keys=[KEY_PREFIX + key for key, _, _ in buckets], args=args,
+                client=redis_client,
+            ))
+        except Exception:
+            logger.debug("Redis rate limiter unavailable — using local buckets", exc_info=True)
+    return _reserve_local(buckets)
+
+
+def _reserve_local(buckets):
+    now = time.monotonic()
+    with _local_lock:
+        wait, refilled = 0.0, []
+        for key, rate, capacity in buckets:
+            tokens, ts = _local_buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - ts) * rate)
+            if tokens < 1:
+                wait = max(wait, (1 - tokens) / rate)
+            refilled.append((key, tokens))
+        for key, tokens in refilled:
+            _local_buckets[key] = (tokens - 1 if wait == 0 else tokens, now)
+    return wait
@@ -0,0 +1,255 @@
+"""In-memory product lookup for Telegram inline queries.
+
+Each process keeps a prefix index over dress IDs and title words, built
+from the database once and then kept current incrementally: committed
+changes to products and images publish the affected product ids to a
+Redis stream, and every lookup first applies whatever arrived since the
+last one, reloading just those products. Lookups therefore cost one
+Redis round trip and no database query unless something changed.
+Without Redis, changes committed in the same process are applied
+directly.
+"""
+import bisect
+import logging
+import re
+import threading
+import time
+from sqlalchemy import event
+from app import extensions
+from app.extensions import db
+from app.models.image import Image
+from app.models.product import Product
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY = "product_changes"
+STREAM_MAXLEN = 10000
+REBUILD_INTERVAL = 600  # full rebuild now and then, in case the stream was trimmed
+_SESSION_KEY = "search_index_changed"
+_WORD = re.compile(r"[a-z0-9]+")
+
+_lock = threading.Lock()
+_index = None
+_local_changes = set()  # used when Redis is unavailable
+
+
+def init_app(app):
+    """Publish product changes to the index on every commit."""
+    if not event.contains(db.session, "after_flush", _collect_changes):
+        event.listen(db.session, "after_flush", _collect_changes)
+        event.listen(db.session, "after_commit", _publish_collected)
+        event.listen(db.session, "after_rollback", _discard_collected)
+
+
+def mark_changed(session, product_ids):
+    """Flag products changed by bulk statements the ORM does not track."""
+    session.info.setdefault(_SESSION_KEY, set()).update(product_ids)
+
+
+def search(query, limit=20):
+    """Return up to `limit` entries matching every word of `query`."""
+    with _lock:
+        global _index
+        if _index is None or time.monotonic() - _index.built_at > REBUILD_INTERVAL:
+            _index = _Index()
+            _index.build()
+        else:
+            _index.sync()
+        return _index.search(query, limit)
+
+
+def reset():
+    """Drop the in-process index (rebuilt on next search)."""
+    global _index
+    with _lock:
+        _index = None
+        _local_changes.clear()
+
+
+# ---------------------------------------------------------------------------
+# Change tracking
+# ---------------------------------------------------------------------------
+
+def _collect_changes(session, flush_context):
+    changed = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Product) and obj.id is not None:
+            changed.add(obj.id)
+        elif isinstance(obj, Image) and obj.product_id is not None:
+            changed.add(obj.product_id)
+    if changed:
+        mark_changed(session, changed)
+
+
+def _publish_collected(session):
+    product_ids = session.info.pop(_SESSION_KEY, None)
+    if product_ids:
+        publish_changes(product_ids)
+
+
+def _discard_collected(session):
+    session.info.pop(_SESSION_KEY, None)
+
+
+def publish_changes(product_ids):
+    redis_client = extensions.redis_client
+    if redis_client:
+        try:
+            redis_client.xadd(
+                STREAM_KEY, {"ids": ",".join(str(i) for i in product_ids)},
+                maxlen=STREAM_MAXLEN, approximate=True,
+            )
+            return
+        except Exception:
+            logger.warning("Could not publish product changes", exc_info=True)
+    with _lock:
+        _local_changes.update(product_ids)
+
+
+# ---------------------------------------------------------------------------
+# Index
+# ---------------------------------------------------------------------------
+
+def tokenize(text):
+    return _WORD.findall((text or "").lower())
+
+
+def _entry_tokens(entry):
+    dress_id = entry["dress_id"].lower()
+    return {dress_id, dress_id.split("-", 1)[-1], *tokenize(entry["title"])}
+
+
+class _Index:
+    def __init__(self):
+        self.entries = {}  # product_id -> entry dict
+        self.postings = {}  # token -> set of product ids
+        self.vocab = []  # sorted tokens, for prefix scans
+        self.last_id = "0-0"
+        self.built_at = time.monotonic()
+
+    def build(self):
+        # Note the stream position first so changes made while loading
+        # are replayed on the next sync.
+        self.last_id = self._stream_head()
+        _local_changes.clear()
+        for entry in _load_entries():
+            self._add(entry)
+        logger.info("Search index built with %d products", len(self.entries))
+
+    def sync(self):
+        changed = set(_local_changes)
+        _local_changes.clear()
+        redis_client = extensions.redis_client
+        if redis_client:
+            try:
+                for _, messages in redis_client.xread({STREAM_KEY: self.last_id}) or []:
+                    for message_id, fields in messages:
+                        self.last_id = _decode(message_id)
+                        ids = _decode(fields.get(b"ids", fields.get("ids", "")))
+                        changed.update(int(i) for i in ids.split(",") if i)
+            except Exception:
+                logger.debug("Could not read product changes", exc_info=True)
+        if not changed:
+            return
+        for product_id in changed:
+            self._remove(product_id)
+        for entry in _load_entries(changed):
+            self._add(entry)
+
+    def search(self, query, limit):
+        words = [w.strip("-") for w in re.findall(r"[a-z0-9-]+", query.lower())]
+        words = [w for w in words if w]
+        if not words:
+            matches = set(self.entries)
+        else:
+            matches = None
+            for word in words:
+                found = self._prefix(word)
+                matches = found if matches is None else matches & found
+                if not matches:
+                    return []
+        exact = query.strip().upper()
+
+        def rank(product_id):
+            entry = self.entries[product_id]
+            return (entry["dress_id"] != exact, entry["status"] != "PUBLISHED", -product_id)
+
+        return [self.entries[pid] for pid in sorted(matches, key=rank)[:limit]]
+
+    def _prefix(self, prefix):
+        found = set()
+        i = bisect.bisect_left(self.vocab, prefix)
+        while i < len(self.vocab) and self.vocab[i].startswith(prefix):
+            found |= self.postings[self.vocab[i]]
+            i += 1
+        return found
+
+    def _add(self, entry):
+        self.entries[entry["product_id"]] = entry
+        for token in _entry_tokens(entry):
+            if token not in self.postings:
+                self.postings[token] = set()
+                bisect.insort(self.vocab, token)
+            self.postings[token].add(entry["product_id"])
+
+    def _remove(self, product_id):
+        entry = self.entries.pop(product_id, None)
+        if entry is None:
+            return
+        for token in _entry_tokens(entry):
+            ids = self.postings.get(token)
+            if ids is None:
+                continue
+            ids.discard(product_id)
+            if not ids:
+                del self.postings[token]
+                del self.vocab[bisect.bisect_left(self.vocab, token)]
+
+    def _stream_head(self):
+        redis_client = extensions.redis_client
+        if redis_client:
+            try:
+                latest = redis_client.xrevrange(STREAM_KEY, count=1)
+                if latest:
+                    return _decode(latest[0][0])
+            except Exception:
+                logger.debug("Could not read product change stream", exc_info=True)
+        return "0-0"
+
+
+def _load_entries(product_ids=None):
+    """Load index entries (with cover image) for some or all products."""
+    query = db.select(
+        Product.id, Product.dress_id, Product.title, Product.status, Product.price_inr
+    )
+    image_query = db.select(
+        Image.product_id, Image.id, Image.type, Image.version, Image.telegram_file_id
+    ).where(Image.status == "READY")
+    if product_ids is not None:
+        query = query.where(Product.id.in_(product_ids))
+        image_query = image_query.where(Image.product_id.in_(product_ids))
+
+    covers = {}
+    for product_id, image_id, image_type, version, file_id in db.session.execute(image_query):
+        # Prefer the newest AI image, else the first original
+        rank = (image_type == "AI_GENERATED", version if image_type == "AI_GENERATED" else -version)
+        if product_id not in covers or rank > covers[product_id][0]:
+            covers[product_id] = (rank, image_id, file_id)
+
+    entries = []
+    for product_id, dress_id, title, status, price_inr in db.session.execute(query):
+        _, image_id, file_id = covers.get(product_id, (None, None, None))
+        entries.append({
+            "product_id": product_id,
+            "dress_id": dress_id,
+            "title": title,
+            "status": status,
+            "price_inr": price_inr,
+            "image_id": image_id,
+            "file_id": file_id,
+        })
+    return entries
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
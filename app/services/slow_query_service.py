@@ -0,0 +1,163 @@
+"""Slow-query log — captures statements that exceed a time threshold.
+
+Opt-in via SLOW_QUERY_THRESHOLD_MS. Each slow statement is recorded with
+its redacted parameters, duration, the route or RQ job that issued it and
+an EXPLAIN plan, then pushed onto a capped Redis list (a ring buffer) that
+`flask slow-queries` dumps. Because it hooks the engine inside
+create_app(), it covers both gunicorn workers and the RQ worker app.
+"""
+import json
+import logging
+import time
+from datetime import datetime, timezone
+from flask import has_request_context, request
+from sqlalchemy import event
+from app import extensions
+from app.extensions import db
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY = "slow_queries"
+_EXPLAINABLE_PREFIXES = ("select", "with")
+_SAVEPOINT = "slow_query_explain"
+
+
+def init_app(app):
+    """Attach the slow-query hook to the app's engine when enabled."""
+    threshold_ms = app.config.get("SLOW_QUERY_THRESHOLD_MS", 0)
+    if not threshold_ms:
+        return
+    with app.app_context():
+        engine = db.engine
+    install(engine, threshold_ms, app.config.get("SLOW_QUERY_LOG_SIZE", 200))
+    logger.info("Slow-query log enabled (threshold %sms)", threshold_ms)
+
+
+def install(engine, threshold_ms, max_entries=200):
+    """Register cursor-execute listeners on an engine."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("slow_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _check_duration(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["slow_query_start"].pop()
+        duration_ms = (time.perf_counter() - started) * 1000
+        if duration_ms < threshold_ms:
+            return
+        try:
+            plan = None
+            if not executemany:
+                plan = explain(cursor, conn.dialect.name, statement, parameters)
+            record_slow_query(
+                statement, parameters, duration_ms, plan, max_entries=max_entries
+            )
+        except Exception:
+            logger.exception("Failed to record slow query")
+
+    @event.listens_for(engine, "handle_error")
+    def _discard_timer(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("slow_query_start"):
+            conn.info["slow_query_start"].pop()
+
+
+def explain(cursor, dialect_name, statement, parameters):
+    """Return the query plan for a read statement, or None.
+
+    Runs on a sibling DBAPI cursor so the ORM never sees it. On Postgres
+    the EXPLAIN is wrapped in a savepoint so a failure cannot abort the
+    caller's transaction.
+    """
+    if not statement.lstrip().lower().startswith(_EXPLAINABLE_PREFIXES):
+        return None
+    if dialect_name == "postgresql":
+        prefix = "EXPLAIN (ANALYZE off) "
+    elif dialect_name == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    else:
+        return None
+
+    use_savepoint = dialect_name == "postgresql"
+    explain_cursor = cursor.connection.cursor()
+    try:
+        if use_savepoint:
+            explain_cursor.execute(f"SAVEPOINT {_SAVEPOINT}")
+        try:
+            explain_cursor.execute(prefix + statement, parameters or ())
+            rows = explain_cursor.fetchall()
+        except Exception:
+            if use_savepoint:
+                explain_cursor.execute(f"ROLLBACK TO SAVEPOINT {_SAVEPOINT}")
+            logger.debug("EXPLAIN failed for slow query", exc_info=True)
+            return None
+        if use_savepoint:
+            explain_cursor.execute(f"RELEASE SAVEPOINT {_SAVEPOINT}")
+        return "\n".join(" ".join(str(col) for col in row) for row in rows)
+    finally:
+        explain_cursor.close()
+
+
+def redact_parameters(parameters):
+    """Replace bound values with their type names (keeps shape, drops data)."""
+    if parameters is None:
+        return None
+    if isinstance(parameters, dict):
+        return {k: f"<{type(v).__name__}>" for k, v in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [redact_parameters(p) if isinstance(p, (dict, list, tuple))
+                else f"<{type(p).__name__}>" for p in parameters]
+    return f"<{type(parameters).__name__}>"
+
+
+def current_source():
+    """Describe what issued the query: a route, an RQ job, or the CLI."""
+    if has_request_context():
+        rule = request.url_rule.rule if request.url_rule else request.path
+        return f"{request.method} {rule}"
+    try:
+        from rq import get_current_job
+
+        job = get_current_job()
+    except Exception:
+        job = None
+    if job is not None:
+        return f"job {job.func_name} ({job.id})"
+    return "cli"
+
+
+def record_slow_query(statement, parameters, duration_ms, plan, max_entries=200):
+    entry = {
+        "at": datetime.now(timezone.utc).isoformat(),
+        "source": current_source(),
+        "duration_ms": round(duration_ms, 2),
+        "statement": statement,
+        "parameters": redact_parameters(parameters),
+        "plan": plan,
+    }
+    redis_client = extensions.redis_client
+    if not redis_client:
+        logger.warning("Slow query (%.1fms) from %s: %s",
+                       duration_ms, entry["source"], statement)
+        return entry
+
+    pipe = redis_client.pipeline()
+    pipe.lpush(REDIS_KEY, json.dumps(entry))
+    pipe.ltrim(REDIS_KEY, 0, max_entries - 1)
+    pipe.execute()
+    return entry
+
+
+def get_slow_queries(limit=20):
+    """Return the most recent slow-query entries, newest first."""
+    redis_client = extensions.redis_client
+    if not redis_client:
+        return []
+    raw = redis_client.lrange(REDIS_KEY, 0, limit - 1)
+    return [json.loads(item) for item in raw]
+
+
+def clear():
+    if extensions.redis_client:
+        extensions.redis_client.delete(REDIS_KEY)
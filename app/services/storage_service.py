@@ -3,8 +3,13 @@
 Replaces the previous S3-based storage. All images are stored as BYTEA
 in the Image model's `image_data` column and served via Flask endpoint.
 """
+import hashlib
+import json
+from datetime import datetime, timezone
 from flask import current_app
+from sqlalchemy.exc import IntegrityError
 from app.extensions import db
+from app.models.ai_result import AIResult
 from app.models.image import Image
 
 
@@ -69,3 +74,44 @@ def delete_many(storage_keys):
     for image in images:
         image.image_data = None
     db.session.commit()
+
+
+# ---------------------------------------------------------------------------
+# AI result cache — content-addressed generated images
+# ---------------------------------------------------------------------------
+
+def ai_result_key(original_bytes, prompt, model_name, params, variation):
+    """Hash every input that shapes a generated image into a cache key."""
+    digest = hashlib.sha256(hashlib.sha256(original_bytes).digest())
+    digest.update(json.dumps({
+        "prompt": prompt,
+        "model": model_name,
+        "params": params,
+        "variation": variation,
+    }, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def get_ai_result(cache_key, created_after=None):
+    """Return cached output bytes, or None.
+
+    `created_after` ignores older entries — used when a fresh variant is
+    wanted but an earlier attempt of the same job may already have stored
+    one.
+    """
+    query = db.select(AIResult.image_data).where(AIResult.cache_key == cache_key)
+    if created_after is not None:
+        query = query.where(AIResult.created_at >= created_after)
+    return db.session.execute(query).scalar()
+
+
+def put_ai_result(cache_key, model_name, data):
+    """Store (or replace) a generated image under its cache key."""
+    db.session.merge(AIResult(
+        cache_key=cache_key, model_name=model_name, image_data=data,
+        created_at=datetime.now(timezone.utc),
+    ))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()  # a concurrent job stored the same key first
@@ -0,0 +1,129 @@
+"""Outbound Telegram queue for fire-and-forget messages.
+
+Handlers and jobs that don't need the API result (replies, status
+notices, message edits) enqueue here instead of calling Telegram inline.
+A worker job delivers the queue in FIFO order through telegram_service,
+whose shared token buckets keep bursts under Telegram's per-chat and
+global limits.
+
+Edits are keyed by (chat, message): a newer edit to a message whose
+previous edit is still queued replaces it in place, so a burst of status
+changes collapses into one API call. Without Redis, calls go straight to
+telegram_service as before.
+"""
+import json
+import logging
+import uuid
+import redis as _redis
+from app import extensions
+from app.services import metrics_service, telegram_service
+
+logger = logging.getLogger(__name__)
+
+QUEUE_KEY = "tg_outbox"
+PAYLOADS_KEY = "tg_outbox:payloads"
+SCHEDULED_KEY = "tg_outbox:scheduled"
+# Lifetime of the schedule flag; a running delivery job keeps refreshing
+# it, so a killed or crashed job only blocks scheduling this long
+SCHEDULED_TTL = 90
+
+# Returns 1 if a new entry was queued, 0 if an existing one was replaced.
+_PUSH_SCRIPT = """
+local existed = redis.call('HEXISTS', KEYS[2], ARGV[1])
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+if existed == 1 and ARGV[3] == '1' then
+    return 0
+end
+redis.call('RPUSH', KEYS[1], ARGV[1])
+return 1
+"""
+
+_POP_SCRIPT = """
+local id = redis.call('LPOP', KEYS[1])
+if not id then return false end
+local payload = redis.call('HGET', KEYS[2], id)
+redis.call('HDEL', KEYS[2], id)
+return payload
+"""
+
+_scripts = {}
+
+# telegram_service functions that may be queued
+METHODS = {"send_message", "edit_message_caption", "edit_message_text"}
+
+
+def send_message(chat_id, text, reply_markup=None, parse_mode=None):
+    _enqueue("send_message", {
+        "chat_id": chat_id,
+        "text": text,
+        "reply_markup": reply_markup,
+        "parse_mode": parse_mode,
+    })
+
+
+def edit_message_caption(chat_id, message_id, caption, reply_markup=None):
+    _enqueue("edit_message_caption", {
+        "chat_id": chat_id,
+        "message_id": message_id,
+        "caption": caption,
+        "reply_markup": reply_markup,
+    }, coalesce_key=f"edit:{chat_id}:{message_id}")
+
+
+def edit_message_text(chat_id, message_id, text, reply_markup=None):
+    _enqueue("edit_message_text", {
+        "chat_id": chat_id,
+        "message_id": message_id,
+        "text": text,
+        "reply_markup": reply_markup,
+    }, coalesce_key=f"edit:{chat_id}:{message_id}")
+
+
+def _script(name, source, redis_client):
+    if name not in _scripts:
+        _scripts[name] = redis_client.register_script(source)
+    return _scripts[name]
+
+
+def _enqueue(method, kwargs, coalesce_key=None):
+    redis_client = extensions.redis_client
+    if redis_client:
+        entry_id = coalesce_key or f"msg:{uuid.uuid4().hex}"
+        payload = json.dumps({"method": method, "kwargs": kwargs})
+        try:
+            added = _script("push", _PUSH_SCRIPT, redis_client)(
+                keys=[QUEUE_KEY, PAYLOADS_KEY],
+                args=[entry_id, payload, "1" if coalesce_key else "0"],
+                client=redis_client,
+            )
+            if not added:
+                metrics_service.inc("telegram_outbox_coalesced_total")
+            _schedule_delivery(redis_client)
+            return
+        except _redis.RedisError:
+            logger.warning("Outbox unavailable — sending %s inline", method, exc_info=True)
+    deliver(method, kwargs)
+
+
+def _schedule_delivery(redis_client):
+    """Enqueue a delivery job unless one is already pending or running."""
+    if redis_client.set(SCHEDULED_KEY, 1, nx=True, ex=SCHEDULED_TTL):
+        extensions.update_queue.enqueue("app.workers.outbox.deliver_outbox")
+
+
+def pop_next():
+    """Atomically take the next (method, kwargs) off the queue, or None."""
+    redis_client = extensions.redis_client
+    raw = _script("pop", _POP_SCRIPT, redis_client)(
+        keys=[QUEUE_KEY, PAYLOADS_KEY], client=redis_client
+    )
+    if not raw:
+        return None
+    entry = json.loads(raw)
+    return entry["method"], entry["kwargs"]
+
+
+def deliver(method, kwargs):
+    if method not in METHODS:
+        raise ValueError(f"Unsupported outbox method: {method}")
+    getattr(telegram_service, method)(**kwargs)
@@ -1,27 +1,166 @@
 import json
 import logging
+import os
+import threading
+import time
 import httpx
 from flask import current_app
+from app.services import metrics_service, rate_limiter
 
 logger = logging.getLogger(__name__)
 
-BASE_URL = "https://api.telegram.org/bot{token}/{method}"
+MAX_BACKOFF = 30  # seconds, cap for exponential backoff on 5xx/network errors
+
+# Methods that count against Telegram's per-chat and global message limits
+SEND_METHODS = {
+    "sendMessage",
+    "sendPhoto",
+    "sendMediaGroup",
+    "editMessageCaption",
+    "editMessageText",
+}
+
+# Methods that post a new message: if a request may have reached Telegram
+# (read timeout, 5xx) a retry could deliver it twice, so these are only
+# retried when the request was never sent
+NON_IDEMPOTENT_METHODS = {"sendMessage", "sendPhoto", "sendMediaGroup"}
+_NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
 
 
 def _url(method):
-    return BASE_URL.format(token=current_app.config["TELEGRAM_BOT_TOKEN"], method=method)
+    base = current_app.config["TELEGRAM_API_BASE_URL"].rstrip("/")
+    return f"{base}/bot{current_app.config['TELEGRAM_BOT_TOKEN']}/{method}"
+
+
+def _get_client():
+    """Return the process-wide keep-alive client, creating it lazily.
+
+    The owning PID is tracked so a forked child (gunicorn worker, RQ work
+    horse) builds its own client instead of sharing the parent's sockets.
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                _client = _build_client()
+                _client_pid = pid
+    return _client
+
+
+def _build_client():
+    config = current_app.config
+    http2 = config["TELEGRAM_HTTP2"]
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("TELEGRAM_HTTP2 set but h2 is not installed — using HTTP/1.1")
+            http2 = False
+    return httpx.Client(
+        http2=http2,
+        timeout=httpx.Timeout(
+            config["TELEGRAM_READ_TIMEOUT"],
+            connect=config["TELEGRAM_CONNECT_TIMEOUT"],
+        ),
+        limits=httpx.Limits(
+            max_connections=config["TELEGRAM_MAX_CONNECTIONS"],
+            max_keepalive_connections=config["TELEGRAM_MAX_CONNECTIONS"],
+            keepalive_expiry=60,
+        ),
+    )
+
+
+def _backoff(attempt):
+    return min(MAX_BACKOFF, 2 ** attempt)
 
 
 def _post(method, **kwargs):
-    """Make a POST request to Telegram Bot API."""
-    resp = httpx.post(_url(method), **kwargs)
-    data = resp.json()
+    """Make a POST request to Telegram Bot API.
+
+    Retries 429s after Telegram's `retry_after`, and 5xx responses or
+    network errors with exponential backoff, up to TELEGRAM_MAX_RETRIES.
+    NON_IDEMPOTENT_METHODS are only retried after a 429 or a connection
+    failure, when Telegram cannot have acted on the request. Every
+    attempt takes its own rate-limit token.
+    """
+    max_retries = current_app.config["TELEGRAM_MAX_RETRIES"]
+    max_retry_after = current_app.config["TELEGRAM_MAX_RETRY_AFTER"]
+    blind_retries = method not in NON_IDEMPOTENT_METHODS
+    attempt = 0
+    while True:
+        _throttle(method, kwargs)
+        start = time.perf_counter()
+        outcome, delay = "ok", None
+        try:
+            resp = _get_client().post(_url(method), **kwargs)
+        except httpx.TransportError as e:
+            outcome = "network_error"
+            if attempt >= max_retries or not (blind_retries or isinstance(e, _NOT_SENT_ERRORS)):
+                raise
+            delay = _backoff(attempt)
+        else:
+            if resp.status_code == 429:
+                outcome = "rate_limited"
+                retry_after = _retry_after(resp)
+                if retry_after <= max_retry_after:
+                    delay = retry_after
+            elif resp.status_code >= 500:
+                outcome = "server_error"
+                if blind_retries:
+                    delay = _backoff(attempt)
+        finally:
+            metrics_service.observe(
+                "telegram_api_duration_seconds",
+                time.perf_counter() - start,
+                {"method": method, "outcome": outcome},
+            )
+
+        if delay is None or attempt >= max_retries:
+            break
+        logger.warning("Telegram %s %s — retrying in %ss", method, outcome, delay)
+        time.sleep(delay)
+        attempt += 1
+
+    try:
+        data = resp.json()
+    except ValueError:
+        raise RuntimeError(f"Telegram API error: HTTP {resp.status_code}")
     if not data.get("ok"):
         logger.error("Telegram API error: %s", data)
         raise RuntimeError(f"Telegram API error: {data.get('description', 'unknown')}")
     return data.get("result")
 
 
+def _throttle(method, kwargs):
+    """Wait for a token from the shared global and per-chat buckets."""
+    if method not in SEND_METHODS:
+        return
+    config = current_app.config
+    global_rate = config["TELEGRAM_GLOBAL_RATE"]
+    buckets = [("telegram:global", global_rate, global_rate)]
+    chat_id = (kwargs.get("data") or {}).get("chat_id")
+    if chat_id is not None:
+        buckets.append((
+            f"telegram:chat:{chat_id}",
+            config["TELEGRAM_CHAT_RATE"],
+            config["TELEGRAM_CHAT_BURST"],
+        ))
+    waited = rate_limiter.acquire(buckets)
+    metrics_service.observe("telegram_rate_limit_wait_seconds", waited, {"method": method})
+
+
+def _retry_after(resp):
+    try:
+        return int(resp.json().get("parameters", {}).get("retry_after", 1))
+    except (ValueError, AttributeError):
+        return 1
+
+
 def send_message(chat_id, text, reply_markup=None, parse_mode=None):
     payload = {"chat_id": chat_id, "text": text}
     if reply_markup:
@@ -31,14 +170,32 @@ def send_message(chat_id, text, reply_markup=None, parse_mode=None):
     return _post("sendMessage", data=payload)
 
 
-def send_photo(chat_id, photo_url, caption=None, reply_markup=None):
-    """Send a photo by URL with optional caption and inline keyboard."""
-    payload = {"chat_id": chat_id, "photo": photo_url}
-    if caption:
-        payload["caption"] = caption
-    if reply_markup:
-        payload["reply_markup"] = json.dumps(reply_markup)
-    return _post("sendPhoto", data=payload)
+def send_media_group(chat_id, photos):
+    """Send 2–10 photos as one album in a single request.
+
+    `photos` is a list of dicts with `photo` (file_id/URL or bytes) and an
+    optional `caption`. Returns the list of sent messages, in order.
+    """
+    media, files = [], {}
+    for i, item in enumerate(photos):
+        entry = {"type": "photo"}
+        if isinstance(item["photo"], (bytes, bytearray)):
+            name = f"photo{i}"
+            files[name] = (f"{name}.jpg", bytes(item["photo"]), "image/jpeg")
+            entry["media"] = f"attach://{name}"
+        else:
+            entry["media"] = item["photo"]
+        if item.get("caption"):
+            entry["caption"] = item["caption"]
+        media.append(entry)
+    payload = {"chat_id": chat_id, "media": json.dumps(media)}
+    return _post("sendMediaGroup", data=payload, files=files or None)
+
+
+def largest_file_id(message):
+    """file_id of the largest PhotoSize in a sent/received photo message."""
+    photos = (message or {}).get("photo") or []
+    return photos[-1]["file_id"] if photos else None
 
 
 def edit_message_caption(chat_id, message_id, caption, reply_markup=None):
@@ -52,6 +209,27 @@ def edit_message_caption(chat_id, message_id, caption, reply_markup=None):
     return _post("editMessageCaption", data=payload)
 
 
+def edit_message_text(chat_id, message_id, text, reply_markup=None):
+    """Edit a text message; photo messages get their caption edited instead.
+
+    Approval cards sent before previews became albums are photos with a
+    caption, which editMessageText rejects.
+    """
+    payload = {
+        "chat_id": chat_id,
+        "message_id": message_id,
+        "text": text,
+    }
+    if reply_markup:
+        payload["reply_markup"] = json.dumps(reply_markup)
+    try:
+        return _post("editMessageText", data=payload)
+    except RuntimeError as e:
+        if "there is no text in the message to edit" not in str(e):
+            raise
+    return edit_message_caption(chat_id, message_id, text, reply_markup)
+
+
 def answer_callback_query(callback_query_id, text=None):
     payload = {"callback_query_id": callback_query_id}
     if text:
@@ -64,13 +242,39 @@ def get_file(file_id):
     return _post("getFile", data={"file_id": file_id})
 
 
-def download_file(file_path):
-    """Download a file from Telegram servers."""
+def select_photo_size(photo_sizes, min_side):
+    """Pick the smallest PhotoSize whose longer side is at least min_side.
+
+    Telegram lists sizes smallest first; falls back to the largest when
+    none is big enough.
+    """
+    for size in sorted(photo_sizes, key=lambda s: s.get("width", 0) * s.get("height", 0)):
+        if max(size.get("width", 0), size.get("height", 0)) >= min_side:
+            return size
+    return photo_sizes[-1]
+
+
+def download_file(file_path, max_bytes=None):
+    """Download a file from Telegram servers.
+
+    Streams the body and raises ValueError as soon as it exceeds
+    `max_bytes`, so oversized uploads are never fully buffered.
+    """
     token = current_app.config["TELEGRAM_BOT_TOKEN"]
-    url = f"https://api.telegram.org/file/bot{token}/{file_path}"
-    resp = httpx.get(url)
-    resp.raise_for_status()
-    return resp.content
+    base = current_app.config["TELEGRAM_API_BASE_URL"].rstrip("/")
+    url = f"{base}/file/bot{token}/{file_path}"
+    with _get_client().stream("GET", url) as resp:
+        resp.raise_for_status()
+        declared = int(resp.headers.get("Content-Length") or 0)
+        if max_bytes and declared > max_bytes:
+            raise ValueError(f"Image too large: {declared} bytes (max {max_bytes})")
+        chunks, received = [], 0
+        for chunk in resp.iter_bytes():
+            received += len(chunk)
+            if max_bytes and received > max_bytes:
+                raise ValueError(f"Image too large: over {max_bytes} bytes")
+            chunks.append(chunk)
+    return b"".join(chunks)
 
 
 def set_webhook(url, secret_token=None):
@@ -0,0 +1,26 @@
+"""RQ worker jobs and the shared worker app."""
+from flask import current_app, has_app_context
+
+_worker_app = None
+
+
+def get_worker_app():
+    """Return an app instance for worker execution.
+
+    Reuse the current app when already inside an app context (tests/CLI),
+    otherwise lazily create the worker app once.
+    """
+    global _worker_app
+    if has_app_context():
+        return current_app._get_current_object()
+    if _worker_app is None:
+        from app import create_app
+
+        _worker_app = create_app()
+    return _worker_app
+
+
+def set_worker_app(app):
+    """Use an already-built app for jobs (see app.workers.runner)."""
+    global _worker_app
+    _worker_app = app
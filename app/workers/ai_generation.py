@@ -1,34 +1,25 @@
 """RQ worker job: generate AI hero image for a product."""
 import logging
-from app import create_app
-from flask import current_app, has_app_context
-from app.extensions import db, redis_client
+from datetime import datetime, timezone
+from rq import get_current_job
+from app import extensions
+from app.extensions import db
 from app.models.product import Product
 from app.models.image import Image
 from app.models.settings import Settings
-from app.services import ai_service, storage_service, telegram_service
-from app.blueprints.telegram.keyboards import approval_keyboard, fallback_keyboard
+from app.services import (
+    ai_service, job_metrics_service, metrics_service, storage_service, telegram_service,
+    telegram_outbox,
+)
+from app.blueprints.telegram.keyboards import (
+    approval_keyboard, fallback_keyboard, variation_picker_keyboard,
+)
+from app.workers import get_worker_app as _get_app
 
 logger = logging.getLogger(__name__)
 
-_worker_app = None
 
-
-def _get_app():
-    """Return an app instance for worker execution.
-
-    Reuse the current app when already inside an app context (tests/CLI),
-    otherwise lazily create the worker app once.
-    """
-    global _worker_app
-    if has_app_context():
-        return current_app._get_current_object()
-    if _worker_app is None:
-        _worker_app = create_app()
-    return _worker_app
-
-
-def generate_ai_image(product_id, image_id, original_storage_key, version):
+def generate_ai_image(product_id, image_id, original_storage_key, version, fresh=False):
     """Generate an AI image for a product and send preview to admin.
 
     This job is enqueued by the Telegram handler when a draft is created
@@ -36,9 +27,16 @@ def generate_ai_image(product_id, image_id, original_storage_key, version):
 
     Idempotency: checks image status before proceeding.
     Distributed lock: prevents duplicate work on the same image.
+    Result cache: output is stored by a hash of original, prompt, model,
+    params and version, so retries and re-ingested photos skip the model.
+    `fresh` (the Regenerate button) ignores entries cached before this
+    job was created.
+    Every run that gets past the lock is timed stage by stage and saved
+    as an AIJobMetric row (see `flask ai-stats`).
     """
     app = _get_app()
     with app.app_context():
+        timer = job_metrics_service.JobTimer("single", product_id)
         image = db.session.get(Image, image_id)
         if not image:
             logger.error("Image record %d not found", image_id)
@@ -51,28 +49,44 @@ def generate_ai_image(product_id, image_id, original_storage_key, version):
 
         # Distributed lock
         lock_key = f"ai_gen:{image_id}"
-        lock = redis_client.lock(lock_key, timeout=600)
-        if not lock.acquire(blocking=False):
+        with timer.stage("lock"):
+            lock = extensions.redis_client.lock(lock_key, timeout=600)
+            acquired = lock.acquire(blocking=False)
+        if not acquired:
             logger.info("Lock held for image %d, skipping", image_id)
             return
 
         try:
-            product = db.session.get(Product, product_id)
-            if not product:
-                logger.error("Product %d not found", product_id)
-                return
+            with timer.stage("load"):
+                product = db.session.get(Product, product_id)
+                if not product:
+                    logger.error("Product %d not found", product_id)
+                    return
 
-            # Download original image from DB
-            original = product.images.filter_by(type="ORIGINAL", status="READY").first()
-            if not original or not original.image_data:
-                raise ValueError("Original image not found in database")
-            original_bytes = original.image_data
+                # Download original image from DB
+                original = product.images.filter_by(type="ORIGINAL", status="READY").first()
+                if not original or not original.image_data:
+                    raise ValueError("Original image not found in database")
+                original_bytes = original.image_data
 
-            # Generate AI image
-            logger.info(
-                "Generating AI image for %s v%d", product.dress_id, version
-            )
-            ai_bytes = ai_service.generate_image(original_bytes)
+            # Generate AI image, unless an identical request is cached
+            with timer.stage("cache"):
+                cache_key = ai_service.result_cache_key(original_bytes, variation=version)
+                ai_bytes = storage_service.get_ai_result(
+                    cache_key, created_after=_job_created_at() if fresh else None
+                )
+            metrics_service.record_cache("ai_result", ai_bytes is not None)
+            if ai_bytes is None:
+                logger.info(
+                    "Generating AI image for %s v%d", product.dress_id, version
+                )
+                ai_bytes, backend = ai_service.generate(original_bytes, timer=timer)
+                timer.note(generated=1)
+                with timer.stage("cache"):
+                    _cache_result(cache_key, backend, ai_bytes)
+            else:
+                logger.info("Using cached AI image for %s v%d", product.dress_id, version)
+                timer.note(cache_hit=True, output_bytes=len(ai_bytes))
 
             # Store AI image bytes in database
             image.image_data = ai_bytes
@@ -80,14 +94,19 @@ def generate_ai_image(product_id, image_id, original_storage_key, version):
             # Update image record with URL
             image.url = f"/img/{image.id}"
             image.status = "READY"
-            db.session.commit()
+            product.updated_at = datetime.now(timezone.utc)  # new image → new page validators
+            timer.note(images=1)
+            with timer.stage("commit"):
+                db.session.commit()
 
             logger.info(
                 "AI image ready for %s v%d", product.dress_id, version
             )
 
             # Send preview card to admin
-            _send_preview(product)
+            with timer.stage("preview"):
+                _send_preview(product)
+            timer.save("ok")
 
         except Exception as e:
             logger.exception(
@@ -95,14 +114,16 @@ def generate_ai_image(product_id, image_id, original_storage_key, version):
                 product_id,
                 image_id,
             )
+            db.session.rollback()
             image.status = "FAILED"
             db.session.commit()
+            timer.save("failed")
 
             # Notify admin on failure
             product = db.session.get(Product, product_id)
             if product and product.telegram_chat_id:
                 try:
-                    telegram_service.send_message(
+                    telegram_outbox.send_message(
                         chat_id=product.telegram_chat_id,
                         text=(
                             f"AI generation failed for {product.dress_id} "
@@ -123,8 +144,156 @@ def generate_ai_image(product_id, image_id, original_storage_key, version):
                 pass  # lock may have expired
 
 
+def generate_ai_variations(product_id, image_ids, styles, fresh=True):
+    """Generate several styles of one product in a single job.
+
+    `image_ids` are PENDING AI_GENERATED images reserved as consecutive
+    versions, aligned with `styles`. The reference photo is prepared once
+    and all styles are requested concurrently; results are written in one
+    transaction and sent as one album with a picker keyboard. Styles that
+    already succeeded are skipped when RQ retries the job.
+    """
+    app = _get_app()
+    with app.app_context():
+        timer = job_metrics_service.JobTimer("variations", product_id)
+        product = db.session.get(Product, product_id)
+        if not product:
+            logger.error("Product %d not found", product_id)
+            return
+        images = {img.id: img for img in Image.query.filter(Image.id.in_(image_ids))}
+        batch = [(images[i], style) for i, style in zip(image_ids, styles) if i in images]
+        todo = [(img, style) for img, style in batch if img.status != "READY"]
+        if not todo:
+            logger.info("Variations for %s already READY, skipping", product.dress_id)
+            return
+
+        with timer.stage("lock"):
+            lock = extensions.redis_client.lock(f"ai_variations:{product_id}", timeout=600)
+            acquired = lock.acquire(blocking=False)
+        if not acquired:
+            logger.info("Lock held for %s variations, skipping", product.dress_id)
+            return
+
+        try:
+            with timer.stage("load"):
+                original = product.original_image
+                if not original or not original.image_data:
+                    raise ValueError("Original image not found in database")
+                original_bytes = original.image_data
+
+            created_after = _job_created_at() if fresh else None
+            results, misses = {}, []
+            with timer.stage("cache"):
+                for img, style in todo:
+                    key = ai_service.result_cache_key(
+                        original_bytes, variation=img.version, style=style
+                    )
+                    cached = storage_service.get_ai_result(key, created_after=created_after)
+                    metrics_service.record_cache("ai_result", cached is not None)
+                    if cached is None:
+                        misses.append((img, style, key))
+                    else:
+                        results[img.id] = cached
+            timer.note(cache_hit=not misses)
+
+            if misses:
+                logger.info(
+                    "Generating %d styles for %s", len(misses), product.dress_id
+                )
+                with timer.stage("model"):
+                    generated = ai_service.generate_variations(
+                        original_bytes, [style for _, style, _ in misses]
+                    )
+                for (img, style, key), output in zip(misses, generated):
+                    if isinstance(output, Exception):
+                        results[img.id] = output
+                    else:
+                        results[img.id], backend = output
+                        timer.note(model_name=backend.model_name)
+                        with timer.stage("cache"):
+                            _cache_result(key, backend, results[img.id])
+
+            # One transaction for the whole batch
+            failures = []
+            for img, style in todo:
+                output = results[img.id]
+                if isinstance(output, Exception):
+                    img.status = "FAILED"
+                    failures.append(f"{style}: {str(output)[:100]}")
+                else:
+                    img.image_data = output
+                    img.url = f"/img/{img.id}"
+                    img.status = "READY"
+                    product.updated_at = datetime.now(timezone.utc)
+            timer.note(
+                output_bytes=sum(
+                    len(out) for out in results.values() if not isinstance(out, Exception)
+                ),
+                images=sum(1 for img, _ in todo if img.status == "READY"),
+                generated=sum(1 for out in generated if not isinstance(out, Exception))
+                if misses else 0,
+            )
+            with timer.stage("commit"):
+                db.session.commit()
+
+            ready = [(img, style) for img, style in batch if img.status == "READY"]
+            if not ready:
+                raise RuntimeError("All styles failed — " + "; ".join(failures))
+            logger.info(
+                "%d/%d styles ready for %s", len(ready), len(batch), product.dress_id
+            )
+            with timer.stage("preview"):
+                _send_variations_preview(product, ready, failures)
+            timer.save("ok")
+
+        except Exception as e:
+            logger.exception("AI variations failed for product %d", product_id)
+            db.session.rollback()
+            timer.save("failed")
+            if product.telegram_chat_id:
+                try:
+                    telegram_outbox.send_message(
+                        chat_id=product.telegram_chat_id,
+                        text=(
+                            f"Style variations failed for {product.dress_id}.\n"
+                            f"Error: {str(e)[:200]}"
+                        ),
+                        reply_markup=fallback_keyboard(product.id),
+                    )
+                except Exception:
+                    logger.exception("Failed to notify admin of AI failure")
+            raise  # let RQ handle retry
+
+        finally:
+            try:
+                lock.release()
+            except Exception:
+                pass  # lock may have expired
+
+
+def _cache_result(cache_key, backend, data):
+    """Store output under the primary backend's key — fallback output is not cached."""
+    if backend is ai_service.get_backend():
+        storage_service.put_ai_result(cache_key, backend.model_name, data)
+
+
+def _job_created_at():
+    """When the current RQ job was first enqueued (stable across retries)."""
+    job = get_current_job()
+    if job is not None and job.created_at is not None:
+        created = job.created_at
+        return created.replace(tzinfo=timezone.utc) if created.tzinfo is None else created
+    return datetime.now(timezone.utc)
+
+
 def _send_preview(product):
-    """Send original + AI preview images with approval keyboard."""
+    """Send original + AI previews as one album, then the approval keyboard.
+
+    Photos are uploaded as bytes the first time and by cached Telegram
+    file_id afterwards. Albums cannot carry inline keyboards, so the
+    approval buttons go on a follow-up text message, whose ID is kept
+    for later status edits.
+    """
     original = product.original_image
     ai_img = product.ai_image
 
@@ -146,22 +315,58 @@ def _send_preview(product):
         f"AI: v{ai_img.version}"
     )
 
-    # Send original photo first
-    telegram_service.send_photo(
+    messages = telegram_service.send_media_group(
         chat_id=product.telegram_chat_id,
-        photo_url=original.url,
-        caption=f"Original — {product.dress_id}",
+        photos=[
+            {"photo": _photo_source(original), "caption": f"Original — {product.dress_id}"},
+            {"photo": _photo_source(ai_img), "caption": f"AI v{ai_img.version}"},
+        ],
     )
+    for image, message in zip((original, ai_img), messages or []):
+        if not image.telegram_file_id:
+            image.telegram_file_id = telegram_service.largest_file_id(message)
 
-    # Send AI photo with approval keyboard
-    result = telegram_service.send_photo(
+    result = telegram_service.send_message(
         chat_id=product.telegram_chat_id,
-        photo_url=ai_img.url,
-        caption=caption,
+        text=caption,
         reply_markup=approval_keyboard(product.id),
     )
 
     # Store message ID for later editing
     if result and "message_id" in result:
         product.telegram_message_id = result["message_id"]
-        db.session.commit()
+    db.session.commit()
+
+
+def _send_variations_preview(product, variations, failures=()):
+    """Send the original and every ready style as one album, then the picker."""
+    original = product.original_image
+    messages = telegram_service.send_media_group(
+        chat_id=product.telegram_chat_id,
+        photos=[{"photo": _photo_source(original), "caption": f"Original — {product.dress_id}"}]
+        + [{"photo": _photo_source(img), "caption": f"v{img.version} · {style}"}
+           for img, style in variations],
+    )
+    sent = [original] + [img for img, _ in variations]
+    for image, message in zip(sent, messages or []):
+        if not image.telegram_file_id:
+            image.telegram_file_id = telegram_service.largest_file_id(message)
+
+    text = f"{product.dress_id}: {product.title}\nPick a style to publish:"
+    if failures:
+        text += "\n\nFailed: " + "; ".join(failures)
+    result = telegram_service.send_message(
+        chat_id=product.telegram_chat_id,
+        text=text,
+        reply_markup=variation_picker_keyboard(
+            product.id, [(img.version, style) for img, style in variations]
+        ),
+    )
+    if result and "message_id" in result:
+        product.telegram_message_id = result["message_id"]
+    db.session.commit()
+
+
+def _photo_source(image):
+    """Cached Telegram file_id if we have one, else the stored JPEG bytes."""
+    return image.telegram_file_id or image.image_data
@@ -0,0 +1,97 @@
+"""Album (media group) buffering for Telegram photo uploads.
+
+Telegram delivers an album as separate messages sharing a
+`media_group_id`. Each one is appended to a Redis list; the first also
+schedules `finalize_album` a short window later, which takes the whole
+list and publishes it as a single product. Items arriving after that
+become a follow-up batch, which is added to the product the album
+created (remembered per media_group_id). Without Redis, album items
+fall back to being handled one photo at a time.
+"""
+import json
+import logging
+from datetime import timedelta
+import redis as _redis
+from flask import current_app
+
+from app import extensions
+from app.workers import get_worker_app
+
+logger = logging.getLogger(__name__)
+
+ALBUM_KEY = "tg_album:{group_id}"
+ALBUM_SCHEDULED_KEY = "tg_album:{group_id}:scheduled"
+ALBUM_PRODUCT_KEY = "tg_album:{group_id}:product"
+ALBUM_LOCK_KEY = "tg_album:{group_id}:lock"
+ALBUM_TTL = 600
+
+
+def buffer_album_message(message):
+    """Add an album item to its buffer.
+
+    Returns False when Redis is unavailable so the caller can handle the
+    photo on its own.
+    """
+    redis_client = extensions.redis_client
+    if not redis_client:
+        return False
+    group_id = message["media_group_id"]
+    key = ALBUM_KEY.format(group_id=group_id)
+    try:
+        pipe = redis_client.pipeline()
+        pipe.rpush(key, json.dumps(message))
+        pipe.expire(key, ALBUM_TTL)
+        pipe.execute()
+        if redis_client.set(ALBUM_SCHEDULED_KEY.format(group_id=group_id), 1,
+                            nx=True, ex=ALBUM_TTL):
+            window = current_app.config["TELEGRAM_ALBUM_WINDOW"]
+            extensions.update_queue.enqueue_in(
+                timedelta(seconds=window),
+                "app.workers.albums.finalize_album",
+                group_id,
+            )
+    except _redis.RedisError:
+        logger.warning("Could not buffer album item — handling it alone", exc_info=True)
+        return False
+    return True
+
+
+def take_album(group_id):
+    """Atomically remove and return the buffered messages of an album.
+
+    The scheduled flag goes with them, so an item that arrives after this
+    (the update drain fell behind the window) schedules a follow-up batch
+    instead of waiting on a finalize that has already run.
+    """
+    key = ALBUM_KEY.format(group_id=group_id)
+    pipe = extensions.redis_client.pipeline()
+    pipe.lrange(key, 0, -1)
+    pipe.delete(key, ALBUM_SCHEDULED_KEY.format(group_id=group_id))
+    raw, _ = pipe.execute()
+    return [json.loads(item) for item in raw]
+
+
+def finalize_album(group_id):
+    """Publish a buffered album as one product, or add late items to it.
+
+    Batches of one album run one at a time, so a follow-up batch sees the
+    product created by the batch before it.
+    """
+    from app.blueprints.telegram.handlers import handle_album, handle_album_late_items
+
+    app = get_worker_app()
+    with app.app_context():
+        redis_client = extensions.redis_client
+        with redis_client.lock(ALBUM_LOCK_KEY.format(group_id=group_id),
+                               timeout=ALBUM_TTL, blocking_timeout=ALBUM_TTL):
+            messages = take_album(group_id)
+            if not messages:
+                return
+            product_key = ALBUM_PRODUCT_KEY.format(group_id=group_id)
+            product_id = redis_client.get(product_key)
+            if product_id:
+                handle_album_late_items(int(product_id), messages)
+                return
+            product = handle_album(messages)
+            if product is not None:
+                redis_client.set(product_key, product.id, ex=ALBUM_TTL)
@@ -0,0 +1,50 @@
+"""RQ job: deliver the outbound Telegram queue."""
+import logging
+from app import extensions
+from app.services import telegram_outbox
+from app.workers import get_worker_app
+
+logger = logging.getLogger(__name__)
+
+
+def deliver_outbox():
+    """Send queued messages in order until the outbox is empty.
+
+    Pacing comes from telegram_service's shared rate limiter. A message
+    that still fails after the client's own retries is logged and dropped
+    so it cannot wedge the queue. The schedule flag is refreshed before
+    each message and released however the job ends.
+    """
+    app = get_worker_app()
+    redis_client = extensions.redis_client
+    ttl = telegram_outbox.SCHEDULED_TTL
+    with app.app_context():
+        try:
+            while True:
+                redis_client.expire(telegram_outbox.SCHEDULED_KEY, ttl)
+                entry = telegram_outbox.pop_next()
+                while entry is not None:
+                    method, kwargs = entry
+                    try:
+                        telegram_outbox.deliver(method, kwargs)
+                    except Exception:
+                        logger.exception("Dropping outbox %s to chat %s",
+                                         method, kwargs.get("chat_id"))
+                    redis_client.expire(telegram_outbox.SCHEDULED_KEY, ttl)
+                    entry = telegram_outbox.pop_next()
+
+                # Hand back the schedule flag, then make sure nothing slipped
+                # in while it was still set (those enqueues skipped scheduling).
+                redis_client.delete(telegram_outbox.SCHEDULED_KEY)
+                if not redis_client.llen(telegram_outbox.QUEUE_KEY):
+                    return
+                if not redis_client.set(telegram_outbox.SCHEDULED_KEY, 1, nx=True, ex=ttl):
+                    return  # a newly scheduled job will pick it up
+        except BaseException:
+            # Let the next enqueue schedule a fresh job (RQ timeouts and
+            # shutdowns raise non-Exception errors too)
+            try:
+                redis_client.delete(telegram_outbox.SCHEDULED_KEY)
+            except Exception:
+                logger.warning("Could not release the outbox schedule flag", exc_info=True)
+            raise
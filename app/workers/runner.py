@@ -0,0 +1,141 @@
+"""Preloaded RQ workers.
+
+Stock `rq worker` forks a fresh work-horse per job, and because the parent
+never built the app, every job paid for create_app(), a new SQLAlchemy
+engine and Redis client, the google.generativeai import and model setup.
+`flask worker` builds all of that once in the parent; forked work-horses
+inherit it and only need their own database connections.
+
+ThreadPoolWorker runs several jobs at once in one process, for queues
+whose jobs mostly wait on I/O (AI generation waits on Gemini).
+
+Queues are drained in the order given on the command line, which is
+what gives ai-interactive strict priority over ai-bulk.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from rq import SimpleWorker, Worker
+from rq.timeouts import TimerDeathPenalty
+from app.extensions import db
+from app.services import metrics_service
+from app.workers import get_worker_app, set_worker_app
+
+logger = logging.getLogger(__name__)
+
+
+class QueueWaitMixin:
+    """Report how long each job sat in its queue before a worker took it."""
+
+    def prepare_job_execution(self, job, remove_from_intermediate_queue=False):
+        super().prepare_job_execution(job, remove_from_intermediate_queue)
+        if job.enqueued_at is not None:
+            enqueued = job.enqueued_at
+            if enqueued.tzinfo is None:
+                enqueued = enqueued.replace(tzinfo=timezone.utc)
+            waited = (datetime.now(timezone.utc) - enqueued).total_seconds()
+            metrics_service.observe("rq_job_wait_seconds", max(waited, 0), {"queue": job.origin})
+
+
+class PreloadedWorker(QueueWaitMixin, Worker):
+    """Forking worker whose work-horses inherit the preloaded app."""
+
+    def main_work_horse(self, job, queue):
+        reset_after_fork()
+        super().main_work_horse(job, queue)
+
+
+class PreloadedSimpleWorker(QueueWaitMixin, SimpleWorker):
+    """Runs jobs in the worker process itself — no fork per job.
+
+    Cheapest per job, but a crashing or leaking job takes the worker with
+    it; RQ's job timeouts are still enforced with SIGALRM.
+    """
+
+
+class ThreadPoolWorker(QueueWaitMixin, SimpleWorker):
+    """Runs up to `concurrency` jobs at once on threads in one process.
+
+    A job is only dequeued once a thread is free for it, so queued work
+    stays visible to other workers. Each job pushes its own app context
+    and therefore gets its own DB session; Redis locks and idempotency
+    checks inside the jobs work as before. Timeouts use TimerDeathPenalty
+    because SIGALRM can only interrupt the main thread.
+
+    RQ keeps the running job's Execution in `self.execution`; here it is
+    per thread, and each job creates and cleans up its own, so concurrent
+    jobs do not remove each other's StartedJobRegistry entries.
+    """
+
+    death_penalty_class = TimerDeathPenalty
+
+    def __init__(self, *args, concurrency=4, **kwargs):
+        self._local = threading.local()  # Worker.__init__ already sets execution
+        super().__init__(*args, **kwargs)
+        self.concurrency = concurrency
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="rq-job")
+
+    def dequeue_job_and_maintain_ttl(self, timeout, max_idle_time=None):
+        while not self._slots.acquire(timeout=5):
+            if self._stop_requested:
+                return None
+            self.heartbeat()  # all threads busy; stay registered as alive
+        result = None
+        try:
+            result = super().dequeue_job_and_maintain_ttl(timeout, max_idle_time)
+        finally:
+            if result is None:
+                self._slots.release()
+        return result
+
+    @property
+    def execution(self):
+        return getattr(self._local, "execution", None)
+
+    @execution.setter
+    def execution(self, value):
+        self._local.execution = value
+
+    def execute_job(self, job, queue):
+        self._pool.submit(self._run_job, job, queue)
+
+    def _run_job(self, job, queue):
+        try:
+            self.prepare_execution(job)
+            self.perform_job(job, queue)
+        except Exception:
+            self.log.exception("Job %s crashed its worker thread", job.id)
+        finally:
+            self._slots.release()
+
+    def teardown(self):
+        self._pool.shutdown(wait=True)  # let running jobs finish
+        super().teardown()
+
+
+def preload(app):
+    """Warm everything a job needs before the first fork."""
+    set_worker_app(app)
+
+    # Heavy imports land in the parent so children share the pages
+    from PIL import Image  # noqa: F401
+    from app.services import ai_service
+
+    with app.app_context():
+        for backend in ai_service.get_cascade():
+            backend.preload()
+        # The parent must not hand open connections to its children
+        db.engine.dispose()
+
+
+def reset_after_fork():
+    """Give a forked work-horse its own pool of database connections.
+
+    close=False drops the inherited pool without closing sockets the
+    parent (or a sibling) may still be using. Redis and the Telegram
+    client detect the new PID and reconnect on their own.
+    """
+    with get_worker_app().app_context():
+        db.engine.dispose(close=False)
@@ -0,0 +1,104 @@
+"""RQ job: process queued Telegram updates off the request path.
+
+The webhook appends each update to a per-chat Redis list and enqueues a
+`drain_chat` job. Draining holds a per-chat lock and pops updates in
+arrival order, so messages from one chat are never processed out of
+order even with several workers. Transient failures put the update back
+at the head of the list and let RQ retry the drain job.
+"""
+import json
+import logging
+import httpx
+import redis as _redis
+from rq import Retry
+from sqlalchemy.exc import OperationalError
+
+from app import extensions
+from app.workers import get_worker_app
+
+logger = logging.getLogger(__name__)
+
+CHAT_QUEUE_KEY = "tg_updates:chat:{chat_id}"
+CHAT_LOCK_KEY = "tg_updates:lock:{chat_id}"
+MAX_ATTEMPTS = 3
+TRANSIENT_ERRORS = (httpx.TransportError, _redis.ConnectionError, OperationalError)
+
+
+def chat_id_for(update):
+    """Ordering key for an update: the chat it belongs to."""
+    for key in ("message", "edited_message"):
+        if key in update:
+            return update[key]["chat"]["id"]
+    if "callback_query" in update:
+        cq = update["callback_query"]
+        return cq.get("message", {}).get("chat", {}).get("id") or cq["from"]["id"]
+    return 0
+
+
+def enqueue_update(update):
+    """Queue an update for background processing.
+
+    Returns False when Redis is unavailable so the caller can fall back to
+    processing inline.
+    """
+    redis_client = extensions.redis_client
+    if not redis_client:
+        return False
+    chat_id = chat_id_for(update)
+    try:
+        redis_client.rpush(
+            CHAT_QUEUE_KEY.format(chat_id=chat_id),
+            json.dumps({"update": update, "attempts": 0}),
+        )
+        extensions.update_queue.enqueue(
+            "app.workers.telegram_updates.drain_chat",
+            chat_id,
+            retry=Retry(max=MAX_ATTEMPTS, interval=[2, 10, 30]),
+        )
+    except _redis.RedisError:
+        logger.warning("Could not queue Telegram update — processing inline", exc_info=True)
+        return False
+    return True
+
+
+def drain_chat(chat_id):
+    """Process all queued updates for one chat, in order."""
+    from app.blueprints.telegram.handlers import handle_update
+
+    app = get_worker_app()
+    redis_client = extensions.redis_client
+    queue_key = CHAT_QUEUE_KEY.format(chat_id=chat_id)
+
+    while True:
+        lock = redis_client.lock(CHAT_LOCK_KEY.format(chat_id=chat_id), timeout=300)
+        if not lock.acquire(blocking=False):
+            return  # another worker is draining this chat
+        try:
+            while True:
+                raw = redis_client.lpop(queue_key)
+                if raw is None:
+                    break
+                envelope = json.loads(raw)
+                try:
+                    with app.app_context():
+                        handle_update(envelope["update"])
+                except TRANSIENT_ERRORS:
+                    envelope["attempts"] += 1
+                    if envelope["attempts"] >= MAX_ATTEMPTS:
+                        logger.exception("Dropping Telegram update after %d attempts",
+                                         envelope["attempts"])
+                        continue
+                    redis_client.lpush(queue_key, json.dumps(envelope))
+                    raise  # RQ retries the drain with backoff
+                except Exception:
+                    logger.exception("Error processing Telegram update")
+        finally:
+            try:
+                lock.release()
+            except Exception:
+                pass  # lock may have expired
+
+        # An update pushed between our last pop and the release would have
+        # seen the lock held; pick it up rather than leave it stranded.
+        if not redis_client.llen(queue_key):
+            return
@@ -0,0 +1,24 @@
+"""add telegram_file_id to images
+
+Revision ID: c3d9e8f7a6b5
+Revises: b7e1c2d3a4f5
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3d9e8f7a6b5'
+down_revision = 'b7e1c2d3a4f5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('images', sa.Column('telegram_file_id', sa.String(length=255), nullable=True))
+
+
+def downgrade():
+    op.drop_column('images', 'telegram_file_id')
@@ -0,0 +1,35 @@
+"""add ai_results table (content-addressed AI output cache)
+
+Revision ID: d4e5f6a7b8c9
+Revises: c3d9e8f7a6b5
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4e5f6a7b8c9'
+down_revision = 'c3d9e8f7a6b5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ai_results',
+    sa.Column('cache_key', sa.String(length=64), nullable=False),
+    sa.Column('model_name', sa.String(length=100), nullable=False),
+    sa.Column('image_data', sa.LargeBinary(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('cache_key')
+    )
+    with op.batch_alter_table('ai_results', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_ai_results_created_at'), ['created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('ai_results', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_ai_results_created_at'))
+
+    op.drop_table('ai_results')
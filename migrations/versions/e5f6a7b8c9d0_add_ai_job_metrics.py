@@ -0,0 +1,48 @@
+"""add ai_job_metrics table (per-stage AI job timings)
+
+Revision ID: e5f6a7b8c9d0
+Revises: d4e5f6a7b8c9
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5f6a7b8c9d0'
+down_revision = 'd4e5f6a7b8c9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ai_job_metrics',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('job_id', sa.String(length=64), nullable=True),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=True),
+    sa.Column('status', sa.String(length=10), nullable=False),
+    sa.Column('model_name', sa.String(length=100), nullable=True),
+    sa.Column('attempt', sa.Integer(), nullable=False),
+    sa.Column('cache_hit', sa.Boolean(), nullable=False),
+    sa.Column('reference_bytes', sa.Integer(), nullable=True),
+    sa.Column('output_bytes', sa.Integer(), nullable=True),
+    sa.Column('images', sa.Integer(), nullable=False),
+    sa.Column('generated', sa.Integer(), nullable=False),
+    sa.Column('total_ms', sa.Integer(), nullable=False),
+    sa.Column('stages', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('ai_job_metrics', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_ai_job_metrics_created_at'), ['created_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_ai_job_metrics_product_id'), ['product_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('ai_job_metrics', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_ai_job_metrics_product_id'))
+        batch_op.drop_index(batch_op.f('ix_ai_job_metrics_created_at'))
+
+    op.drop_table('ai_job_metrics')
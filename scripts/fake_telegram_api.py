@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""Local stand-in for the Telegram Bot API, for load tests.
+
+Usage:
+    python scripts/fake_telegram_api.py --port 8081 --latency-ms 40
+
+Then run the app with TELEGRAM_API_BASE_URL=http://localhost:8081.
+
+Implements the methods the bot uses (getFile, file downloads, sendMessage,
+sendPhoto, sendMediaGroup, editMessageCaption, editMessageText,
+answerCallbackQuery, answerInlineQuery, setWebhook) with plausible
+responses. Downloads return a generated JPEG. Call counts and the time
+of the last call are served as JSON at GET /stats.
+"""
+import argparse
+import io
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+from PIL import Image
+
+_BOT_PATH = re.compile(r"^/bot[^/]+/(\w+)$")
+_FILE_PATH = re.compile(r"^/file/bot[^/]+/(.+)$")
+SEND_METHODS = {"sendMessage", "sendPhoto", "sendMediaGroup",
+                "editMessageCaption", "editMessageText"}
+
+
+class FakeTelegram:
+    def __init__(self, latency_ms, jitter_ms, throttle_every, photo_size):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.throttle_every = throttle_every
+        self.message_ids = itertools.count(1000)
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.sends = 0
+        self.last_call = None
+        self.photo = self._make_photo(photo_size)
+
+    @staticmethod
+    def _make_photo(size):
+        buf = io.BytesIO()
+        Image.new("RGB", (size, size * 4 // 3), (180, 40, 60)).save(buf, format="JPEG", quality=90)
+        return buf.getvalue()
+
+    def record(self, method):
+        """Count a call; return True if it should be answered with a 429."""
+        with self.lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            self.last_call = time.time()
+            if method in SEND_METHODS:
+                self.sends += 1
+                return bool(self.throttle_every) and self.sends % self.throttle_every == 0
+        return False
+
+    def wait(self):
+        delay = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def stats(self):
+        with self.lock:
+            return {"calls": dict(self.calls), "last_call": self.last_call}
+
+    def _message(self, params, **extra):
+        return {
+            "message_id": next(self.message_ids),
+            "date": int(time.time()),
+            "chat": {"id": int(params.get("chat_id") or 0), "type": "private"},
+            **extra,
+        }
+
+    def _photo_sizes(self):
+        file_id = f"fake-{random.getrandbits(48):012x}"
+        return [
+            {"file_id": f"{file_id}-s", "file_unique_id": f"{file_id}s", "width": 90, "height": 120},
+            {"file_id": file_id, "file_unique_id": file_id, "width": 1280, "height": 1707,
+             "file_size": len(self.photo)},
+        ]
+
+    def call(self, method, params):
+        if method == "getFile":
+            file_id = params.get("file_id", "unknown")
+            return {"file_id": file_id, "file_unique_id": file_id,
+                    "file_size": len(self.photo), "file_path": f"photos/{file_id}.jpg"}
+        if method == "sendMessage":
+            return self._message(params, text=params.get("text", ""))
+        if method == "sendPhoto":
+            return self._message(params, photo=self._photo_sizes(),
+                                 caption=params.get("caption"))
+        if method == "sendMediaGroup":
+            media = params.get("media") or "[]"
+            items = json.loads(media) if isinstance(media, str) else media
+            group = f"{random.getrandbits(48)}"
+            return [self._message(params, photo=self._photo_sizes(), media_group_id=group)
+                    for _ in items]
+        if method in ("editMessageCaption", "editMessageText"):
+            return self._message(params, text=params.get("text"), caption=params.get("caption"))
+        if method in ("answerCallbackQuery", "answerInlineQuery", "setWebhook", "deleteWebhook"):
+            return True
+        return None
+
+
+def make_handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def do_GET(self):
+            if self.path == "/stats":
+                return self._json(200, fake.stats())
+            match = _FILE_PATH.match(self.path)
+            if match:
+                fake.record("file")
+                fake.wait()
+                return self._send(200, fake.photo, "image/jpeg")
+            self._json(404, {"ok": False, "error_code": 404, "description": "Not Found"})
+
+        def do_POST(self):
+            match = _BOT_PATH.match(self.path)
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else b""
+            if not match:
+                return self._json(404, {"ok": False, "error_code": 404, "description": "Not Found"})
+            method = match.group(1)
+            throttled = fake.record(method)
+            fake.wait()
+            if throttled:
+                return self._json(429, {
+                    "ok": False, "error_code": 429,
+                    "description": "Too Many Requests: retry after 1",
+                    "parameters": {"retry_after": 1},
+                })
+            result = fake.call(method, self._params(body))
+            if result is None:
+                return self._json(404, {"ok": False, "error_code": 404,
+                                        "description": f"Unknown method {method}"})
+            self._json(200, {"ok": True, "result": result})
+
+        def _params(self, body):
+            content_type = self.headers.get("Content-Type", "")
+            if content_type.startswith("application/json"):
+                return json.loads(body or b"{}")
+            if content_type.startswith("application/x-www-form-urlencoded"):
+                return {k: v[0] for k, v in parse_qs(body.decode()).items()}
+            if content_type.startswith("multipart/form-data"):
+                # Only the plain text fields matter for the fake responses
+                fields = re.findall(
+                    rb'name="([^"]+)"\r\n\r\n(.*?)\r\n--', body, re.DOTALL
+                )
+                return {k.decode(): v.decode(errors="replace") for k, v in fields}
+            return {}
+
+        def _json(self, status, payload):
+            self._send(status, json.dumps(payload).encode(), "application/json")
+
+        def _send(self, status, data, content_type):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=30,
+                        help="Added latency per call (default 30)")
+    parser.add_argument("--jitter-ms", type=float, default=10)
+    parser.add_argument("--throttle-every", type=int, default=0,
+                        help="Answer every Nth send with 429 retry_after=1 (0 = never)")
+    parser.add_argument("--photo-size", type=int, default=1280,
+                        help="Width of the JPEG served for downloads")
+    args = parser.parse_args()
+
+    fake = FakeTelegram(args.latency_ms, args.jitter_ms, args.throttle_every, args.photo_size)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(fake))
+    print(f"Fake Telegram Bot API on http://{args.host}:{args.port} (stats at /stats)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(fake.stats()["calls"], indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
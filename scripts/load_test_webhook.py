@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""Replay a realistic Telegram update stream against the webhook.
+
+Usage:
+    python scripts/load_test_webhook.py --url http://localhost:5000 \\
+        --requests 2000 --concurrency 16 --fake-api http://localhost:8081
+
+Sends a mix of photo-with-caption messages, admin commands and callback
+button presses to /telegram/webhook/<token> and reports throughput, status
+codes and webhook latency percentiles. With --fake-api (see
+scripts/fake_telegram_api.py) it also waits for background processing to
+go quiet and reports the outbound Bot API calls it caused.
+
+Reads TELEGRAM_BOT_TOKEN, TELEGRAM_WEBHOOK_SECRET and TELEGRAM_ADMIN_IDS
+from the environment unless given as flags.
+"""
+import argparse
+import itertools
+import os
+import random
+import statistics
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TITLES = ["Red Banarasi Silk Saree", "Navy Anarkali Suit", "Pink Georgette Lehenga",
+          "Green Chanderi Kurta", "Ivory Chikankari Dupatta"]
+COMMANDS = ["/stats", "/help", "/soldout D-{n}", "/hide D-{n}", "/unhide D-{n}",
+            "/editprice D-{n} {price}"]
+CALLBACKS = ["approve", "regen", "pub_orig", "discard", "edit_meta"]
+
+
+class UpdateStream:
+    """Generates updates in the proportions given by `mix`."""
+
+    def __init__(self, admin_id, chats, mix, first_dress_id):
+        self.admin_id = admin_id
+        self.chats = chats
+        self.kinds, self.weights = zip(*mix.items())
+        self.update_ids = itertools.count(int(time.time()) * 1000)
+        self.message_ids = itertools.count(1)
+        self.first_dress_id = first_dress_id
+        self.lock = threading.Lock()
+
+    def next(self):
+        with self.lock:
+            update_id = next(self.update_ids)
+            message_id = next(self.message_ids)
+        kind = random.choices(self.kinds, self.weights)[0]
+        chat_id = self.admin_id + random.randrange(self.chats)
+        sender = {"id": self.admin_id, "is_bot": False, "first_name": "Load"}
+        chat = {"id": chat_id, "type": "private"}
+        n = self.first_dress_id + random.randrange(200)
+
+        if kind == "photo":
+            file_id = f"load-{update_id}"
+            message = {
+                "message_id": message_id, "from": sender, "chat": chat,
+                "date": int(time.time()),
+                "photo": [
+                    {"file_id": f"{file_id}-s", "width": 90, "height": 120, "file_size": 4000},
+                    {"file_id": file_id, "width": 1280, "height": 1707, "file_size": 250000},
+                ],
+                "caption": (f"Title: {random.choice(TITLES)}\n"
+                            f"Price: {random.randrange(2000, 30000, 500)}\n"
+                            "Category: saree\nTags: silk, load-test"),
+            }
+            return kind, {"update_id": update_id, "message": message}
+        if kind == "command":
+            text = random.choice(COMMANDS).format(n=n, price=random.randrange(2000, 30000, 500))
+            message = {"message_id": message_id, "from": sender, "chat": chat,
+                       "date": int(time.time()), "text": text}
+            return kind, {"update_id": update_id, "message": message}
+        callback = {
+            "id": str(update_id), "from": sender, "chat_instance": "load",
+            "data": f"{random.choice(CALLBACKS)}:{random.randrange(1, 200)}",
+            "message": {"message_id": message_id, "chat": chat, "date": int(time.time())},
+        }
+        return kind, {"update_id": update_id, "callback_query": callback}
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def wait_for_quiet(fake_api, quiet_seconds, timeout):
+    """Poll the fake API until no call has arrived for quiet_seconds."""
+    deadline = time.time() + timeout
+    stats = {}
+    while time.time() < deadline:
+        stats = httpx.get(f"{fake_api}/stats").json()
+        last = stats.get("last_call")
+        if last and time.time() - last >= quiet_seconds:
+            break
+        time.sleep(0.5)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--token", default=os.environ.get("TELEGRAM_BOT_TOKEN", ""))
+    parser.add_argument("--secret", default=os.environ.get("TELEGRAM_WEBHOOK_SECRET", ""))
+    parser.add_argument("--admin-id", type=int, default=int(
+        (os.environ.get("TELEGRAM_ADMIN_IDS") or "0").split(",")[0]))
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--chats", type=int, default=1,
+                        help="Spread updates over this many chat ids (admin id + offset)")
+    parser.add_argument("--mix", default="photo=0.2,command=0.6,callback=0.2",
+                        help="Update proportions, e.g. photo=0.2,command=0.6,callback=0.2")
+    parser.add_argument("--first-dress-id", type=int, default=1001,
+                        help="Commands target D-<n> in [n, n+200)")
+    parser.add_argument("--fake-api", default="",
+                        help="Fake Bot API base URL; report outbound calls once quiet")
+    parser.add_argument("--quiet-seconds", type=float, default=3)
+    args = parser.parse_args()
+
+    if not args.token or not args.admin_id:
+        parser.error("--token and --admin-id are required (or set them in the environment)")
+
+    mix = {k: float(v) for k, v in (part.split("=") for part in args.mix.split(","))}
+    stream = UpdateStream(args.admin_id, args.chats, mix, args.first_dress_id)
+    webhook_url = f"{args.url.rstrip('/')}/telegram/webhook/{args.token}"
+    headers = {"X-Telegram-Bot-Api-Secret-Token": args.secret} if args.secret else {}
+    limits = httpx.Limits(max_connections=args.concurrency,
+                          max_keepalive_connections=args.concurrency)
+
+    baseline = httpx.get(f"{args.fake_api.rstrip('/')}/stats").json()["calls"] if args.fake_api else {}
+    latencies = {kind: [] for kind in mix}
+    statuses = Counter()
+    results_lock = threading.Lock()
+
+    with httpx.Client(limits=limits, timeout=30, headers=headers) as client:
+        def send(_):
+            kind, update = stream.next()
+            start = time.perf_counter()
+            try:
+                status = client.post(webhook_url, json=update).status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - start
+            with results_lock:
+                latencies[kind].append(elapsed)
+                statuses[status] += 1
+
+        started_at = time.time()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(send, range(args.requests)))
+        duration = time.perf_counter() - started
+
+    print(f"Sent {args.requests} updates in {duration:.2f}s "
+          f"({args.requests / duration:.1f} updates/s, concurrency {args.concurrency})")
+    print("Status codes:", dict(statuses))
+    print(f"{'kind':<10}{'count':>7}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms)")
+    all_latencies = []
+    for kind, values in sorted(latencies.items()) + [("all", None)]:
+        values = sorted(values if values is not None else all_latencies)
+        if kind != "all":
+            all_latencies.extend(values)
+        if not values:
+            continue
+        row = [statistics.fmean(values)] + [percentile(values, p) for p in (50, 95, 99)] + [values[-1]]
+        print(f"{kind:<10}{len(values):>7}" + "".join(f"{v * 1000:>9.1f}" for v in row))
+
+    if args.fake_api:
+        print(f"Waiting for background processing to finish (quiet for {args.quiet_seconds}s)...")
+        stats = wait_for_quiet(args.fake_api.rstrip("/"), args.quiet_seconds, timeout=600)
+        drained = (stats.get("last_call") or time.time()) - started_at
+        print(f"Processing finished ~{drained:.1f}s after the first update "
+              f"({args.requests / max(drained, 1e-9):.1f} updates/s end to end)")
+        calls = {method: count - baseline.get(method, 0)
+                 for method, count in stats.get("calls", {}).items()}
+        print("Bot API calls:", {m: c for m, c in sorted(calls.items()) if c})
+
+
+if __name__ == "__main__":
+    main()
@@ -59,3 +59,102 @@ def test_draft_images_are_not_public(client, db):
 
     resp = client.get(f"/img/{image.id}")
     assert resp.status_code == 404
+
+
+def test_metrics_exposes_route_latency(client):
+    client.get("/")
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.content_type.startswith("text/plain")
+    body = resp.get_data(as_text=True)
+    assert "# TYPE http_request_duration_seconds histogram" in body
+    assert 'http_request_duration_seconds_bucket{endpoint="/",method="GET",status="200",le="+Inf"}' in body
+    assert 'http_response_size_bytes_count{endpoint="/",method="GET",status="200"}' in body
+
+
+def test_metrics_requires_token_when_configured(client, app, monkeypatch):
+    monkeypatch.setitem(app.config, "METRICS_TOKEN", "s3cret")
+    assert client.get("/metrics").status_code == 403
+    resp = client.get("/metrics", headers={"Authorization": "Bearer s3cret"})
+    assert resp.status_code == 200
+
+
+def test_catalog_revalidates_with_etag(client):
+    first = client.get("/")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert "stale-while-revalidate" in first.headers["Cache-Control"]
+
+    second = client.get("/", headers={"If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.data == b""
+    assert second.headers["ETag"] == etag
+
+
+def test_product_page_revalidates_with_last_modified(client, db):
+    product = Product(
+        dress_id="D-7778",
+        title="Cached Saree",
+        price_inr=100000,
+        status="PUBLISHED",
+    )
+    db.session.add(product)
+    db.session.commit()
+
+    first = client.get("/d/D-7778")
+    assert first.status_code == 200
+    last_modified = first.headers["Last-Modified"]
+
+    second = client.get("/d/D-7778", headers={"If-Modified-Since": last_modified})
+    assert second.status_code == 304
+
+    product.price_inr = 200000
+    db.session.commit()
+    third = client.get("/d/D-7778", headers={"If-None-Match": first.headers["ETag"]})
+    assert third.status_code == 200
+
+
+def test_catalog_streaming_mode(client, app, db, monkeypatch):
+    monkeypatch.setitem(app.config, "CATALOG_STREAMING", True)
+    db.session.add(Product(
+        dress_id="D-7779", title="Streamed Lehenga", price_inr=100000, status="PUBLISHED"
+    ))
+    db.session.commit()
+
+    resp = client.get("/")
+    assert resp.status_code == 200
+    assert resp.is_streamed
+    body = resp.get_data(as_text=True)
+    assert body.index("style.css") < body.index("Streamed Lehenga")
+    assert "</html>" in body
+
+
+def test_catalog_page_past_the_end_shows_empty_state(client, app, db, monkeypatch):
+    db.session.add(Product(
+        dress_id="D-7780", title="Only Saree", price_inr=100000, status="PUBLISHED"
+    ))
+    db.session.commit()
+
+    for streaming in (False, True):
+        monkeypatch.setitem(app.config, "CATALOG_STREAMING", streaming)
+        body = client.get("/?page=999").get_data(as_text=True)
+        assert "No pieces on this page" in body
+
+
+def test_product_page_revalidates_after_image_change(client, db):
+    from app.services import product_service
+
+    product = Product(dress_id="D-7781", title="Picked Saree", price_inr=100000,
+                      status="PUBLISHED")
+    db.session.add(product)
+    db.session.flush()
+    for version in (1, 2):
+        db.session.add(Image(product_id=product.id, type="AI_GENERATED", version=version,
+                             status="READY", storage_key=f"ai/D-7781/v{version}.jpg"))
+    db.session.commit()
+
+    first = client.get("/d/D-7781")
+    product_service.pick_ai_version(product.id, 1, admin_id=1)
+    second = client.get("/d/D-7781", headers={"If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 200
+    assert second.headers["ETag"] != first.headers["ETag"]
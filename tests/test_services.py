@@ -0,0 +1,418 @@
+"""Tests for service-layer helpers."""
+import time
+import httpx
+from unittest.mock import MagicMock
+from sqlalchemy import create_engine, text
+
+import app.extensions as ext
+from app.services import slow_query_service
+
+
+def test_slow_query_parameters_are_redacted():
+    assert slow_query_service.redact_parameters(
+        {"dress_id_1": "D-1042", "price": 1250000}
+    ) == {"dress_id_1": "<str>", "price": "<int>"}
+    assert slow_query_service.redact_parameters(("secret", 3)) == ["<str>", "<int>"]
+
+
+def test_slow_query_recorded_with_plan(app, monkeypatch):
+    fake_redis = MagicMock()
+    monkeypatch.setattr(ext, "redis_client", fake_redis)
+    engine = create_engine("sqlite://")
+    slow_query_service.install(engine, threshold_ms=0.000001, max_entries=5)
+
+    with app.test_request_context("/"):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1 WHERE 1 = :x"), {"x": 1})
+
+    pipe = fake_redis.pipeline.return_value
+    key, payload = pipe.lpush.call_args.args
+    assert key == slow_query_service.REDIS_KEY
+    assert '"source": "GET /"' in payload
+    assert '"<int>"' in payload
+    assert '"plan": null' not in payload
+    pipe.ltrim.assert_called_with(slow_query_service.REDIS_KEY, 0, 4)
+
+
+def test_export_static_is_incremental(app, db, tmp_path):
+    from app.models.image import Image
+    from app.models.product import Product
+    from app.services.export_service import export_site
+
+    product = Product(
+        dress_id="D-6001", title="Exported Saree", price_inr=100000, status="PUBLISHED"
+    )
+    db.session.add(product)
+    db.session.flush()
+    image = Image(
+        product_id=product.id, type="ORIGINAL", version=1,
+        storage_key="originals/D-6001/v1.jpg", url="", status="READY",
+        image_data=b"jpeg-bytes",
+    )
+    db.session.add(image)
+    db.session.flush()
+    image.url = f"/img/{image.id}"
+    db.session.commit()
+
+    first = export_site(str(tmp_path))
+    assert first["pages"] >= 2 and first["images"] == 1
+    page = (tmp_path / "d" / "D-6001" / "index.html").read_text()
+    assert f'src="/img/{image.id}.' in page
+    assert (tmp_path / "d" / "D-6001" / "index.html.gz").exists()
+    assert (tmp_path / "static" / "css" / "style.css.gz").exists()
+
+    second = export_site(str(tmp_path))
+    assert second == {"pages": 0, "removed": 0, "images": 0}
+
+
+def test_bulk_sold_out_updates_matching_products_and_audits(app, db):
+    from app.models.audit_log import AuditLog
+    from app.models.product import Product
+    from app.services import product_service
+
+    for dress_id, status in [("D-7001", "PUBLISHED"), ("D-7002", "HIDDEN"), ("D-7003", "DRAFT")]:
+        db.session.add(Product(dress_id=dress_id, title=dress_id, price_inr=100, status=status))
+    db.session.commit()
+
+    changed = product_service.mark_sold_out_bulk(["d-7001", "D-7002", "D-7003", "D-7999"], 1)
+    assert changed == ["D-7001", "D-7002"]
+    statuses = dict(db.session.execute(
+        db.select(Product.dress_id, Product.status).where(Product.dress_id.like("D-700%"))
+    ).all())
+    assert statuses == {"D-7001": "SOLD_OUT", "D-7002": "SOLD_OUT", "D-7003": "DRAFT"}
+    assert AuditLog.query.filter_by(action="MARK_SOLD_OUT").count() == 2
+
+    assert product_service.update_prices(["D-7001", "D-7003"], 2500, 1) == ["D-7001", "D-7003"]
+    audit = AuditLog.query.filter_by(action="EDIT_PRICE").first()
+    assert audit.payload == {"old_paise": 100, "new_paise": 250000}
+
+
+def _telegram_response(status, payload):
+    resp = MagicMock(status_code=status)
+    resp.json.return_value = payload
+    return resp
+
+
+def test_telegram_post_honors_retry_after_and_backs_off(app, monkeypatch):
+    from app.services import telegram_service
+
+    client = MagicMock()
+    client.post.side_effect = [
+        _telegram_response(429, {"ok": False, "parameters": {"retry_after": 7}}),
+        httpx.ConnectError("refused"),
+        _telegram_response(200, {"ok": True, "result": {"message_id": 5}}),
+    ]
+    sleeps, throttled = [], []
+    monkeypatch.setattr(telegram_service, "_get_client", lambda: client)
+    monkeypatch.setattr(telegram_service.time, "sleep", sleeps.append)
+    monkeypatch.setattr(telegram_service, "_throttle", lambda method, kwargs: throttled.append(1))
+
+    with app.app_context():
+        result = telegram_service.send_message(1, "hi")
+
+    assert result == {"message_id": 5}
+    assert sleeps == [7, 2]
+    assert len(throttled) == 3  # a fresh rate-limit token per attempt
+
+
+def test_telegram_sends_are_not_retried_once_they_may_have_arrived(app, monkeypatch):
+    import pytest
+    from app.services import telegram_service
+
+    client = MagicMock()
+    monkeypatch.setattr(telegram_service, "_get_client", lambda: client)
+    monkeypatch.setattr(telegram_service.time, "sleep", lambda s: None)
+
+    with app.app_context():
+        client.post.side_effect = [httpx.ReadTimeout("slow")]
+        with pytest.raises(httpx.ReadTimeout):
+            telegram_service.send_message(1, "hi")
+        client.post.side_effect = [_telegram_response(502, {"ok": False})]
+        with pytest.raises(RuntimeError):
+            telegram_service.send_message(1, "hi")
+        assert client.post.call_count == 2
+
+        # Edits are idempotent and still retried
+        client.post.side_effect = [
+            _telegram_response(502, {"ok": False}),
+            _telegram_response(200, {"ok": True, "result": True}),
+        ]
+        assert telegram_service.edit_message_caption(1, 2, "Done") is True
+
+
+def test_edit_message_text_falls_back_to_caption_on_photo_messages(app, monkeypatch):
+    from app.services import telegram_service
+
+    client = MagicMock()
+    client.post.side_effect = [
+        _telegram_response(400, {"ok": False, "description":
+                                 "Bad Request: there is no text in the message to edit"}),
+        _telegram_response(200, {"ok": True, "result": {"message_id": 9}}),
+    ]
+    monkeypatch.setattr(telegram_service, "_get_client", lambda: client)
+
+    with app.app_context():
+        assert telegram_service.edit_message_text(1, 9, "Published") == {"message_id": 9}
+    assert client.post.call_args.args[0].endswith("/editMessageCaption")
+    assert client.post.call_args.kwargs["data"]["caption"] == "Published"
+
+
+def test_telegram_client_is_rebuilt_after_fork(app, monkeypatch):
+    from app.services import telegram_service
+
+    monkeypatch.setattr(telegram_service, "_client", None)
+    with app.app_context():
+        parent = telegram_service._get_client()
+        assert telegram_service._get_client() is parent
+        monkeypatch.setattr(telegram_service.os, "getpid", lambda: -1)
+        assert telegram_service._get_client() is not parent
+
+
+def test_rate_limiter_local_buckets_throttle_bursts(monkeypatch):
+    from app.services import rate_limiter
+
+    clock = [1000.0]
+    sleeps = []
+
+    def fake_sleep(seconds):
+        sleeps.append(seconds)
+        clock[0] += seconds
+
+    monkeypatch.setattr(ext, "redis_client", None)
+    monkeypatch.setattr(rate_limiter.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(rate_limiter.time, "sleep", fake_sleep)
+    monkeypatch.setattr(rate_limiter, "_local_buckets", {})
+
+    bucket = [("test:chat", 1.0, 2)]
+    assert rate_limiter.acquire(bucket) == 0
+    assert rate_limiter.acquire(bucket) == 0
+    assert rate_limiter.acquire(bucket) == 1.0
+    assert sleeps == [1.0]
+
+
+def test_outbox_sends_inline_without_redis(app, monkeypatch):
+    from unittest.mock import patch
+    from app.services import telegram_outbox
+
+    monkeypatch.setattr(ext, "redis_client", None)
+    with app.app_context(), patch(
+        "app.services.telegram_service.edit_message_caption"
+    ) as edit:
+        telegram_outbox.edit_message_caption(chat_id=1, message_id=2, caption="Done")
+    edit.assert_called_once_with(chat_id=1, message_id=2, caption="Done", reply_markup=None)
+
+
+def test_select_photo_size_prefers_smallest_sufficient():
+    from app.services.telegram_service import select_photo_size
+
+    sizes = [
+        {"file_id": "s", "width": 90, "height": 120},
+        {"file_id": "m", "width": 960, "height": 1280},
+        {"file_id": "l", "width": 1920, "height": 2560},
+    ]
+    assert select_photo_size(sizes, 1280)["file_id"] == "m"
+    assert select_photo_size(sizes, 4000)["file_id"] == "l"
+
+
+def test_download_file_aborts_once_over_limit(app, monkeypatch):
+    import pytest
+    from app.services import telegram_service
+
+    resp = MagicMock(headers={})
+    resp.iter_bytes.return_value = iter([b"x" * 600, b"x" * 600, b"never read"])
+    client = MagicMock()
+    client.stream.return_value.__enter__.return_value = resp
+    monkeypatch.setattr(telegram_service, "_get_client", lambda: client)
+
+    with app.app_context(), pytest.raises(ValueError, match="too large"):
+        telegram_service.download_file("photos/x.jpg", max_bytes=1000)
+    assert next(resp.iter_bytes.return_value) == b"never read"
+
+
+def test_telegram_api_base_url_is_configurable(app, monkeypatch):
+    from app.services import telegram_service
+
+    monkeypatch.setitem(app.config, "TELEGRAM_BOT_TOKEN", "123:abc")
+    monkeypatch.setitem(app.config, "TELEGRAM_API_BASE_URL", "http://localhost:8081/")
+    with app.app_context():
+        assert telegram_service._url("sendMessage") == "http://localhost:8081/bot123:abc/sendMessage"
+
+
+def test_local_ai_backend_is_deterministic_and_can_fail(app, monkeypatch):
+    import io
+    import pytest
+    from PIL import Image as PILImage
+    from app.services import ai_service
+
+    buf = io.BytesIO()
+    PILImage.new("RGB", (300, 400), (120, 20, 40)).save(buf, format="JPEG")
+    monkeypatch.setitem(app.config, "AI_BACKEND", "local")
+    monkeypatch.setitem(app.config, "AI_LOCAL_LATENCY_MS", 0)
+    with app.app_context():
+        first = ai_service.generate_image(buf.getvalue())
+        assert first == ai_service.generate_image(buf.getvalue())
+        assert PILImage.open(io.BytesIO(first)).size == (768, 1024)
+
+        monkeypatch.setitem(app.config, "AI_LOCAL_FAILURE_RATE", 1.0)
+        with pytest.raises(RuntimeError, match="Simulated"):
+            ai_service.generate_image(buf.getvalue())
+
+
+def test_reference_is_cropped_downscaled_and_cached_per_original(app, monkeypatch):
+    import io
+    from PIL import Image as PILImage
+    from app.services import ai_service, image_service
+
+    photo = PILImage.new("RGB", (3000, 4000), (236, 232, 225))
+    photo.paste((150, 20, 50), (1000, 1000, 2000, 3000))  # the garment
+    buf = io.BytesIO()
+    photo.save(buf, format="JPEG", quality=95)
+    original = buf.getvalue()
+
+    reference = image_service.prepare_reference(original, max_side=1024)
+    prepared = PILImage.open(io.BytesIO(reference))
+    assert max(prepared.size) == 1024 and prepared.width < prepared.height * 0.6
+    assert len(reference) < len(original) / 4
+
+    store = {}
+    redis_client = MagicMock()
+    redis_client.get.side_effect = store.get
+    redis_client.set.side_effect = lambda key, value, ex: store.__setitem__(key, value)
+    monkeypatch.setattr(ext, "redis_client", redis_client)
+    calls = []
+    real_prepare = image_service.prepare_reference
+    monkeypatch.setattr(image_service, "prepare_reference",
+                        lambda data, **kw: calls.append(kw) or real_prepare(data, **kw))
+    with app.app_context():
+        assert ai_service.prepare_reference(original) == ai_service.prepare_reference(original)
+    assert len(calls) == 1
+
+
+def test_circuit_breaker_trips_probes_and_closes(monkeypatch):
+    from app.services import circuit_breaker
+
+    monkeypatch.setattr(ext, "redis_client", None)
+    circuit_breaker.reset()
+    settings = circuit_breaker.BreakerSettings(min_requests=4, error_rate=0.5, cooldown=0.05)
+    for ok in (True, False, False, False):
+        assert circuit_breaker.allow("m", settings)
+        circuit_breaker.record("m", ok, settings)
+    assert circuit_breaker.state("m") == "open" and not circuit_breaker.allow("m", settings)
+
+    time.sleep(0.06)
+    assert circuit_breaker.allow("m", settings)  # the single half-open probe
+    assert not circuit_breaker.allow("m", settings)
+    circuit_breaker.record("m", True, settings)
+    assert circuit_breaker.state("m") == "closed"
+    circuit_breaker.reset()
+
+
+def test_ai_cascade_falls_back_and_hedges_slow_calls(app, monkeypatch):
+    import io
+    import threading
+    from PIL import Image as PILImage
+    from app.services import ai_service, circuit_breaker
+
+    jpeg = io.BytesIO()
+    PILImage.new("RGB", (64, 64), (1, 2, 3)).save(jpeg, format="JPEG")
+    calls = []
+
+    class Flaky:
+        name, params, rate_limited = "flaky", {}, False
+
+        def __init__(self, model_name="flaky-v1"):
+            self.model_name = model_name
+            self.lock = threading.Lock()
+
+        def generate(self, reference, prompt):
+            with self.lock:
+                calls.append(self.model_name)
+                n = calls.count(self.model_name)
+            if self.model_name == "broken":
+                raise RuntimeError("upstream 503")
+            if self.model_name == "slow" and n == 1:
+                time.sleep(1)  # the hedge should win long before this
+            return jpeg.getvalue()
+
+    monkeypatch.setattr(ext, "redis_client", None)
+    monkeypatch.setitem(ai_service.BACKENDS, "flaky", Flaky)
+    monkeypatch.setattr(ai_service, "_backends", {})
+    monkeypatch.setattr(ai_service, "_local_latencies", {})
+    monkeypatch.setitem(app.config, "AI_BACKEND", "flaky:broken")
+    monkeypatch.setitem(app.config, "AI_FALLBACK_BACKENDS", ["flaky:slow"])
+    circuit_breaker.reset()
+    with app.app_context():
+        for _ in range(20):
+            ai_service._record_latency("slow", 0.05)
+        started = time.monotonic()
+        _, backend = ai_service.generate(jpeg.getvalue(), reference=jpeg.getvalue())
+        assert backend.model_name == "slow" and time.monotonic() - started < 0.8
+        assert calls == ["broken", "slow", "slow"]
+
+        # Enough failures open the breaker: the broken model is skipped
+        for _ in range(4):
+            ai_service.generate(jpeg.getvalue(), reference=jpeg.getvalue())
+        calls.clear()
+        ai_service.generate(jpeg.getvalue(), reference=jpeg.getvalue())
+        assert "broken" not in calls
+    circuit_breaker.reset()
+
+
+def test_ai_cascade_stops_at_job_deadline(app, monkeypatch):
+    import pytest
+    from app.services import ai_service, circuit_breaker
+
+    calls = []
+
+    class Stuck:
+        name, params, rate_limited = "stuck", {}, False
+
+        def __init__(self, model_name="stuck-v1"):
+            self.model_name = model_name
+
+        def generate(self, reference, prompt):
+            calls.append(self.model_name)
+            time.sleep(0.5)
+            return b""
+
+    monkeypatch.setattr(ext, "redis_client", None)
+    monkeypatch.setitem(ai_service.BACKENDS, "stuck", Stuck)
+    monkeypatch.setattr(ai_service, "_backends", {})
+    monkeypatch.setitem(app.config, "AI_BACKEND", "stuck:first")
+    monkeypatch.setitem(app.config, "AI_FALLBACK_BACKENDS", ["stuck:second"])
+    monkeypatch.setitem(app.config, "AI_HEDGE_PERCENTILE", 0)
+    circuit_breaker.reset()
+    with app.app_context():
+        started = time.monotonic()
+        with pytest.raises(RuntimeError, match="second: out of time"):
+            ai_service.generate(b"x", reference=b"x", deadline=started + 0.2)
+        assert time.monotonic() - started < 0.45
+        assert calls == ["first"]
+
+        # The abandoned call finishing later must not count a second failure
+        time.sleep(0.4)
+        errors = sum(c[1] for c in circuit_breaker._local["first"]["windows"].values())
+        assert errors == 1
+    circuit_breaker.reset()
+
+
+def test_outbox_schedule_flag_is_short_lived_and_released_on_crash(app, monkeypatch):
+    import pytest
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")  # the outbox push/pop are Lua scripts
+    from app.services import telegram_outbox
+    from app.workers import outbox
+
+    redis_client = fakeredis.FakeStrictRedis()
+    monkeypatch.setattr(ext, "redis_client", redis_client)
+    monkeypatch.setattr(ext, "update_queue", MagicMock())
+    monkeypatch.setattr(telegram_outbox, "_scripts", {})
+    monkeypatch.setattr(outbox, "get_worker_app", lambda: app)
+
+    telegram_outbox.send_message(1, "hi")
+    assert 0 < redis_client.ttl(telegram_outbox.SCHEDULED_KEY) <= telegram_outbox.SCHEDULED_TTL
+
+    monkeypatch.setattr(telegram_outbox, "pop_next", MagicMock(side_effect=RuntimeError("boom")))
+    with pytest.raises(RuntimeError):
+        outbox.deliver_outbox()
+    assert not redis_client.exists(telegram_outbox.SCHEDULED_KEY)
@@ -1,5 +1,11 @@
-"""Tests for Telegram webhook security."""
+"""Tests for Telegram webhook security and update processing."""
 import json
+from unittest.mock import MagicMock, patch
+
+import httpx
+import pytest
+
+import app.extensions as ext
 
 
 def test_webhook_rejects_bad_token(client):
@@ -32,3 +38,272 @@ def test_webhook_rejects_non_admin(client, app):
     )
     # Returns 200 (silent reject) but takes no action
     assert resp.status_code == 200
+
+
+def _admin_update(text="/help", user_id=4242, update_id=1):
+    return {
+        "update_id": update_id,
+        "message": {
+            "from": {"id": user_id},
+            "chat": {"id": user_id},
+            "text": text,
+        },
+    }
+
+
+def _post_update(client, app, update):
+    return client.post(
+        f"/telegram/webhook/{app.config['TELEGRAM_BOT_TOKEN']}",
+        data=json.dumps(update),
+        content_type="application/json",
+        headers={"X-Telegram-Bot-Api-Secret-Token": app.config["TELEGRAM_WEBHOOK_SECRET"]},
+    )
+
+
+@pytest.fixture
+def bot_config(app, monkeypatch):
+    monkeypatch.setitem(app.config, "TELEGRAM_BOT_TOKEN", "123:test-token")
+    monkeypatch.setitem(app.config, "TELEGRAM_WEBHOOK_SECRET", "hook-secret")
+    monkeypatch.setitem(app.config, "TELEGRAM_ADMIN_IDS", [4242])
+
+
+def test_webhook_queues_update_and_acks(client, app, bot_config, monkeypatch):
+    fake_redis, fake_queue = MagicMock(), MagicMock()
+    monkeypatch.setattr(ext, "redis_client", fake_redis)
+    monkeypatch.setattr(ext, "update_queue", fake_queue)
+
+    with patch("app.blueprints.telegram.webhook.handle_update") as inline:
+        resp = _post_update(client, app, _admin_update())
+
+    assert resp.status_code == 200
+    inline.assert_not_called()
+    key, payload = fake_redis.rpush.call_args.args
+    assert key == "tg_updates:chat:4242"
+    assert json.loads(payload)["update"]["message"]["text"] == "/help"
+    assert fake_queue.enqueue.call_args.args == (
+        "app.workers.telegram_updates.drain_chat", 4242,
+    )
+
+
+def test_webhook_processes_inline_without_redis(client, app, bot_config, monkeypatch):
+    monkeypatch.setattr(ext, "redis_client", None)
+    with patch("app.blueprints.telegram.webhook.handle_update") as inline:
+        resp = _post_update(client, app, _admin_update())
+    assert resp.status_code == 200
+    inline.assert_called_once()
+
+
+def test_drain_chat_preserves_order_and_requeues_transient_failures(app, monkeypatch):
+    from app.workers import telegram_updates
+
+    queued = [
+        json.dumps({"update": _admin_update("/first"), "attempts": 0}).encode(),
+        json.dumps({"update": _admin_update("/second"), "attempts": 0}).encode(),
+    ]
+    fake_redis = MagicMock()
+    fake_redis.lpop.side_effect = lambda key: queued.pop(0) if queued else None
+    fake_redis.lpush.side_effect = lambda key, value: queued.insert(0, value)
+    fake_redis.llen.side_effect = lambda key: len(queued)
+    monkeypatch.setattr(ext, "redis_client", fake_redis)
+
+    seen = []
+
+    def handle(update):
+        seen.append(update["message"]["text"])
+        if update["message"]["text"] == "/second" and seen.count("/second") == 1:
+            raise httpx.ConnectError("telegram unreachable")
+
+    with patch("app.blueprints.telegram.handlers.handle_update", side_effect=handle):
+        with pytest.raises(httpx.ConnectError):
+            telegram_updates.drain_chat(4242)
+        assert json.loads(queued[0])["attempts"] == 1
+        telegram_updates.drain_chat(4242)
+
+    assert seen == ["/first", "/second", "/second"]
+    assert queued == []
+
+
+def test_webhook_drops_redelivered_update(client, app, bot_config, monkeypatch):
+    monkeypatch.setattr(ext, "redis_client", None)
+    update = _admin_update(update_id=777001)
+    with patch("app.blueprints.telegram.webhook.handle_update") as inline:
+        assert _post_update(client, app, update).status_code == 200
+        assert _post_update(client, app, update).status_code == 200
+    inline.assert_called_once()
+    assert 'telegram_duplicate_updates_total{store="db"}' in client.get("/metrics").get_data(as_text=True)
+
+
+def test_oversized_document_rejected_before_download(app, monkeypatch):
+    from app.blueprints.telegram import handlers
+
+    sent = []
+    monkeypatch.setattr(handlers.telegram_outbox, "send_message",
+                        lambda chat_id, text, **kw: sent.append(text))
+    message = {
+        "chat": {"id": 4242},
+        "caption": "Title: Silk Saree\nPrice: 4500",
+        "document": {"file_id": "doc1", "mime_type": "image/jpeg",
+                     "file_size": 50 * 1024 * 1024},
+    }
+    with app.app_context(), patch.object(handlers.telegram_service, "get_file") as get_file:
+        handlers._handle_photo(message, 4242, 4242)
+    get_file.assert_not_called()
+    assert sent and sent[0].startswith("Image error: Image too large")
+
+
+def _jpeg(color):
+    import io
+    from PIL import Image as PILImage
+
+    buf = io.BytesIO()
+    PILImage.new("RGB", (40, 60), color).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def test_album_becomes_one_product_with_ordered_originals(app, monkeypatch):
+    from app.blueprints.telegram import handlers
+    from app.models.product import Product
+
+    files = {"f1": _jpeg("red"), "f2": _jpeg("green"), "f3": _jpeg("blue")}
+    monkeypatch.setattr(handlers.telegram_outbox, "send_message", lambda *a, **kw: None)
+    monkeypatch.setattr(handlers.telegram_service, "get_file",
+                        lambda file_id: {"file_path": file_id})
+    monkeypatch.setattr(handlers.telegram_service, "download_file",
+                        lambda path, max_bytes=None: files[path])
+
+    def item(message_id, file_id, caption=None):
+        message = {
+            "message_id": message_id,
+            "chat": {"id": 4242},
+            "from": {"id": 4242},
+            "media_group_id": "album-1",
+            "photo": [{"file_id": file_id, "width": 40, "height": 60}],
+        }
+        if caption:
+            message["caption"] = caption
+        return message
+
+    with app.app_context():
+        # Delivery order differs from album order; caption is on the first item
+        handlers.handle_album([
+            item(12, "f3"), item(10, "f1", "Title: Banarasi Silk\nPrice: 9000"), item(11, "f2"),
+        ])
+        products = Product.query.filter_by(title="Banarasi Silk").all()
+        assert len(products) == 1
+        originals = products[0].original_images
+        assert [img.version for img in originals] == [1, 2, 3]
+        assert products[0].status == "PUBLISHED"
+        assert all(img.url == f"/img/{img.id}" for img in originals)
+
+
+def test_take_album_clears_schedule_flag_with_items(monkeypatch):
+    """Items buffered after finalize ran must schedule a follow-up batch."""
+    from unittest.mock import MagicMock
+    from app.workers import albums
+
+    redis_client = MagicMock()
+    pipe = redis_client.pipeline.return_value
+    pipe.execute.return_value = [[b'{"message_id": 1}'], 2]
+    monkeypatch.setattr(ext, "redis_client", redis_client)
+
+    assert albums.take_album("g1") == [{"message_id": 1}]
+    pipe.delete.assert_called_once_with("tg_album:g1", "tg_album:g1:scheduled")
+
+
+def test_late_album_item_is_added_to_the_published_product(app, monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")  # fakeredis runs the Redis lock scripts with it
+    from unittest.mock import MagicMock
+    from app.blueprints.telegram import handlers
+    from app.models.product import Product
+    from app.workers import albums
+
+    files = {"f1": _jpeg("red"), "f2": _jpeg("green")}
+    replies = []
+    monkeypatch.setattr(handlers.telegram_outbox, "send_message",
+                        lambda chat_id, text, **kw: replies.append(text))
+    monkeypatch.setattr(handlers.telegram_service, "get_file",
+                        lambda file_id: {"file_path": file_id})
+    monkeypatch.setattr(handlers.telegram_service, "download_file",
+                        lambda path, max_bytes=None: files[path])
+    monkeypatch.setattr(ext, "redis_client", fakeredis.FakeStrictRedis())
+    monkeypatch.setattr(ext, "update_queue", MagicMock())
+    monkeypatch.setattr(albums, "get_worker_app", lambda: app)
+
+    def item(message_id, file_id, caption=None):
+        message = {"message_id": message_id, "chat": {"id": 4243}, "from": {"id": 4243},
+                   "media_group_id": "album-late",
+                   "photo": [{"file_id": file_id, "width": 40, "height": 60}]}
+        if caption:
+            message["caption"] = caption
+        return message
+
+    with app.app_context():
+        albums.buffer_album_message(item(20, "f1", "Title: Late Kurta\nPrice: 4000"))
+        albums.finalize_album("album-late")
+        # The drain fell behind: this item arrives after the album was published
+        albums.buffer_album_message(item(21, "f2"))
+        assert ext.update_queue.enqueue_in.call_count == 2
+        albums.finalize_album("album-late")
+
+        product = Product.query.filter_by(title="Late Kurta").one()
+        assert [img.version for img in product.original_images] == [1, 2]
+        assert replies[-1] == f"Added 1 late photo(s) to {product.dress_id}."
+
+
+def test_extract_dress_ids_accepts_ids_and_ranges():
+    from app.blueprints.telegram.handlers import _extract_dress_ids
+
+    assert _extract_dress_ids("/soldout d-1042 D-1050..D-1052 D-1051") == [
+        "D-1042", "D-1050", "D-1051", "D-1052",
+    ]
+    assert _extract_dress_ids("/hide D-1060..1058") == ["D-1058", "D-1059", "D-1060"]
+    with pytest.raises(ValueError):
+        _extract_dress_ids("/soldout D-1..D-100000")
+
+
+def test_editprice_without_price_is_rejected(monkeypatch):
+    from unittest.mock import MagicMock
+    from app.blueprints.telegram import handlers
+
+    update_prices = MagicMock()
+    replies = []
+    monkeypatch.setattr(handlers.product_service, "update_prices", update_prices)
+    monkeypatch.setattr(handlers.telegram_outbox, "send_message",
+                        lambda chat_id, text, **kw: replies.append(text))
+
+    handlers._handle_edit_price("/editprice D-1042 D-1043", 1, 1)
+    assert not update_prices.called
+    assert replies[-1].startswith("Price missing")
+
+
+def test_inline_query_answered_from_index(client, app, bot_config, monkeypatch):
+    from app.extensions import db
+    from app.models.product import Product
+    from app.services import search_index
+
+    monkeypatch.setattr(ext, "redis_client", None)
+    search_index.reset()
+    with app.app_context():
+        db.session.add_all([
+            Product(dress_id="D-8101", title="Red Silk Saree", price_inr=950000, status="PUBLISHED"),
+            Product(dress_id="D-8102", title="Green Cotton Kurta", price_inr=250000, status="HIDDEN"),
+        ])
+        db.session.commit()
+
+    update = {"update_id": 9001, "inline_query": {
+        "id": "iq1", "from": {"id": 4242}, "query": "red sil",
+    }}
+    resp = _post_update(client, app, update)
+    body = resp.get_json()
+    assert body["method"] == "answerInlineQuery"
+    assert [r["title"] for r in body["results"]] == ["D-8101 — Red Silk Saree"]
+
+    # Changes committed later are picked up without a rebuild
+    with app.app_context():
+        kurta = Product.query.filter_by(dress_id="D-8102").first()
+        kurta.title = "Red Cotton Kurta"
+        db.session.commit()
+        assert [e["dress_id"] for e in search_index.search("red")] == ["D-8101", "D-8102"]
+        assert [e["dress_id"] for e in search_index.search("d-8102")] == ["D-8102"]
+        assert search_index.search("green") == []
@@ -27,3 +27,407 @@ def test_ai_generation_skips_ready_image(app, db):
             generate_ai_image(p.id, img.id, "originals/D-8001/v1.jpg", 1)
             # AI service should NOT have been called
             mock_ai.generate_image.assert_not_called()
+
+
+def test_send_preview_uploads_album_then_reuses_file_ids(app, db):
+    """Preview goes out as one media group; file_ids are cached for re-sends."""
+    from app.workers.ai_generation import _send_preview
+
+    with app.app_context():
+        p = Product(
+            dress_id="D-8002", title="Album", price_inr=100000,
+            status="DRAFT", telegram_chat_id=42,
+        )
+        db.session.add(p)
+        db.session.flush()
+        for img_type in ("ORIGINAL", "AI_GENERATED"):
+            db.session.add(Image(
+                product_id=p.id, type=img_type, version=1,
+                storage_key=f"{img_type}/D-8002", status="READY",
+                image_data=f"{img_type}-bytes".encode(),
+            ))
+        db.session.flush()
+
+        with patch("app.workers.ai_generation.telegram_service") as tg:
+            tg.send_media_group.return_value = [
+                {"message_id": 1, "photo": [{"file_id": "small"}, {"file_id": "orig-id"}]},
+                {"message_id": 2, "photo": [{"file_id": "ai-id"}]},
+            ]
+            tg.largest_file_id.side_effect = lambda m: m["photo"][-1]["file_id"]
+            tg.send_message.return_value = {"message_id": 3}
+
+            _send_preview(p)
+            first = tg.send_media_group.call_args.kwargs["photos"]
+            assert [item["photo"] for item in first] == [b"ORIGINAL-bytes", b"AI_GENERATED-bytes"]
+            assert p.telegram_message_id == 3
+
+            _send_preview(p)
+            second = tg.send_media_group.call_args.kwargs["photos"]
+            assert [item["photo"] for item in second] == ["orig-id", "ai-id"]
+
+
+def test_preload_builds_model_once_and_registers_app(monkeypatch):
+    """flask worker warms the app and model in the parent process."""
+    from app import create_app
+    from app import workers
+    from app.services import ai_service
+    from app.workers import runner
+
+    fresh_app = create_app("testing")  # preload disposes this app's engine
+    fresh_app.config["GEMINI_API_KEY"] = "test-key"
+    genai = MagicMock()
+    monkeypatch.setattr(ai_service, "genai", genai)
+    monkeypatch.setattr(ai_service, "_models", {})
+    monkeypatch.setattr(workers, "_worker_app", None)
+
+    runner.preload(fresh_app)
+    assert workers._worker_app is fresh_app
+    with fresh_app.app_context():
+        assert ai_service.get_model() is ai_service.get_model()
+    genai.configure.assert_called_once_with(api_key="test-key")
+    genai.GenerativeModel.assert_called_once_with(ai_service.MODEL_NAME)
+
+    # The session-wide test app context is active here; push fresh_app's
+    # so only its (in-memory) engine is reset.
+    with fresh_app.app_context():
+        from app.extensions import db
+        runner.reset_after_fork()  # safe to call; leaves a usable engine
+        assert db.session.execute(db.text("select 1")).scalar() == 1
+
+
+def test_thread_pool_worker_bounds_concurrent_jobs(monkeypatch):
+    import threading
+    import time
+    import redis
+    from rq import Queue
+    from app.workers.runner import ThreadPoolWorker
+
+    connection = redis.Redis()  # never contacted: job execution is stubbed
+    worker = ThreadPoolWorker([Queue("ai-interactive", connection=connection)],
+                              connection=connection, concurrency=2,
+                              prepare_for_work=False)
+    running, peak, lock = [0], [0], threading.Lock()
+
+    def fake_perform(job, queue):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+
+    monkeypatch.setattr(worker, "prepare_execution", lambda job: None)
+    monkeypatch.setattr(worker, "perform_job", fake_perform)
+    for i in range(6):
+        assert worker._slots.acquire(timeout=1)  # what dequeue does per job
+        worker.execute_job(MagicMock(id=f"job-{i}"), None)
+    worker._pool.shutdown(wait=True)
+    assert peak[0] == 2
+
+
+def test_generate_image_waits_on_shared_gemini_bucket(app, monkeypatch):
+    from app.services import ai_service
+
+    acquired = []
+    monkeypatch.setattr(ai_service.rate_limiter, "acquire",
+                        lambda buckets, max_wait: acquired.append(buckets) or 0.0)
+    monkeypatch.setitem(app.config, "AI_RATE_PER_MINUTE", 30)
+    with app.app_context():
+        ai_service.wait_for_rate_limit()
+    assert acquired == [[("gemini", 0.5, app.config["AI_RATE_BURST"])]]
+
+
+def test_ai_results_are_cached_by_content_with_fresh_bypass(app, db, monkeypatch):
+    """Same original + prompt + model + version reuses the stored output."""
+    import app.extensions as ext
+    from app.workers import ai_generation
+
+    monkeypatch.setattr(ext, "redis_client", MagicMock())
+    monkeypatch.setattr(ai_generation, "_send_preview", lambda product: None)
+    calls = []
+    monkeypatch.setattr(ai_generation.ai_service, "generate",
+                        lambda data, **kw: (calls.append(data) or b"ai-output",
+                                      ai_generation.ai_service.get_backend()))
+
+    def make_product(dress_id):
+        p = Product(dress_id=dress_id, title="Cache", price_inr=100000, status="DRAFT")
+        db.session.add(p)
+        db.session.flush()
+        db.session.add(Image(product_id=p.id, type="ORIGINAL", version=1, status="READY",
+                             storage_key=f"originals/{dress_id}/v1.jpg",
+                             image_data=b"same-photo-bytes"))
+        ai = Image(product_id=p.id, type="AI_GENERATED", version=1, status="PENDING",
+                   storage_key=f"ai/{dress_id}/v1.jpg")
+        db.session.add(ai)
+        db.session.commit()
+        return p, ai
+
+    with app.app_context():
+        first, first_ai = make_product("D-8201")
+        ai_generation.generate_ai_image(first.id, first_ai.id, "", 1)
+        db.session.expire_all()
+        assert len(calls) == 1 and first_ai.image_data == b"ai-output"
+
+        # Re-ingesting the same photo hits the cache
+        second, second_ai = make_product("D-8202")
+        ai_generation.generate_ai_image(second.id, second_ai.id, "", 1)
+        db.session.expire_all()
+        assert len(calls) == 1 and second_ai.status == "READY"
+
+        # The Regenerate button asks for a fresh result
+        third, third_ai = make_product("D-8203")
+        ai_generation.generate_ai_image(third.id, third_ai.id, "", 1, fresh=True)
+        assert len(calls) == 2
+
+
+def test_style_variations_generated_in_one_job_then_picked(app, db, monkeypatch):
+    """K styles share one reference, land as consecutive versions, one album."""
+    import io
+    from PIL import Image as PILImage
+    import app.extensions as ext
+    from app.services import product_service
+    from app.workers import ai_generation
+
+    buf = io.BytesIO()
+    PILImage.new("RGB", (300, 400), (120, 20, 40)).save(buf, format="JPEG")
+    monkeypatch.setattr(ext, "redis_client", MagicMock(get=MagicMock(return_value=None)))
+    monkeypatch.setitem(app.config, "AI_BACKEND", "local")
+    monkeypatch.setitem(app.config, "AI_LOCAL_LATENCY_MS", 0)
+    prepared = []
+    real_prepare = ai_generation.ai_service.image_service.prepare_reference
+    monkeypatch.setattr(ai_generation.ai_service.image_service, "prepare_reference",
+                        lambda data, **kw: prepared.append(1) or real_prepare(data, **kw))
+    tg = MagicMock()
+    tg.send_message.return_value = {"message_id": 7}
+    monkeypatch.setattr(ai_generation, "telegram_service", tg)
+
+    with app.app_context():
+        p = Product(dress_id="D-8301", title="Styles", price_inr=100000,
+                    status="DRAFT", telegram_chat_id=42)
+        db.session.add(p)
+        db.session.flush()
+        db.session.add(Image(product_id=p.id, type="ORIGINAL", version=1, status="READY",
+                             storage_key="originals/D-8301/v1.jpg", image_data=buf.getvalue()))
+        db.session.add(Image(product_id=p.id, type="AI_GENERATED", version=1, status="READY",
+                             storage_key="ai/D-8301/v1.jpg", image_data=b"studio"))
+        db.session.commit()
+
+        styles = ["casual", "formal", "festive"]
+        images = product_service.add_ai_variations(p.id, styles, admin_id=1)
+        assert [img.version for img in images] == [2, 3, 4]
+
+        ai_generation.generate_ai_variations(p.id, [img.id for img in images], styles)
+        db.session.expire_all()
+        assert [img.status for img in images] == ["READY"] * 3
+        assert len({img.image_data for img in images}) == 3
+        assert len(prepared) == 1
+        album = tg.send_media_group.call_args.kwargs["photos"]
+        assert [item.get("caption") for item in album][1:] == [
+            "v2 · casual", "v3 · formal", "v4 · festive"]
+        picker = tg.send_message.call_args.kwargs["reply_markup"]["inline_keyboard"]
+        assert picker[0][1]["callback_data"] == f"pick:{p.id}:3"
+
+        assert product_service.pick_ai_version(p.id, 3, admin_id=1).version == 3
+        db.session.expire_all()
+        assert p.ai_image.version == 3
+        assert sorted(img.status for img in p.images.filter_by(type="AI_GENERATED")) == [
+            "ARCHIVED", "ARCHIVED", "ARCHIVED", "READY"]
+
+
+def test_variation_styles_checked_at_startup_and_button_refused_when_empty(app, monkeypatch):
+    import pytest
+    from types import SimpleNamespace
+    from app.blueprints.telegram import handlers
+    from app.services import ai_styles
+
+    with pytest.raises(ValueError, match="glamour"):
+        ai_styles.init_app(SimpleNamespace(config={"AI_VARIATION_STYLES": ["casual", "glamour"]}))
+
+    monkeypatch.setitem(app.config, "AI_VARIATION_STYLES", [])
+    monkeypatch.setattr(handlers, "telegram_service", MagicMock())
+    add = MagicMock()
+    monkeypatch.setattr(handlers.product_service, "add_ai_variations", add)
+    handlers._cb_variations(MagicMock(status="DRAFT"), 1, "cb")
+    assert not add.called
+    handlers.telegram_service.answer_callback_query.assert_called_once_with(
+        "cb", "No variation styles are configured")
+
+
+def test_generation_jobs_record_stage_timings(app, db, monkeypatch):
+    """Each run stores per-stage timings that `flask ai-stats` reports."""
+    import io
+    from PIL import Image as PILImage
+    import app.extensions as ext
+    from app.models.ai_job_metric import AIJobMetric
+    from app.workers import ai_generation
+
+    buf = io.BytesIO()
+    PILImage.new("RGB", (300, 400), (120, 20, 40)).save(buf, format="JPEG")
+    monkeypatch.setattr(ext, "redis_client", MagicMock(get=MagicMock(return_value=None)))
+    monkeypatch.setattr(ai_generation, "_send_preview", lambda product: None)
+    monkeypatch.setitem(app.config, "AI_BACKEND", "local")
+    monkeypatch.setitem(app.config, "AI_LOCAL_LATENCY_MS", 0)
+
+    with app.app_context():
+        p = Product(dress_id="D-8401", title="Timed", price_inr=100000, status="DRAFT")
+        db.session.add(p)
+        db.session.flush()
+        db.session.add(Image(product_id=p.id, type="ORIGINAL", version=1, status="READY",
+                             storage_key="originals/D-8401/v1.jpg", image_data=buf.getvalue()))
+        ai = Image(product_id=p.id, type="AI_GENERATED", version=1, status="PENDING",
+                   storage_key="ai/D-8401/v1.jpg")
+        db.session.add(ai)
+        db.session.commit()
+
+        ai_generation.generate_ai_image(p.id, ai.id, "", 1)
+        metric = AIJobMetric.query.filter_by(product_id=p.id).one()
+        assert metric.status == "ok" and metric.model_name == "local-pillow-v1"
+        assert metric.attempt == 1 and metric.output_bytes > 0
+        assert {"lock", "load", "cache", "prepare", "model", "verify", "encode", "commit",
+                "preview"} <= set(metric.stages)
+        assert metric.images == 1 and metric.generated == 1
+
+        result = app.test_cli_runner().invoke(args=["ai-stats", "--hours", "1"])
+        assert "runs/hour" in result.output and "images/hour" in result.output
+        assert "verify" in result.output
+
+
+def test_ai_jobs_routed_by_priority_and_deferred_per_admin(app, monkeypatch):
+    """An admin with a full set of active jobs waits behind their oldest one."""
+    from rq.job import JobStatus
+    import app.extensions as ext
+    from app.services import ai_queue
+
+    interactive, bulk = MagicMock(), MagicMock()
+    interactive.name, bulk.name = "ai-interactive", "ai-bulk"
+    monkeypatch.setattr(ext, "ai_interactive_queue", interactive)
+    monkeypatch.setattr(ext, "ai_bulk_queue", bulk)
+    monkeypatch.setitem(app.config, "AI_ADMIN_MAX_ACTIVE", 2)
+    recent = {"ai_admin_jobs:ai-interactive:1": [b"a", b"b"]}
+    interactive.connection.lrange.side_effect = lambda key, *_: recent.get(key, [])
+    statuses = {"a": JobStatus.STARTED, "b": JobStatus.QUEUED}
+    monkeypatch.setattr(ai_queue.Job, "fetch_many", lambda ids, connection: [
+        MagicMock(id=i, get_status=MagicMock(return_value=statuses[i])) for i in ids])
+
+    with app.app_context():
+        ai_queue.enqueue("job.func", admin_id=1, product_id=5)
+        dependency = interactive.enqueue.call_args.kwargs["depends_on"]
+        assert dependency.dependencies == ["a"] and dependency.allow_failure
+
+        ai_queue.enqueue("job.func", admin_id=2, product_id=6)  # another admin: no wait
+        assert interactive.enqueue.call_args.kwargs["depends_on"] is None
+
+        statuses["a"] = JobStatus.FINISHED
+        ai_queue.enqueue("job.func", admin_id=1, product_id=7)
+        assert interactive.enqueue.call_args.kwargs["depends_on"] is None
+
+        ai_queue.enqueue("job.batch", admin_id=1, bulk=True)
+        assert bulk.enqueue.call_count == 1 and interactive.enqueue.call_count == 3
+
+
+def test_repeated_ai_requests_coalesce_per_product(app, db, monkeypatch):
+    """A second tap attaches to the pending job; another kind supersedes it."""
+    from rq.job import JobStatus
+    from app.blueprints.telegram import handlers
+    from app.services import ai_queue
+
+    jobs = []
+
+    def fake_enqueue(func, *args, admin_id, bulk=False, **kwargs):
+        job = MagicMock(func_name=func, kwargs=kwargs,
+                        get_status=MagicMock(return_value=JobStatus.QUEUED))
+        jobs.append(job)
+        return job
+
+    monkeypatch.setattr(ai_queue, "enqueue", fake_enqueue)
+    monkeypatch.setattr(ai_queue, "active_job", lambda product_id: jobs[-1] if jobs else None)
+    monkeypatch.setattr(handlers, "telegram_service", MagicMock())
+    monkeypatch.setitem(app.config, "AI_VARIATION_STYLES", ["casual", "formal"])
+
+    with app.app_context():
+        p = Product(dress_id="D-8501", title="Coalesce", price_inr=100000, status="DRAFT")
+        db.session.add(p)
+        db.session.flush()
+        db.session.add(Image(product_id=p.id, type="ORIGINAL", version=1, status="READY",
+                             storage_key="originals/D-8501/v1.jpg"))
+        db.session.commit()
+
+        handlers._cb_regenerate(p, 1, "cb1")
+        handlers._cb_regenerate(p, 1, "cb2")
+        assert len(jobs) == 1
+        assert p.images.filter_by(type="AI_GENERATED").count() == 1
+        handlers.telegram_service.answer_callback_query.assert_called_with(
+            "cb2", "Already generating v1...")
+
+        handlers._cb_variations(p, 1, "cb3")
+        jobs[0].cancel.assert_called_once()
+        assert len(jobs) == 2
+        versions = [img.version for img in p.images.filter_by(type="AI_GENERATED")]
+        assert sorted(versions) == [1, 2]  # the superseded v1 was dropped and reused
+
+
+def test_superseded_job_releases_jobs_deferred_behind_it(app, monkeypatch):
+    """Cancelling a job must not strand the admin's later jobs chained onto it."""
+    import pytest
+    fakeredis = pytest.importorskip("fakeredis")
+    from rq import Queue
+    from rq.job import JobStatus
+    import app.extensions as ext
+    from app.services import ai_queue
+
+    connection = fakeredis.FakeStrictRedis()
+    queue = Queue("ai-interactive", connection=connection)
+    monkeypatch.setattr(ext, "redis_client", connection)
+    monkeypatch.setattr(ext, "ai_interactive_queue", queue)
+    monkeypatch.setitem(app.config, "AI_ADMIN_MAX_ACTIVE", 1)
+
+    with app.app_context():
+        first = ai_queue.enqueue("app.workers.ai_generation.generate_ai_image",
+                                 admin_id=1, product_id=1, image_id=1)
+        other = ai_queue.enqueue("app.workers.ai_generation.generate_ai_image",
+                                 admin_id=1, product_id=2, image_id=2)
+        assert other.get_status() == JobStatus.DEFERRED
+
+        assert ai_queue.active_job(1).id == first.id
+        assert ai_queue.cancel_if_waiting(first)
+        assert first.get_status() == JobStatus.CANCELED
+        assert other.get_status() == JobStatus.QUEUED
+        assert ai_queue.active_job(1) is None
+
+
+def test_ai_request_refused_while_product_lock_is_held(app, monkeypatch):
+    import app.extensions as ext
+    from app.blueprints.telegram import handlers
+    from app.services import ai_queue
+
+    redis_client = MagicMock()
+    redis_client.lock.return_value.acquire.return_value = False
+    monkeypatch.setattr(ext, "redis_client", redis_client)
+    monkeypatch.setattr(handlers, "telegram_service", MagicMock())
+    enqueue = MagicMock()
+    monkeypatch.setattr(ai_queue, "enqueue", enqueue)
+
+    handlers._cb_regenerate(MagicMock(id=1, status="DRAFT"), 1, "cb")
+    assert not enqueue.called
+    handlers.telegram_service.answer_callback_query.assert_called_once_with(
+        "cb", "Busy, please try again")
+
+
+def test_thread_pool_worker_cleans_up_each_concurrent_job():
+    """Concurrent jobs each remove their own StartedJobRegistry entry."""
+    import pytest
+    fakeredis = pytest.importorskip("fakeredis")
+    from rq import Queue, Retry
+    from rq.job import JobStatus
+    from app.workers.runner import ThreadPoolWorker
+
+    connection = fakeredis.FakeStrictRedis()
+    queue = Queue("ai-interactive", connection=connection)
+    jobs = [queue.enqueue("time.sleep", 0.2, retry=Retry(max=1)) for _ in range(3)]
+    worker = ThreadPoolWorker([queue], connection=connection, concurrency=3)
+
+    worker.work(burst=True)
+
+    assert [job.get_status() for job in jobs] == [JobStatus.FINISHED] * 3
+    assert queue.started_job_registry.get_job_ids() == []
+    assert queue.started_job_registry.cleanup(float("inf")) == []